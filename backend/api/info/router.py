@@ -10,6 +10,12 @@ import subprocess
 from os import getpid
 import socket
 from utils.jwt import JWTBearer
+from utils.custom_validations import schema_validators
+from utils.logger import log_queue_stats
+from utils.password_hashing import password_hasher
+from utils.plugin_manager import plugin_executor
+from utils.redis_services import RedisServices
+from utils.websocket_fanout import channel_events_batcher
 
 router = APIRouter()
 
@@ -104,3 +110,28 @@ async def get_in_loop_tasks(_=Depends(JWTBearer())) -> api.Response:
             "tasks": tasks_data
         },
     )
+
+
+@router.get("/reindex", include_in_schema=False)
+async def get_reindex_progress(_=Depends(JWTBearer())) -> api.Response:
+    async with RedisServices() as redis_services:
+        progress = await redis_services.get_reindex_progress()
+    return api.Response(
+        status=api.Status.success,
+        attributes={"indices": progress},
+    )
+
+
+@router.get("/metrics", include_in_schema=False, response_model=api.Response, response_model_exclude_none=True)
+async def get_metrics(_=Depends(JWTBearer())) -> api.Response:
+    return api.Response(
+        status=api.Status.success,
+        attributes={
+            "process_id": getpid(),
+            "schema_validators": schema_validators.stats(),
+            "log_queue": log_queue_stats(),
+            "password_hashing": password_hasher.stats(),
+            "websocket_events": channel_events_batcher.stats(),
+            "plugins": plugin_executor.stats(),
+        },
+    )
@@ -13,7 +13,8 @@ from api.managed.utils import serve_request_create, serve_request_update_r_repla
     get_resource_content_type_from_payload_content_type, csv_entries_prepare_docs, handle_update_state, \
     update_state_handle_resolution, serve_space_delete, serve_space_update, serve_space_create, \
     data_asset_attachments_handler, import_resources_from_csv_handler, data_asset_handler, \
-    create_or_update_resource_with_payload_handler, get_mime_type
+    create_or_update_resource_with_payload_handler, get_mime_type, csv_entries_query_pages, \
+    csv_entries_collect_keys
 from utils.internal_error_code import InternalErrorCode
 from utils.router_helper import is_space_exist
 import models.api as api
@@ -40,7 +41,7 @@ from utils.helpers import (
     flatten_dict,
     resolve_schema_references,
 )
-from utils.custom_validations import validate_payload_with_schema
+from utils.custom_validations import validate_payload_with_schema, schema_validators
 from utils.settings import settings
 from utils.plugin_manager import plugin_manager
 from io import BytesIO, StringIO
@@ -153,20 +154,14 @@ async def csv_entries(query: api.Query, user_shortname=Depends(JWTBearer())):
 
     keys: list = [i["name"] for i in folder_views]
     keys_existence = dict(zip(keys, [False for _ in range(len(keys))]))
+    deprecated_keys: set = set()
+    new_keys: set = set()
 
-    # if settings.active_data_db == 'file':
-    #     _, search_res = await db.query(query, user_shortname)
-    # else:
-    #     _, search_res = await db.query(query, user_shortname)
-    #     docs_dicts = [search_re.model_dump() for search_re in search_res]
-
-    _, search_res = await repository.serve_query(
-        query, user_shortname,
-    )
-
-    docs_dicts = [search_re.model_dump() for search_re in search_res]
-
-    json_data, deprecated_keys, new_keys = csv_entries_prepare_docs(query, docs_dicts, folder_views, keys_existence)
+    # A first pass over the pages only collects the columns, the rows are streamed by the second one
+    has_records = False
+    async for docs_dicts in csv_entries_query_pages(query, user_shortname):
+        has_records = True
+        csv_entries_collect_keys(docs_dicts, folder_views, keys_existence, deprecated_keys, new_keys)
 
     await plugin_manager.after_action(
         core.Event(
@@ -177,23 +172,29 @@ async def csv_entries(query: api.Query, user_shortname=Depends(JWTBearer())):
         )
     )
 
-    if len(json_data) == 0:
+    if not has_records:
         return api.Response(
             status=api.Status.success,
             attributes={"message": "The records are empty"},
         )
 
-    keys = [key for key in keys if keys_existence[key]]
-    v_path = StringIO()
-
-    list_deprecated_keys = list(deprecated_keys)
-    keys = list(filter(lambda item: item not in list_deprecated_keys, keys))
-    writer = csv.DictWriter(v_path, fieldnames=(keys + list(new_keys)))
-    writer.writeheader()
-    writer.writerows(json_data)
-
-    response = StreamingResponse(
-        iter([v_path.getvalue()]), media_type="text/csv")
+    keys = [key for key in keys if keys_existence[key] and key not in deprecated_keys]
+    fieldnames = keys + list(new_keys)
+
+    async def csv_rows():
+        v_path = StringIO()
+        # Columns of entries changed between the two passes are left out
+        writer = csv.DictWriter(v_path, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        yield v_path.getvalue()
+        async for docs_dicts in csv_entries_query_pages(query, user_shortname):
+            v_path.seek(0)
+            v_path.truncate()
+            page_data, _, _ = csv_entries_prepare_docs(query, docs_dicts, folder_views, {})
+            writer.writerows(page_data)
+            yield v_path.getvalue()
+
+    response = StreamingResponse(csv_rows(), media_type="text/csv")
     response.headers[
         "Content-Disposition"
     ] = f"attachment; filename={query.space_name}_{query.subpath}.csv"
@@ -228,6 +229,7 @@ async def serve_space(
             )
 
     await initialize_spaces()
+    await plugin_manager.load_spaces_plugins()
 
     await access_control.load_permissions_and_roles()
 
@@ -321,6 +323,10 @@ async def serve_request(
         case api.RequestType.move:
             records, failed_records = await serve_request_move(request, owner_shortname)
 
+    for record in request.records:
+        if record.resource_type == ResourceType.schema:
+            schema_validators.invalidate(request.space_name, record.shortname)
+
     if len(failed_records) == 0:
         return api.Response(status=api.Status.success, records=records)
     else:
@@ -669,6 +675,8 @@ async def create_or_update_resource_with_payload(
     await db.save_payload(
         space_name, record.subpath, resource_obj, payload_file
     )
+    if record.resource_type == ResourceType.schema:
+        schema_validators.invalidate(space_name, record.shortname)
 
     await plugin_manager.after_action(
         core.Event(
@@ -1147,8 +1155,7 @@ async def cancel_lock(
 
 @router.get("/reload-security-data")
 async def reload_security_data(_=Depends(JWTBearer())):
-    if settings.active_data_db == "file":
-        await access_control.load_permissions_and_roles()
+    await access_control.load_permissions_and_roles()
 
     return api.Response(status=api.Status.success)
 
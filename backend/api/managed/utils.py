@@ -1,6 +1,6 @@
 from copy import copy
 from datetime import datetime
-from typing import Any
+from typing import Any, AsyncGenerator
 
 from fastapi import status
 from utils.generate_email import generate_email_from_template, generate_subject
@@ -35,6 +35,7 @@ from utils.custom_validations import validate_payload_with_schema
 from utils.settings import settings
 from utils.plugin_manager import plugin_manager
 from api.user.service import (
+    pop_hashed_password,
     send_email,
     send_sms,
 )
@@ -115,6 +116,58 @@ def csv_entries_prepare_docs(query, docs_dicts, folder_views, keys_existence):
     return json_data, deprecated_keys, new_keys
 
 
+def csv_entries_collect_keys(docs_dicts, folder_views, keys_existence, deprecated_keys, new_keys):
+    """
+    Collect the columns `csv_entries_prepare_docs` fills for the docs without building their rows,
+    so the csv header can be built over all the pages before any row is written
+    """
+    for redis_document in docs_dicts:
+        flattened_doc = flatten_dict(redis_document)
+        for folder_view in folder_views:
+            column_title = folder_view.get("name")
+            attribute_val = flattened_doc.get(folder_view.get("key"))
+            if not attribute_val:
+                continue
+            keys_existence[column_title] = True
+            if not isinstance(attribute_val, list):
+                continue
+            if isinstance(attribute_val[0], dict):
+                deprecated_keys.add(column_title)
+            for item in attribute_val:
+                if isinstance(item, dict):
+                    new_keys.update(f"{column_title}.{k}" for k in item)
+
+
+async def csv_entries_query_pages(query: api.Query, user_shortname: str) -> AsyncGenerator[list[dict], None]:
+    """
+    Yield the records of the query as dicts, `settings.csv_export_page_size` records at a time.
+    Rows sorted across schemas, and file queries other than search and manifest subpath listings,
+    are served in a single page.
+    """
+    pageable = (
+        settings.active_data_db != "file"
+        or query.type == api.QueryType.search
+        or (query.type == api.QueryType.subpath and settings.files_query == "manifest")
+    )
+    if not pageable or (query.sort_by in core.Meta.model_fields and len(query.filter_schema_names) > 1):
+        _, records = await repository.serve_query(query, user_shortname)
+        yield [record.model_dump() for record in records]
+        return
+
+    end = query.offset + query.limit
+    offset = query.offset
+    while offset < end:
+        page_query = query.model_copy(
+            update={"offset": offset, "limit": min(settings.csv_export_page_size, end - offset)}
+        )
+        total, records = await repository.serve_query(page_query, user_shortname)
+        if records:
+            yield [record.model_dump() for record in records]
+        offset += page_query.limit
+        if not records or offset >= total:
+            break
+
+
 async def serve_request_create_check_access(request, record, owner_shortname):
     if not await access_control.check_access(
             user_shortname=owner_shortname,
@@ -233,7 +286,7 @@ async def serve_request_create(request: api.Request, owner_shortname: str, token
                     request, owner_shortname
                 )
 
-            shortname_exists = db.is_entry_exist(
+            shortname_exists = await db.is_entry_exist(
                 space_name=request.space_name,
                 subpath=record.subpath,
                 shortname=record.shortname,
@@ -254,9 +307,12 @@ async def serve_request_create(request: api.Request, owner_shortname: str, token
 
             await validate_uniqueness(request.space_name, record)
 
+            hashed_password = await pop_hashed_password(record)
             resource_obj = core.Meta.from_record(
                 record=record, owner_shortname=owner_shortname
             )
+            if hashed_password and isinstance(resource_obj, core.User):
+                resource_obj.password = hashed_password
 
             separate_payload_data, resource_obj = set_resource_object(record, resource_obj, is_internal)
 
@@ -438,6 +494,7 @@ async def serve_request_update_r_replace(request, owner_shortname: str):
                     "body", {}
                 )
             else:
+                hashed_password = await pop_hashed_password(record)
                 new_resource_payload_data = (
                     resource_obj.update_from_record(
                         record=record,
@@ -445,6 +502,8 @@ async def serve_request_update_r_replace(request, owner_shortname: str):
                         replace=request.request_type == api.RequestType.r_replace,
                     )
                 )
+                if hashed_password and isinstance(resource_obj, core.User):
+                    resource_obj.password = hashed_password
                 new_version_flattend = resource_obj.model_dump()
                 if new_resource_payload_data:
                     new_version_flattend["payload"] = {
@@ -28,6 +28,7 @@ from models.api import Error, Exception, Status
 from utils.social_sso import get_facebook_sso, get_google_sso
 from .service import (
     gen_alphanumeric,
+    pop_hashed_password,
     send_email,
     send_sms,
     send_otp,
@@ -134,10 +135,12 @@ async def create_user(record: core.Record) -> api.Response:
         )
     )
 
+    hashed_password = await pop_hashed_password(record)
     user = core.User.from_record(
         record=record,
         owner_shortname=record.shortname
     )
+    user.password = hashed_password
     await validate_uniqueness(MANAGEMENT_SPACE, record)
 
     separate_payload_data: str | dict[str, Any] = {}
@@ -271,7 +274,7 @@ async def login(response: Response, request: UserLoginRequest) -> api.Response:
             and user.is_active
             and (
                 request.invitation
-                or password_hashing.verify_password(
+                or await password_hashing.password_hasher.verify(
                     request.password or "", user.password or ""
                 )
             )
@@ -291,7 +294,7 @@ async def login(response: Response, request: UserLoginRequest) -> api.Response:
             )
             return api.Response(status=api.Status.success, records=[record])
         # Check if user entered a wrong password 
-        is_password_valid = password_hashing.verify_password(
+        is_password_valid = await password_hashing.password_hasher.verify(
             request.password or "", user.password or ""
         )
         if not is_password_valid:
@@ -448,7 +451,7 @@ async def update_profile(
     old_version_flattend = flatten_dict(user.model_dump())
 
     if profile_user.password and "old_password" in profile.attributes:
-        if not password_hashing.verify_password(
+        if not await password_hashing.password_hasher.verify(
             profile.attributes["old_password"], user.password or ""
         ):
             raise api.Exception(
@@ -938,7 +941,7 @@ async def validate_password(
             MANAGEMENT_SPACE, USERS_SUBPATH, shortname, core.User, shortname
         )
     )
-    if user and password_hashing.verify_password(password, user.password or ""):
+    if user and await password_hashing.password_hasher.verify(password, user.password or ""):
         return api.Response(status=api.Status.success)
     else:
         raise api.Exception(
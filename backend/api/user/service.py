@@ -5,7 +5,7 @@ import time
 from data_adapters.adapter import data_adapter as db
 from models import core
 from models.api import Error, Exception
-from models.enums import ContentType
+from models.enums import ContentType, ResourceType
 from utils import password_hashing
 from utils.async_request import AsyncRequest
 from utils.internal_error_code import InternalErrorCode
@@ -226,9 +226,19 @@ def check_user_validation(user, data, user_updates, invitation_token):
     return user_updates
 
 
+async def pop_hashed_password(record: core.Record) -> str | None:
+    """
+    Take the plain password out of a user record and return its hash,
+    so the bcrypt work runs in the password hasher pool rather than in the models
+    """
+    if record.resource_type != ResourceType.user or not isinstance(record.attributes.get("password"), str):
+        return None
+    return await password_hashing.password_hasher.hash(record.attributes.pop("password"))
+
+
 async def set_user_profile(profile, profile_user, user):
     if profile_user.password:
-        user.password = password_hashing.hash_password(profile_user.password)
+        user.password = await password_hashing.password_hasher.hash(profile_user.password)
         user.force_password_change = False
         # Clear the failed password attempts
         async with RedisServices() as redis_services:
@@ -49,25 +49,16 @@ async def archive(space: str, subpath: str, schema: str, olderthan: int):
 
     timestamp = int(time()) - (olderthan * 24 * 60 * 60)
     async with RedisServices() as redis_services:
-        while True:
-            redis_res = await redis_services.search(
-                space_name=space,
-                schema_name=schema,
-                search=f"(@updated_at:[-inf {timestamp}])",
-                filters={
-                    "subpath": [subpath],
-                },
-                exact_subpath=True,
-                limit=limit,
-                offset=0,
-
-            )
-            if not redis_res or redis_res["total"] == 0:
-                print(f"No more data left. {redis_res=}")
-                break
-            counter += redis_res["total"]
-            
-            search_res = redis_res["data"]
+        search_str = redis_services.prepare_query_string(
+            f"(@updated_at:[-inf {timestamp}])",
+            {"subpath": [subpath]},
+            True,
+        )
+        # A single pass over a cursor, the archived docs are deleted as it goes
+        async for search_res in redis_services.iter_documents(
+            f"{space}:{schema}", search_str, batch_size=limit
+        ):
+            counter += len(search_res)
 
             for redis_document in search_res:
                 record = json.loads(redis_document)
@@ -120,6 +111,8 @@ async def archive(space: str, subpath: str, schema: str, olderthan: int):
                     print(f"Error archiving {record.get('shortname')}: {e} at line {sys.exc_info()[-1].tb_lineno}") # type: ignore
                     continue
             print(f'Processed {counter}')
+        if not counter:
+            print("No data to archive.")
     await RedisServices().close_pool()
 
 if __name__ == "__main__":
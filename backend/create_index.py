@@ -1,10 +1,16 @@
 #!/usr/bin/env -S BACKEND_ENV=config.env python3
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy
+from datetime import datetime
 import json
+import os
+from pathlib import Path
 import re
+from time import perf_counter
 import traceback
+from typing import Awaitable, Callable, Iterable, Iterator
 
 import models.api as api
 from data_adapters.adapter import data_adapter as db
@@ -21,8 +27,16 @@ import utils.regex as regex
 import asyncio
 from utils.spaces import initialize_spaces
 from utils.access_control import access_control
-# from time import time
-from multiprocessing import Pool
+
+# Resource types loaded from the spaces subpaths
+INDEXED_RESOURCE_TYPES = [
+    ResourceType.content,
+    ResourceType.ticket,
+    ResourceType.schema,
+    ResourceType.notification,
+    ResourceType.post,
+    ResourceType.folder
+]
 
 
 async def load_data_to_redis(
@@ -35,11 +49,17 @@ async def load_data_to_redis(
     and if the meta file has a separate payload file follwing a schema 
     we loads the payload content and store it to redis as :space_name:schema_name prefixed doc
     """
-    # start_time: int = int(time())
+    loaded_data = await ReindexPipeline().run(
+        [(space_name, subpath, allowed_resource_types)]
+    )
+    return loaded_data[0]
 
-    #print(f"\n\nSTART EXAMINING SUBPATH: {subpath}  {int(time()) - start_time} ")
 
-    locators_len, locators = db.locators_query(
+def subpath_locators(
+    space_name: str, subpath: str, allowed_resource_types: list
+) -> list[core.Locator]:
+    locators: list[core.Locator]
+    _, locators = db.locators_query(
         api.Query(
             space_name=space_name,
             subpath=subpath,
@@ -60,153 +80,283 @@ async def load_data_to_redis(
             shortname=folder_parts[-1]
         )
         locators.append(folder_locator)
-        locators_len += 1
 
-    # print(f"\nEnded loading {locators_len} files, starting parsing data in each file {int(time()) - start_time}")
+    return locators
 
-    if locators_len <= 5000:
-        redis_docs_chunks = [await generate_redis_docs(locators)]
-    else:
-        with Pool() as pool:
-            multiple_results = [
-                pool.apply_async(generate_redis_docs_process, (locators_chunk, )) 
-                for locators_chunk in divide_chunks(locators, 5000)
-            ]
-            redis_docs_chunks = [process_res.get() for process_res in multiple_results]
 
-    
-    saved_docs = []
-    #print(f"""
-    #    Completed parsing {locators_len} files, 
-    #    generated {len(redis_docs_chunks)} chunks of docs to be stored in Redis, 
-    #    time: {int(time()) - start_time}
-    #""")
-    
-    async with RedisServices() as redis_man:
-        for redis_docs_chunk in redis_docs_chunks:
-            saved_docs += await redis_man.save_bulk(redis_docs_chunk)
+def parse_locators_process(locators: list):
+    return asyncio.run(parse_locators(locators))
 
 
-    return {"subpath": subpath, "documents": len(saved_docs)}
+async def parse_locators(locators: list) -> list:
+    """
+    Load the meta and the json payload of each locator,
+    returns (locator, meta, payload or None, payload_string) tuples
+    """
+    parsed_entries = []
+    for one in locators:
+        try:
+            myclass = getattr(sys.modules["models.core"], camel_case(one.type))
 
+            try:
+                meta = await db.load(
+                    space_name=one.space_name,
+                    subpath=one.subpath,
+                    shortname=one.shortname,
+                    class_type=myclass,
+                    user_shortname="anonymous",
+                )
+            except Exception as e:
+                print(e)
+                continue
+
+            payload_data = None
+            if (
+                meta.payload
+                and isinstance(meta.payload.body, str)
+                and meta.payload.content_type == ContentType.json
+                and meta.payload.schema_shortname
+            ):
+                try:
+                    payload_path = db.payload_path(
+                        one.space_name, one.subpath, myclass
+                    ) / str(meta.payload.body)
+                    payload_data = json.loads(payload_path.read_text())
+                except Exception as ex:
+                    print(f"Error: @{one.space_name}:{one.subpath} {meta.shortname=}, {ex}")
 
-def generate_redis_docs_process(locators: list):
-    return asyncio.run(generate_redis_docs(locators))
+            payload_string = await generate_payload_string(
+                space_name=one.space_name, 
+                subpath=one.subpath, 
+                shortname=one.shortname, 
+                payload=copy(payload_data or {}),
+            ) if settings.store_payload_string else ""
 
-async def generate_redis_docs(locators: list) -> list:
-    redis_docs = []
-    async with RedisServices() as redis_man:
-        for one in locators:
-            try:
-                myclass = getattr(sys.modules["models.core"], camel_case(one.type))
-                # print(f"{one=}")
+            parsed_entries.append((one, meta, payload_data, payload_string))
+
+        except Exception:
+            print(f"path: {one.space_name}/{one.subpath}/{one.shortname} ({one.type})")
+            print("stacktrace:")
+            print(f"    {traceback.format_exc()}")
+
+    return parsed_entries
+
+
+def generate_redis_docs_process(parsed_entries: list):
+    return asyncio.run(generate_redis_docs(parsed_entries))
 
+
+async def generate_redis_docs(parsed_entries: list) -> list:
+    """Validate the payloads against their schemas and prepare the meta and payload docs"""
+    redis_docs = []
+    redis_man = RedisServices()
+    for one, meta, payload_data, payload_string in parsed_entries:
+        try:
+            meta_doc_id, meta_data = redis_man.prepare_meta_doc(
+                one.space_name, one.subpath, meta
+            )
+            if payload_data is not None:
                 try:
-                    meta = await db.load(
+                    await validate_payload_with_schema(
+                        payload_data=payload_data,
+                        space_name=one.space_name,
+                        schema_shortname=meta.payload.schema_shortname,
+                    )
+                    doc_id, payload = redis_man.prepare_payload_doc(
                         space_name=one.space_name,
                         subpath=one.subpath,
-                        shortname=one.shortname,
-                        class_type=myclass,
-                        user_shortname="anonymous",
+                        resource_type=one.type,
+                        payload=copy(payload_data),
+                        meta=meta,
                     )
-                except Exception as e:
-                    print(e)
-                    continue
-                meta_doc_id, meta_data = redis_man.prepare_meta_doc(
-                    one.space_name, one.subpath, meta
-                )
-                payload_data = {}
-                if (
-                    meta.payload
-                    and isinstance(meta.payload.body, str)
-                    and meta.payload.content_type == ContentType.json
-                    and meta.payload.schema_shortname
-                ):
-                    try:
-                        payload_path = db.payload_path(
-                            one.space_name, one.subpath, myclass
-                        ) / str(meta.payload.body)
-                        payload_data = json.loads(payload_path.read_text())
-                        await validate_payload_with_schema(
-                            payload_data=payload_data,
-                            space_name=one.space_name,
-                            schema_shortname=meta.payload.schema_shortname,
-                        )
-                        doc_id, payload = redis_man.prepare_payload_doc(
-                            space_name=one.space_name,
-                            subpath=one.subpath,
-                            resource_type=one.type,
-                            payload=copy(payload_data),
-                            meta=meta,
-                        )
-                        payload.update(meta_data)
-                        redis_docs.append({"doc_id": doc_id, "payload": payload})
-                    except SchemaValidationError as _:
-                        print(
-                            f"Error: @{one.space_name}/{one.subpath}/{meta.shortname} "
-                            f"does not match the schema {meta.payload.schema_shortname}"
-                        )
-                    except Exception as ex:
-                        print(f"Error: @{one.space_name}:{one.subpath} {meta.shortname=}, {ex}")
-
-                meta_data["payload_string"] = await generate_payload_string(
-                    space_name=one.space_name, 
-                    subpath=one.subpath, 
-                    shortname=one.shortname, 
-                    payload=payload_data,
-                ) if settings.store_payload_string else ""
-                
-                redis_docs.append({"doc_id": meta_doc_id, "payload": meta_data})
-
-            except Exception:
-                print(f"path: {one.space_name}/{one.subpath}/{one.shortname} ({one.type})")
-                print("stacktrace:")
-                print(f"    {traceback.format_exc()}")
+                    payload.update(meta_data)
+                    redis_docs.append({"doc_id": doc_id, "payload": payload})
+                except SchemaValidationError as _:
+                    print(
+                        f"Error: @{one.space_name}/{one.subpath}/{meta.shortname} "
+                        f"does not match the schema {meta.payload.schema_shortname}"
+                    )
+                except Exception as ex:
+                    print(f"Error: @{one.space_name}:{one.subpath} {meta.shortname=}, {ex}")
+
+            meta_data["payload_string"] = payload_string
+            redis_docs.append({"doc_id": meta_doc_id, "payload": meta_data})
+
+        except Exception:
+            print(f"path: {one.space_name}/{one.subpath}/{one.shortname} ({one.type})")
+            print("stacktrace:")
+            print(f"    {traceback.format_exc()}")
 
     return redis_docs
 
 
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
 
-async def load_custom_indices_data(for_space: str | None = None):
+    def add(self, items: int, busy_time: float):
+        self.items += items
+        self.busy_time += busy_time
+
+    def __str__(self) -> str:
+        rate = self.items / self.busy_time if self.busy_time else 0
+        return f"{self.name:<9}{self.items:>10} items {self.busy_time:>9.2f}s busy {rate:>12.0f}/s"
+
+
+class ReindexPipeline:
+    """
+    Loads (space, subpath, resource types) targets to redis through stages connected by bounded queues:
+    walk (list the locators) -> parse (meta, payload and payload string) -> validate (schemas, docs)
+    -> write (pipelined JSON.SET batches).
+    With `processes` the parse and validate stages run in a process pool,
+    otherwise everything runs in the current event loop.
+    """
+
+    def __init__(
+        self,
+        processes: int = 0,
+        batch_size: int = 500,
+        queue_size: int = 8,
+        track_written: bool = False,
+    ):
+        self.processes = processes
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        # Ids of the docs written, when tracked
+        self.written: set[str] | None = set() if track_written else None
+        self.executor: ProcessPoolExecutor | None = None
+        self.stats = {name: StageStats(name) for name in ["walk", "parse", "validate", "write"]}
+        self.loaded_data: list[dict] = []
+        self.wall_time = 0.0
+
+    async def run(self, targets: Iterable[tuple[str, str, list]]) -> list[dict]:
+        """Returns {space_name, subpath, documents} for each target in order"""
+        start_time = perf_counter()
+        workers = max(self.processes, 1)
+        locators_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        parsed_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        docs_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        if self.processes:
+            self.executor = ProcessPoolExecutor(self.processes)
+        try:
+            async with asyncio.TaskGroup() as stages:
+                stages.create_task(self.walk(targets, locators_queue, workers))
+                stages.create_task(self.stage(
+                    "parse", locators_queue, parsed_queue, workers, workers,
+                    parse_locators, parse_locators_process,
+                ))
+                stages.create_task(self.stage(
+                    "validate", parsed_queue, docs_queue, workers, 1,
+                    generate_redis_docs, generate_redis_docs_process,
+                ))
+                stages.create_task(self.write(docs_queue))
+        finally:
+            if self.executor:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+        self.wall_time += perf_counter() - start_time
+        return self.loaded_data
+
+    async def walk(self, targets: Iterable, outbox: asyncio.Queue, consumers: int):
+        for space_name, subpath, allowed_resource_types in targets:
+            start_time = perf_counter()
+            locators = await asyncio.to_thread(
+                subpath_locators, space_name, subpath, allowed_resource_types
+            )
+            self.stats["walk"].add(len(locators), perf_counter() - start_time)
+
+            target = len(self.loaded_data)
+            self.loaded_data.append(
+                {"space_name": space_name, "subpath": subpath, "documents": 0}
+            )
+            for locators_chunk in divide_chunks(locators, self.batch_size):
+                await outbox.put((target, locators_chunk))
+
+        for _ in range(consumers):
+            await outbox.put(None)
+
+    async def stage(
+        self,
+        name: str,
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue,
+        workers: int,
+        consumers: int,
+        handler: Callable[[list], Awaitable[list]],
+        process_handler: Callable[[list], list],
+    ):
+        loop = asyncio.get_running_loop()
+
+        async def worker():
+            while (item := await inbox.get()) is not None:
+                target, batch = item
+                start_time = perf_counter()
+                if self.executor:
+                    result = await loop.run_in_executor(self.executor, process_handler, batch)
+                else:
+                    result = await handler(batch)
+                self.stats[name].add(len(result), perf_counter() - start_time)
+                await outbox.put((target, result))
+
+        await asyncio.gather(*[worker() for _ in range(workers)])
+        for _ in range(consumers):
+            await outbox.put(None)
+
+    async def write(self, inbox: asyncio.Queue):
+        redis_man = RedisServices()
+        while (item := await inbox.get()) is not None:
+            target, redis_docs = item
+            if not redis_docs:
+                continue
+            start_time = perf_counter()
+            saved_docs = await redis_man.save_bulk(redis_docs)
+            self.stats["write"].add(len(saved_docs), perf_counter() - start_time)
+            if self.written is not None:
+                self.written.update(doc["doc_id"] for doc in redis_docs)
+            self.loaded_data[target]["documents"] += len(saved_docs)
+
+    def report(self):
+        print(f"Loaded in {self.wall_time:.2f}s")
+        for stage_stats in self.stats.values():
+            print(f"    {stage_stats}")
+
+
+async def load_custom_indices_data(
+    for_space: str | None = None,
+    pipeline: ReindexPipeline | None = None,
+):
     for i, index in enumerate(RedisServices.CUSTOM_INDICES):
         if for_space and index["space"] != for_space:
             continue
 
         if i < len(RedisServices.CUSTOM_CLASSES) and issubclass(RedisServices.CUSTOM_CLASSES[i], core.Meta):
-            res = await load_data_to_redis(
-                index["space"],
-                index["subpath"],
+            target: tuple[str, str, list] = (
+                str(index["space"]),
+                str(index["subpath"]),
                 [ResourceType(RedisServices.CUSTOM_CLASSES[i].__name__.lower())],
             )
+            res = (await (pipeline or ReindexPipeline()).run([target]))[-1]
             print(
                 f"{res['documents']}\tCustom  {index['space']}:meta:{index['subpath']}"
             )
 
 
-async def traverse_subpaths_entries(
-    path,
-    space_name,
-    loaded_data,
+def traverse_subpaths_entries(
+    path: Path,
     for_subpaths: list | None = None,
-):
-    # print(f"{subpath_index=} @{space_name} {path=}")
+) -> Iterator[str]:
+    """Yield the subpaths under path, the sub folders before their parent folder"""
     space_parts_count = len(settings.spaces_folder.parts)
     subpath_index = space_parts_count + 1
 
     for subpath in path.iterdir():
-        # print(f"{subpath=} 1")
-
-        # print(f"{subpath=} 2 {subpath.is_dir()} {re.match(regex.SUBPATH, subpath.name)}")
-
         if subpath.is_dir() and re.match(regex.SUBPATH, subpath.name):
-            await traverse_subpaths_entries(
-                subpath,
-                space_name,
-                loaded_data,
-                for_subpaths,
-            )
+            yield from traverse_subpaths_entries(subpath, for_subpaths)
 
-            # print(f"{subpath=} 3")
             subpath_name = "/".join(subpath.parts[subpath_index:])
             if for_subpaths:
                 subpath_enabled = any(
@@ -215,31 +365,33 @@ async def traverse_subpaths_entries(
                 if not subpath_enabled:
                     continue
 
-            # print(f"{subpath=} 4")
-            loaded_data.append(
-                await load_data_to_redis(
-                    space_name,
-                    subpath_name,
-                    [
-                        ResourceType.content,
-                        ResourceType.ticket,
-                        ResourceType.schema,
-                        ResourceType.notification,
-                        ResourceType.post,
-                        ResourceType.folder
-                    ],
-                )
-            )
-    return loaded_data
+            yield subpath_name
+
+
+async def load_folder_data_to_redis(space_name: str, folder_subpath: str) -> int:
+    """
+    Load a single folder, its entries and all its sub folders to redis
+    without touching the rest of the space indices
+    """
+    folder_subpath = folder_subpath.strip("/")
+    subpaths = [folder_subpath, *traverse_subpaths_entries(
+        settings.spaces_folder / space_name / folder_subpath
+    )]
+    loaded_data = await ReindexPipeline().run(
+        (space_name, subpath, INDEXED_RESOURCE_TYPES) for subpath in subpaths
+    )
+    return sum(item["documents"] for item in loaded_data)
 
 
 async def load_all_spaces_data_to_redis(
-    for_space: str | None = None, for_subpaths: list | None = None
-):
+    for_space: str | None = None,
+    for_subpaths: list | None = None,
+    pipeline: ReindexPipeline | None = None,
+) -> dict:
     """
     Loop over spaces and subpaths inside it and load the data to redis of indexing_enabled for the space
     """
-    loaded_data = {}
+    spaces_names = []
     spaces = await db.get_spaces()
     for space_name, space_json in spaces.items():
         space_obj = core.Space.model_validate_json(space_json)
@@ -254,25 +406,137 @@ async def load_all_spaces_data_to_redis(
         if not space_meta_file.is_file():
             continue
 
-        print(f"Checking space name: {space_name}")
-        path = settings.spaces_folder / space_name
+        spaces_names.append(space_name)
 
-        loaded_data[
-            f"{space_name}"
-        ] = await traverse_subpaths_entries(
-            path, space_name, [], for_subpaths
-        )
+    def targets():
+        for space_name in spaces_names:
+            print(f"Checking space name: {space_name}")
+            for subpath in traverse_subpaths_entries(
+                settings.spaces_folder / space_name, for_subpaths
+            ):
+                yield space_name, subpath, INDEXED_RESOURCE_TYPES
 
-    await load_custom_indices_data(for_space)
+    loaded_data: dict = {space_name: [] for space_name in spaces_names}
+    for item in await (pipeline or ReindexPipeline()).run(targets()):
+        loaded_data[item["space_name"]].append(item)
+
+    await load_custom_indices_data(for_space, pipeline)
 
     return loaded_data
 
 
+class BlueGreenReindex:
+    """
+    Rebuilds the indices while the live ones keep answering the queries:
+    a new `{space}:{schema}:v{n}` version of each index is created over the same documents,
+    the documents are reloaded, and once the version is fully indexed the `{space}:{schema}` alias
+    is swapped to it with FT.ALIASUPDATE and the previous version is dropped.
+    With `collect_garbage` the documents that existed before and were not reloaded are deleted.
+    The progress of each index is kept in redis and served by /info/reindex.
+    """
+
+    def __init__(self, pipeline: ReindexPipeline, poll_interval: float = 0.5):
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval
+        self.collect_garbage = pipeline.written is not None
+        # (space_name, schema_name) => index version being built
+        self.versions: dict[tuple[str, str], str] = {}
+        self.started_at = datetime.now().isoformat()
+
+    async def set_progress(self, space_name: str, schema_name: str, phase: str, **progress):
+        await RedisServices().set_reindex_progress(
+            space_name,
+            schema_name,
+            index=self.versions.get((space_name, schema_name)),
+            phase=phase,
+            started_at=self.started_at,
+            **progress,
+        )
+
+    async def report_loading(self):
+        while True:
+            for space_name, schema_name in self.versions:
+                await self.set_progress(
+                    space_name, schema_name, "loading", documents=self.pipeline.stats["write"].items
+                )
+            await asyncio.sleep(1)
+
+    async def wait_indexed(self, space_name: str, schema_name: str, index_name: str):
+        while True:
+            indexing, percent_indexed = await RedisServices().index_progress(index_name)
+            await self.set_progress(
+                space_name, schema_name, "indexing", percent_indexed=percent_indexed
+            )
+            if not indexing:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def run(
+        self,
+        for_space: str | None = None,
+        for_schemas: list | None = None,
+        for_subpaths: list | None = None,
+    ) -> dict:
+        redis_man = RedisServices()
+        definitions = await redis_man.index_definitions(for_space, for_schemas)
+        for (space_name, schema_name), redis_schema in definitions.items():
+            self.versions[(space_name, schema_name)] = await redis_man.create_index_version(
+                space_name, schema_name, redis_schema
+            )
+            await self.set_progress(space_name, schema_name, "building")
+
+        previous_keys: set[str] = set()
+        if self.collect_garbage:
+            previous_keys = await redis_man.scan_keys([
+                prefix
+                for space_name, schema_name in self.versions
+                for prefix in [f"{space_name}:{schema_name}:", f"{space_name}:{schema_name}/"]
+            ])
+
+        promoted: set[tuple[str, str]] = set()
+        try:
+            progress_reporter = asyncio.create_task(self.report_loading())
+            try:
+                loaded_data = await load_all_spaces_data_to_redis(
+                    for_space, for_subpaths, self.pipeline
+                )
+            finally:
+                progress_reporter.cancel()
+
+            for (space_name, schema_name), index_name in self.versions.items():
+                await self.wait_indexed(space_name, schema_name, index_name)
+                previous_index = await redis_man.promote_index_version(
+                    space_name, schema_name, index_name
+                )
+                promoted.add((space_name, schema_name))
+                dropped_indices = await redis_man.drop_index_versions(space_name, schema_name, index_name)
+                await self.set_progress(
+                    space_name, schema_name, "live",
+                    previous_index=previous_index, dropped_indices=dropped_indices,
+                )
+                print(f"Swapped {space_name}:{schema_name} to {index_name}")
+        except BaseException:
+            for (space_name, schema_name), index_name in self.versions.items():
+                if (space_name, schema_name) not in promoted:
+                    await redis_man.drop_index(index_name)
+                    await self.set_progress(space_name, schema_name, "failed")
+            raise
+
+        if self.collect_garbage and self.pipeline.written is not None:
+            stale_keys = list(previous_keys - self.pipeline.written)
+            for keys in divide_chunks(stale_keys, 1000):
+                await redis_man.del_keys(keys)
+            print(f"Deleted {len(stale_keys)} stale documents")
+
+        return loaded_data
+
+
 async def main(
     for_space: str | None = None,
     for_schemas: list | None = None,
     for_subpaths: list | None = None,
-    flushall: bool = False
+    flushall: bool = False,
+    processes: int | None = None,
 ):
     
     try:
@@ -284,18 +548,20 @@ async def main(
             print("Intializing spaces")
             await initialize_spaces()
 
-            print(f"Creating Redis indices: {for_space=} {for_schemas=}")
             await access_control.load_permissions_and_roles()
-            await redis_man.create_indices(
-                for_space=for_space, 
-                for_schemas=for_schemas,
-                del_docs=not bool(for_subpaths)
-            )
-        res = await load_all_spaces_data_to_redis(for_space, for_subpaths)
+
+        print(f"Rebuilding Redis indices: {for_space=} {for_schemas=}")
+        pipeline = ReindexPipeline(
+            processes if processes is not None else os.cpu_count() or 1,
+            # The documents not reloaded are only collected on full reindexing
+            track_written=not for_subpaths,
+        )
+        res = await BlueGreenReindex(pipeline).run(for_space, for_schemas, for_subpaths)
         for space_name, loaded_data in res.items():
             if loaded_data:
                 for item in loaded_data:
                     print(f"{item['documents']}\tRegular {space_name}/{item['subpath']}")
+        pipeline.report()
     finally:
         await RedisServices().close_pool()
 
@@ -316,10 +582,14 @@ if __name__ == "__main__":
     parser.add_argument(
         "--flushall", action='store_true', help="FLUSHALL data on Redis"
     )
+    parser.add_argument(
+        "--processes", type=int, default=os.cpu_count(),
+        help="processes parsing and validating the entries, 0 to load in this process only"
+    )
 
     args = parser.parse_args()
 
-    asyncio.run(main(args.space, args.schemas, args.subpaths, args.flushall))
+    asyncio.run(main(args.space, args.schemas, args.subpaths, args.flushall, args.processes))
 
     # test_search = redis_services.search(
     #     space_name="products",
@@ -190,12 +190,12 @@ class BaseDataAdapter(ABC):
 
 
     @abstractmethod
-    def is_entry_exist(self,
-                       space_name: str,
-                       subpath: str,
-                       shortname: str,
-                       resource_type: core.ResourceType,
-                       schema_shortname: str | None = None, ) -> bool:
+    async def is_entry_exist(self,
+                             space_name: str,
+                             subpath: str,
+                             shortname: str,
+                             resource_type: core.ResourceType,
+                             schema_shortname: str | None = None, ) -> bool:
         pass
 
     @abstractmethod
@@ -235,6 +235,9 @@ class BaseDataAdapter(ABC):
     async def set_sql_user_session(self, user_shortname: str, token: str) -> bool:
         pass
 
+    async def refresh_sql_active_session(self, user_shortname: str) -> bool:
+        pass
+
     async def get_sql_active_session(self, user_shortname: str):
         pass
 
@@ -273,3 +276,7 @@ class BaseDataAdapter(ABC):
 
     async def get_spaces(self) -> dict:
         pass
+
+    async def close_engine(self) -> None:
+        """Release the adapter's database connections, the adapters without any have nothing to do"""
+        pass
@@ -18,12 +18,14 @@ import models.core as core
 from utils import regex
 from .base_data_adapter import BaseDataAdapter
 from models.enums import ContentType, ResourceType, LockAction
+from utils.folder_manifest import folder_manifest
 from utils.helpers import arr_remove_common, read_jsonl_file, snake_case, camel_case
 from utils.internal_error_code import InternalErrorCode
 from utils.middleware import get_request_data
 from utils.redis_services import RedisServices
 from utils.regex import FILE_PATTERN, FOLDER_PATTERN
 from utils.settings import settings
+from utils.spaces import spaces_cache
 
 
 def sort_alteration(attachments_dict, attachments_path):
@@ -328,6 +330,8 @@ class FileAdapter(BaseDataAdapter):
             file.flush()
             os.fsync(file)
 
+        folder_manifest.upsert(space_name, subpath, meta)
+
     async def create(
             self, space_name: str, subpath: str, meta: core.Meta
     ):
@@ -350,6 +354,8 @@ class FileAdapter(BaseDataAdapter):
             file.flush()
             os.fsync(file)
 
+        folder_manifest.upsert(space_name, subpath, meta)
+
     async def save_payload(
             self, space_name: str, subpath: str, meta: core.Meta, attachment
     ):
@@ -478,6 +484,8 @@ class FileAdapter(BaseDataAdapter):
             file.flush()
             os.fsync(file)
 
+        folder_manifest.upsert(space_name, subpath, meta)
+
         if issubclass(meta.__class__, core.Log):
             return {}
 
@@ -605,6 +613,7 @@ class FileAdapter(BaseDataAdapter):
 
         meta_updated = False
         dest_path_without_dm = dest_path
+        src_meta = meta.model_copy()
         if dest_shortname:
             meta.shortname = dest_shortname
             meta_updated = True
@@ -664,6 +673,9 @@ class FileAdapter(BaseDataAdapter):
                 opened_file.flush()
                 os.fsync(opened_file)
 
+        folder_manifest.remove(space_name, src_subpath, src_meta)
+        folder_manifest.upsert(space_name, dest_subpath or src_subpath, meta)
+
         # Delete Src path if empty
         if src_path.parent.is_dir():
             self.delete_empty(src_path)
@@ -729,7 +741,7 @@ class FileAdapter(BaseDataAdapter):
             )
             copy_file(src=src_payload_file_path, dst=dist_payload_file_path)
 
-    def is_entry_exist(
+    async def is_entry_exist(
             self,
             space_name: str,
             subpath: str,
@@ -825,6 +837,8 @@ class FileAdapter(BaseDataAdapter):
                 if payload_file_path.exists() and payload_file_path.is_file():
                     os.remove(payload_file_path)
 
+            folder_manifest.remove(space_name, subpath, meta)
+
         history_path = f"{settings.spaces_folder}/{space_name}" + \
                        f"{subpath}/.dm/{meta.shortname}"
 
@@ -869,10 +883,7 @@ class FileAdapter(BaseDataAdapter):
                     )
 
     async def fetch_space(self, space_name: str) -> core.Space | None:
-        spaces = await self.get_spaces()
-        if space_name not in spaces:
-            return None
-        return core.Space.model_validate_json(spaces[space_name])
+        return await spaces_cache.get_space(space_name)
 
 
     async def get_entry_attachments(
@@ -948,8 +959,4 @@ class FileAdapter(BaseDataAdapter):
             return {}
 
     async def get_spaces(self) -> dict:
-        async with RedisServices() as redis_services:
-            value = await redis_services.get_doc_by_id("spaces")
-            if isinstance(value, dict):
-                return value
-            return {}
+        return await spaces_cache.get_documents()
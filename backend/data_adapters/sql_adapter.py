@@ -1,11 +1,11 @@
 # type: ignore
 import json
 import re
-import subprocess
 import sys
 import time
 from copy import copy
 from datetime import datetime
+from importlib.util import find_spec
 from pathlib import Path
 from typing import Any, Type, Tuple
 from uuid import uuid4
@@ -13,8 +13,10 @@ from uuid import uuid4
 import sqlalchemy
 from fastapi import status
 from fastapi.logger import logger
-from sqlalchemy import text, delete, func
-from sqlmodel import create_engine, Session, select
+from sqlalchemy import text, delete, func, update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 import models.api as api
 import models.core as core
@@ -38,12 +40,12 @@ from utils.database.create_tables import (
 from utils.helpers import (
     arr_remove_common,
     get_removed_items,
-    str_to_datetime,
     camel_case,
 )
 from utils.internal_error_code import InternalErrorCode
+from utils.jsonl_reader import jsonl_reader
 from utils.middleware import get_request_data
-from utils.password_hashing import hash_password
+from utils.password_hashing import session_fingerprint
 from utils.settings import settings
 from .base_data_adapter import BaseDataAdapter
 
@@ -103,6 +105,22 @@ mysql_aggregate_functions = [
     "var_samp",
 ]
 
+# settings.database_driver => the dialect+driver of the async engine,
+# the driver is imported under its own name and only psycopg ships in requirements.txt
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+    "postgresql+asyncpg": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+aiomysql": "mysql+aiomysql",
+    "mysql+asyncmy": "mysql+asyncmy",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "sqlite+aiosqlite": "sqlite+aiosqlite",
+}
+
 sqlite_aggregate_functions = [
     "avg",
     "count",
@@ -187,79 +205,36 @@ async def events_query(
     if not path.is_file():
         return total, records
 
-    result = []
-    if query.search:
-        p = subprocess.Popen(
-            ["grep", f'"{query.search}"', path], stdout=subprocess.PIPE
-        )
-        p = subprocess.Popen(
-            ["tail", "-n", f"{query.limit + query.offset}"],
-            stdin=p.stdout,
-            stdout=subprocess.PIPE,
-        )
-        p = subprocess.Popen(["tac"], stdin=p.stdout, stdout=subprocess.PIPE)
-        if query.offset > 0:
-            p = subprocess.Popen(
-                ["sed", f"1,{query.offset}d"],
-                stdin=p.stdout,
-                stdout=subprocess.PIPE,
-            )
-        r, _ = p.communicate()
-        result = list(filter(None, r.decode("utf-8").split("\n")))
-    else:
-        cmd = f"(tail -n {query.limit + query.offset} {path}; echo) | tac"
-        if query.offset > 0:
-            cmd += f" | sed '1,{query.offset}d'"
-        result = list(
-            filter(
+    total, result = jsonl_reader.read_latest(
+        path,
+        query.offset,
+        query.limit,
+        from_date=query.from_date,
+        to_date=query.to_date,
+        search=query.search,
+    )
+    actions = [json.loads(line) for line in result]
+
+    accessible = await access_control.filter_accessible(
+        user_shortname,
+        query.space_name,
+        [
+            (
+                action_obj.get("resource", {}).get("subpath", "/"),
+                action_obj["resource"]["type"],
+                None,
+                None,
+                False,
+                {},
                 None,
-                subprocess.run(
-                    [cmd], capture_output=True, text=True, shell=True
-                ).stdout.split("\n"),
             )
-        )
-
-    if query.search:
-        p1 = subprocess.Popen(
-            ["grep", f'"{query.search}"', path], stdout=subprocess.PIPE
-        )
-        p2 = subprocess.Popen(["wc", "-l"], stdin=p1.stdout, stdout=subprocess.PIPE)
-        r, _ = p2.communicate()
-        total = int(
-            r.decode(),
-            10,
-        )
-    else:
-        total = int(
-            subprocess.run(
-                [f"wc -l < {path}"],
-                capture_output=True,
-                text=True,
-                shell=True,
-            ).stdout,
-            10,
-        )
-    for line in result:
-        action_obj = json.loads(line)
-        if (
-                query.from_date
-                and str_to_datetime(action_obj["timestamp"]) < query.from_date
-        ):
-            continue
-
-        if query.to_date and str_to_datetime(action_obj["timestamp"]) > query.to_date:
-            break
-
-        if not await access_control.check_access(
-                user_shortname=user_shortname,
-                space_name=query.space_name,
-                subpath=action_obj.get(
-                    "resource", {}).get("subpath", "/"),
-                resource_type=action_obj["resource"]["type"],
-                action_type=core.ActionType(action_obj["request"]),
-        ):
+            for action_obj in actions
+        ],
+        [core.ActionType(action_obj["request"]) for action_obj in actions],
+    )
+    for action_obj, is_accessible in zip(actions, accessible):
+        if not is_accessible:
             continue
-
         records.append(
             core.Record(
                 resource_type=action_obj["resource"]["type"],
@@ -452,7 +427,8 @@ def set_table_for_query(query):
 
 
 class SQLAdapter(BaseDataAdapter):
-    session: Session = None
+    # One pooled engine per worker process, shared by all the adapter instances
+    engine: AsyncEngine | None = None
 
     def locators_query(self, query: api.Query) -> tuple[int, list[core.Locator]]:
         locators: list[core.Locator] = []
@@ -480,16 +456,50 @@ class SQLAdapter(BaseDataAdapter):
         pass
 
     def __init__(self):
-        self.database_connection_string = f"{settings.database_driver}://{settings.database_username}:{settings.database_password}@{settings.database_host}:{settings.database_port}"
+        driver = ASYNC_DRIVERS.get(settings.database_driver)
+        if driver is None:
+            raise ValueError(
+                f"Unsupported database_driver {settings.database_driver}, "
+                f"the sql adapter runs on an async engine, supported drivers: {', '.join(ASYNC_DRIVERS)}"
+            )
+        driver_module = driver.split("+")[1]
+        if find_spec(driver_module) is None:
+            raise ValueError(
+                f"The database_driver {settings.database_driver} runs on the {driver} async engine, "
+                f"its {driver_module} package is not installed (pip install {driver_module})"
+            )
+        self.driver: str = driver
+        if self.driver.startswith("sqlite"):
+            # The sqlite database is a file, database_name is its path
+            self.database_connection_string = f"{self.driver}://"
+        else:
+            self.database_connection_string = f"{self.driver}://{settings.database_username}:{settings.database_password}@{settings.database_host}:{settings.database_port}"
 
-    def get_session(self):
-        if self.session is None:
+    def get_engine(self) -> AsyncEngine:
+        if SQLAdapter.engine is None:
             connection_string = (
                 f"{self.database_connection_string}/{settings.database_name}"
             )
-            engine = create_engine(connection_string, echo=False)
-            self.session = Session(engine)
-        return self.session
+            pool_options: dict[str, Any] = {"pool_pre_ping": settings.database_pool_pre_ping}
+            # sqlite connections are local files, the pool is left to the dialect's defaults
+            if not self.driver.startswith("sqlite"):
+                pool_options.update(
+                    pool_size=settings.database_pool_size,
+                    max_overflow=settings.database_max_overflow,
+                    pool_timeout=settings.database_pool_timeout,
+                    pool_recycle=settings.database_pool_recycle,
+                )
+            SQLAdapter.engine = create_async_engine(connection_string, echo=False, **pool_options)
+        return SQLAdapter.engine
+
+    def get_session(self) -> AsyncSession:
+        """A new session per unit of work, connections are borrowed from the engine's pool"""
+        return AsyncSession(self.get_engine(), expire_on_commit=False)
+
+    async def close_engine(self) -> None:
+        if SQLAdapter.engine is not None:
+            await SQLAdapter.engine.dispose()
+            SQLAdapter.engine = None
 
     def get_table(
             self, class_type: Type[core.Meta]
@@ -588,7 +598,7 @@ class SQLAdapter(BaseDataAdapter):
             retrieve_json_payload: bool = False,
     ) -> dict:
         attachments_dict: dict[str, list] = {}
-        with self.get_session() as session:
+        async with self.get_session() as session:
             if not subpath.startswith("/"):
                 subpath = f"/{subpath}"
 
@@ -601,7 +611,7 @@ class SQLAdapter(BaseDataAdapter):
                 .where(Attachments.space_name == space_name)
                 .where(Attachments.subpath == f"{subpath}/{shortname}")
             )
-            results = list(session.exec(statement).all())
+            results = list((await session.exec(statement)).all())
 
             if len(results) == 0:
                 return attachments_dict
@@ -674,7 +684,7 @@ class SQLAdapter(BaseDataAdapter):
 
         shortname = shortname.replace("/", "")
 
-        with self.get_session() as session:
+        async with self.get_session() as session:
             table = self.get_table(class_type)
 
             statement = select(table).where(table.space_name == space_name)
@@ -683,7 +693,7 @@ class SQLAdapter(BaseDataAdapter):
             else:
                 statement = statement.where(table.shortname == shortname).where(table.subpath == subpath)
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return None
 
@@ -705,7 +715,7 @@ class SQLAdapter(BaseDataAdapter):
                 return None
 
     async def get_entry_by_criteria(self, criteria: dict, table: Any = None) -> core.Meta:  # type: ignore
-        with self.get_session() as session:
+        async with self.get_session() as session:
             if table is None:
                 tables = [Entries, Users, Roles, Permissions, Spaces, Attachments]
                 for table in tables:
@@ -717,7 +727,7 @@ class SQLAdapter(BaseDataAdapter):
                             ).params({k: f"{v}%"})
                         else:
                             statement = statement.where(text(f"{k}=:{k}")).params({k: v})
-                        result = session.exec(statement).all()
+                        result = (await session.exec(statement)).all()
                         if len(result) != 0:
                             return result[0]
                 return None
@@ -730,7 +740,7 @@ class SQLAdapter(BaseDataAdapter):
                         ).params({k: f"{v}%"})
                     else:
                         statement = statement.where(text(f"{k}=:{k}")).params({k: v})
-                    result = session.exec(statement).all()
+                    result = (await session.exec(statement)).all()
                     if len(result) != 0:
                         return result[0]
                 return None
@@ -738,7 +748,7 @@ class SQLAdapter(BaseDataAdapter):
     async def query(
             self, query: api.Query | None = None, user_shortname: str | None = None
     ) -> Tuple[int, list[core.Record]]:
-        with (self.get_session() as session):
+        async with self.get_session() as session:
             if not query.subpath.startswith("/"):
                 query.subpath = f"/{query.subpath}"
 
@@ -765,10 +775,10 @@ class SQLAdapter(BaseDataAdapter):
                 statement_total = await set_sql_statement_from_query(table, statement_total, query, True)
 
             try:
-                total = session.execute(statement_total).scalar()
+                total = (await session.execute(statement_total)).scalar()
                 if query.type == QueryType.counters:
                     return total, []
-                results = list(session.exec(statement).all())
+                results = list((await session.exec(statement)).all())
                 if len(results) == 0:
                     return 0, []
 
@@ -820,7 +830,7 @@ class SQLAdapter(BaseDataAdapter):
             schema_shortname: str | None = None,
     ) -> dict[str, Any] | None:
         """Load a Meta class payload file"""
-        with self.get_session() as session:
+        async with self.get_session() as session:
             table = self.get_table(class_type)
             if not subpath.startswith("/"):
                 subpath = f"/{subpath}"
@@ -833,7 +843,7 @@ class SQLAdapter(BaseDataAdapter):
                     table.shortname == filename.replace('.json', '')
                 )
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return None
 
@@ -844,7 +854,7 @@ class SQLAdapter(BaseDataAdapter):
     ):
         """Save"""
         try:
-            with self.get_session() as session:
+            async with self.get_session() as session:
                 entity = {
                     **meta.model_dump(),
                     "space_name": space_name,
@@ -874,7 +884,7 @@ class SQLAdapter(BaseDataAdapter):
                     data = self.get_base_model(meta.__class__, entity)
 
                     session.add(data)
-                    session.commit()
+                    await session.commit()
                 except Exception as e:
                     logger.error(f"Failed parsing an entry. Error: {e}")
                     return None
@@ -952,10 +962,10 @@ class SQLAdapter(BaseDataAdapter):
             attachment_media: Any | None = None,
     ) -> dict:
         """Update the entry, store the difference and return it"""
-        with self.get_session() as session:
-            result = await self.load(
-                space_name, subpath, meta.shortname, meta.__class__
-            )
+        result = await self.load(
+            space_name, subpath, meta.shortname, meta.__class__
+        )
+        async with self.get_session() as session:
             if result is None:
                 raise api.Exception(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -976,7 +986,7 @@ class SQLAdapter(BaseDataAdapter):
                     result.media = attachment_media
 
                 session.add(result)
-                session.commit()
+                await session.commit()
             except Exception as e:
                 print("[!]", e)
                 logger.error(f"Failed parsing an entry. Error: {e}")
@@ -1025,7 +1035,7 @@ class SQLAdapter(BaseDataAdapter):
             updated_attributes_flattend: list,
             resource_type,
     ) -> dict:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 diff_keys = list(old_version_flattend.keys())
                 diff_keys.extend(list(new_version_flattend.keys()))
@@ -1067,7 +1077,7 @@ class SQLAdapter(BaseDataAdapter):
                 )
 
                 session.add(Histories.model_validate(history_obj))
-                session.commit()
+                await session.commit()
 
                 return history_diff
             except Exception as e:
@@ -1094,7 +1104,7 @@ class SQLAdapter(BaseDataAdapter):
             space_name, src_subpath, src_shortname, meta.__class__
         )
 
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 table = self.get_table(meta.__class__)
                 statement = select(table).where(table.space_name == space_name)
@@ -1106,7 +1116,7 @@ class SQLAdapter(BaseDataAdapter):
                         table.shortname == dest_shortname
                     )
 
-                target = session.exec(statement).one_or_none()
+                target = (await session.exec(statement)).one_or_none()
                 if target is not None:
                     raise api.Exception(
                         status_code=status.HTTP_400_BAD_REQUEST,
@@ -1121,7 +1131,7 @@ class SQLAdapter(BaseDataAdapter):
                 origin.subpath = dest_subpath
                 origin.payload = origin.payload.model_dump()
                 session.add(origin)
-                session.commit()
+                await session.commit()
             except Exception as e:
                 print("[!move]", e)
                 logger.error(f"Failed parsing an entry. Error: {e}")
@@ -1149,13 +1159,13 @@ class SQLAdapter(BaseDataAdapter):
     ):
         pass
 
-    def is_entry_exist(self,
-                       space_name: str,
-                       subpath: str,
-                       shortname: str,
-                       resource_type: ResourceType,
-                       schema_shortname: str | None = None, ) -> bool:
-        with self.get_session() as session:
+    async def is_entry_exist(self,
+                             space_name: str,
+                             subpath: str,
+                             shortname: str,
+                             resource_type: ResourceType,
+                             schema_shortname: str | None = None, ) -> bool:
+        async with self.get_session() as session:
             resource_cls = getattr(
                 sys.modules["models.core"], camel_case(resource_type)
             )
@@ -1187,7 +1197,7 @@ class SQLAdapter(BaseDataAdapter):
                     table.shortname == shortname
                 )
 
-            result = session.exec(statement).fetchall()
+            result = (await session.exec(statement)).fetchall()
             return False if len(result) == 0 else True
 
     async def delete(
@@ -1200,7 +1210,7 @@ class SQLAdapter(BaseDataAdapter):
             retrieve_lock_status: bool | None = False,
     ):
         """Delete the file that match the criteria given, remove folder if empty"""
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 if not subpath.startswith("/"):
                     subpath = f"/{subpath}"
@@ -1208,15 +1218,15 @@ class SQLAdapter(BaseDataAdapter):
                 result = await self.load(
                     space_name, subpath, meta.shortname, meta.__class__
                 )
-                session.delete(result)
+                await session.delete(result)
                 if meta.__class__ == core.Space:
                     statement = delete(Entries) \
                         .where(Entries.space_name == space_name)  # type:ignore[call-overload]
-                    session.exec(statement)
+                    await session.exec(statement)
                     statement = delete(Attachments) \
                         .where(Attachments.space_name == space_name)  # type:ignore[call-overload]
-                    session.exec(statement)
-                session.commit()
+                    await session.exec(statement)
+                await session.commit()
             except Exception as e:
                 print("[!delete]", e)
                 logger.error(f"Failed parsing an entry. Error: {e}")
@@ -1235,13 +1245,13 @@ class SQLAdapter(BaseDataAdapter):
         if not subpath.startswith("/"):
             subpath = f"/{subpath}"
 
-        with self.get_session() as session:
+        async with self.get_session() as session:
             match action:
                 case LockAction.lock:
                     statement = select(Locks).where(Locks.space_name == space_name) \
                         .where(Locks.subpath == subpath) \
                         .where(Locks.shortname == shortname)
-                    result = session.exec(statement).one_or_none()
+                    result = (await session.exec(statement)).one_or_none()
                     if result:
                         raise api.Exception(
                             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1260,8 +1270,8 @@ class SQLAdapter(BaseDataAdapter):
                         owner_shortname=user_shortname,
                     )
                     session.add(lock)
-                    session.commit()
-                    session.refresh(lock)
+                    await session.commit()
+                    await session.refresh(lock)
                     return lock.model_dump()
                 case LockAction.fetch:
                     lock_payload = (await self.load(
@@ -1278,8 +1288,8 @@ class SQLAdapter(BaseDataAdapter):
                         .where(Locks.subpath == subpath) \
                         .where(Locks.shortname == shortname)  # type:ignore[call-overload]
 
-                    session.exec(statement)
-                    session.commit()
+                    await session.exec(statement)
+                    await session.commit()
                     return None
 
     async def fetch_space(self, space_name: str) -> core.Space | None:
@@ -1289,9 +1299,9 @@ class SQLAdapter(BaseDataAdapter):
         return core.Space.model_validate(space)
 
     async def set_sql_active_session(self, user_shortname: str, token: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
-                last_session = self.get_sql_active_session(user_shortname)
+                last_session = await self.get_sql_active_session(user_shortname)
                 if last_session is not None:
                     await self.remove_sql_active_session(user_shortname)
                 timestamp = datetime.now()
@@ -1299,18 +1309,18 @@ class SQLAdapter(BaseDataAdapter):
                     ActiveSessions(
                         uuid=uuid4(),
                         shortname=user_shortname,
-                        token=hash_password(token),
+                        token=session_fingerprint(token),
                         timestamp=timestamp,
                     )
                 )
-                session.commit()
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!set_sql_active_session]", e)
                 return False
 
     async def set_sql_user_session(self, user_shortname: str, token: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 last_session = await self.get_sql_user_session(user_shortname)
                 if last_session is not None:
@@ -1320,21 +1330,36 @@ class SQLAdapter(BaseDataAdapter):
                     Sessions(
                         uuid=uuid4(),
                         shortname=user_shortname,
-                        token=hash_password(token),
+                        token=session_fingerprint(token),
                         timestamp=timestamp,
                     )
                 )
-                session.commit()
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!set_sql_user_session]", e)
                 return False
 
+    async def refresh_sql_active_session(self, user_shortname: str) -> bool:
+        async with self.get_session() as session:
+            try:
+                statement = (
+                    update(ActiveSessions)
+                    .where(ActiveSessions.shortname == user_shortname)
+                    .values(timestamp=datetime.now())
+                )
+                await session.exec(statement)
+                await session.commit()
+                return True
+            except Exception as e:
+                print("[!refresh_sql_active_session]", e)
+                return False
+
     async def get_sql_active_session(self, user_shortname: str):
-        with self.get_session() as session:
+        async with self.get_session() as session:
             statement = select(ActiveSessions).where(ActiveSessions.shortname == user_shortname)
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return None
 
@@ -1347,10 +1372,10 @@ class SQLAdapter(BaseDataAdapter):
             return active_session.token
 
     async def get_sql_user_session(self, user_shortname: str):
-        with self.get_session() as session:
+        async with self.get_session() as session:
             statement = select(Sessions).where(Sessions.shortname == user_shortname)
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return None
 
@@ -1362,29 +1387,29 @@ class SQLAdapter(BaseDataAdapter):
             return user_session.token
 
     async def remove_sql_active_session(self, user_shortname: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 statement = delete(ActiveSessions).where(ActiveSessions.shortname == user_shortname)
-                session.exec(statement)
-                session.commit()
+                await session.exec(statement)
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!remove_sql_active_session]", e)
                 return False
 
     async def remove_sql_user_session(self, user_shortname: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 statement = delete(Sessions).where(Sessions.shortname == user_shortname)
-                session.exec(statement)
-                session.commit()
+                await session.exec(statement)
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!remove_sql_user_session]", e)
                 return False
 
     async def set_invitation(self, invitation_token: str, invitation_value):
-        with self.get_session() as session:
+        async with self.get_session() as session:
             timestamp = datetime.now()
             try:
                 session.add(
@@ -1395,28 +1420,28 @@ class SQLAdapter(BaseDataAdapter):
                         timestamp=timestamp,
                     )
                 )
-                session.commit()
+                await session.commit()
             except Exception as e:
                 print("[!set_sql_active_session]", e)
 
     async def get_invitation_token(self, invitation_token: str):
-        with self.get_session() as session:
+        async with self.get_session() as session:
             statement = select(Invitations).where(Invitations.invitation_token == invitation_token)
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return None
 
             user_session = Invitations.model_validate(result)
 
             statement = delete(Invitations).where(Invitations.invitation_token == invitation_token)
-            session.exec(statement)
-            session.commit()
+            await session.exec(statement)
+            await session.commit()
 
             return user_session.invitation_value
 
     async def set_url_shortner(self, token_uuid: str, url: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 session.add(
                     URLShorts(
@@ -1426,15 +1451,15 @@ class SQLAdapter(BaseDataAdapter):
                         timestamp=datetime.now(),
                     )
                 )
-                session.commit()
+                await session.commit()
             except Exception as e:
                 print("[!set_sql_active_session]", e)
 
     async def get_url_shortner(self, token_uuid: str) -> str | None:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             statement = select(URLShorts).where(URLShorts.token_uuid == token_uuid)
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return None
 
@@ -1446,11 +1471,11 @@ class SQLAdapter(BaseDataAdapter):
             return url_shortner.url
 
     async def delete_url_shortner(self, token_uuid: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 statement = delete(URLShorts).where(URLShorts.token_uuid == token_uuid)
-                session.exec(statement)
-                session.commit()
+                await session.exec(statement)
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!remove_sql_user_session]", e)
@@ -1477,21 +1502,21 @@ class SQLAdapter(BaseDataAdapter):
         return results
 
     async def clear_failed_password_attempts(self, user_shortname: str) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 statement = delete(FailedLoginAttempts).where(FailedLoginAttempts.shortname == user_shortname)
-                session.exec(statement)
-                session.commit()
+                await session.exec(statement)
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!clear_failed_password_attempts]", e)
                 return False
 
     async def get_failed_password_attempt_count(self, user_shortname: str) -> int:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             statement = select(FailedLoginAttempts).where(FailedLoginAttempts.shortname == user_shortname)
 
-            result = session.exec(statement).one_or_none()
+            result = (await session.exec(statement)).one_or_none()
             if result is None:
                 return 0
 
@@ -1500,10 +1525,10 @@ class SQLAdapter(BaseDataAdapter):
             return failed_login_attempt.attempt_count
 
     async def set_failed_password_attempt_count(self, user_shortname: str, attempt_count: int) -> bool:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             try:
                 statement = select(FailedLoginAttempts).where(FailedLoginAttempts.shortname == user_shortname)
-                result = session.exec(statement).one_or_none()
+                result = (await session.exec(statement)).one_or_none()
 
                 if result is None:
                     session.add(
@@ -1517,16 +1542,16 @@ class SQLAdapter(BaseDataAdapter):
                 else:
                     result.attempt_count = attempt_count
 
-                session.commit()
+                await session.commit()
                 return True
             except Exception as e:
                 print("[!set_failed_password_attempt_count]", e)
                 return False
 
     async def get_spaces(self) -> dict:
-        with self.get_session() as session:
+        async with self.get_session() as session:
             statement = select(Spaces)
-            results = session.exec(statement).all()
+            results = (await session.exec(statement)).all()
             spaces = {}
             for idx, item in enumerate(results):
                 space = Spaces.model_validate(item)
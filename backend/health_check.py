@@ -170,7 +170,6 @@ async def soft_health_check(
     schemas = spaces_schemas[space_name]
     
     limit = 1000
-    offset = 0
     folders_report : dict = {}
     async with RedisServices() as redis:
         try:
@@ -180,17 +179,7 @@ async def soft_health_check(
             if 'meta_schema' not in schema_name:
                 print(f"can't find index: `{space_name}:{schema_name}`")
             return None
-        while True:
-            search_query = Query(query_string="*")
-            search_query.paging(offset, limit)
-            offset += limit
-            x = await ft_index.search(query=search_query)
-            if x and isinstance(x, dict) and "results" in x:
-                res_data : list = [one["extra_attributes"]["$"] for one in x["results"] if "extra_attributes" in one]
-                if not res_data:
-                    break
-            else: 
-                break
+        async for res_data in redis.iter_documents(f"{space_name}:{schema_name}", batch_size=limit):
             for redis_doc_dict in res_data:
                 redis_doc_dict = json.loads(redis_doc_dict)
                 subpath = redis_doc_dict['subpath']
@@ -417,47 +406,42 @@ async def save_duplicated_entries() -> None:
             space_data = json.loads(space_data)
             try:
                 ft_index = redis.ft(f"{space_name}:meta")
-                index_info = await ft_index.info()
+                await ft_index.info()
             except Exception:
                 continue
-            for i in range(0, int(index_info["num_docs"]), 10000):
-                search_query = Query(query_string="*")
-                search_query.paging(i, 10000)
-                x = await ft_index.search(query=search_query)
-                if x and isinstance(x, dict) and "results" in x:
-                    res_data : list = [ one["extra_attributes"]["$"] for one in x["results"] if 'extra_attributes' in one]
-                    for redis_doc_dict in res_data:
-                        redis_doc_dict = json.loads(redis_doc_dict)
-                        if isinstance(redis_doc_dict, dict):
-                            if "uuid" in redis_doc_dict:
-                                # Handle UUID
-                                if "uuid" in redis_doc_dict and redis_doc_dict["uuid"] in uuid_scanned_entries:
-                                    short_uuid = redis_doc_dict["uuid"][:8]
-                                    uuid_duplicated_entries.setdefault(
-                                        short_uuid, {"loc": [], "total": 0}
-                                    )
-                                    uuid_duplicated_entries[short_uuid]["loc"].append(
-                                        space_name + "/" + redis_doc_dict['subpath'] + "/" + redis_doc_dict['shortname']
-                                    )
-                                    uuid_duplicated_entries[short_uuid]["total"]+=1
-                                else:
-                                    uuid_scanned_entries.add(redis_doc_dict["uuid"])
-                            else:
-                                print ("UUID is missing", redis_doc_dict)
-                        
-                            # Handle Slug
-                            if "slug" in redis_doc_dict and redis_doc_dict["slug"] in slug_scanned_entries:
-                                slug_duplicated_entries.setdefault(
-                                    "slug", {"loc": [], "total": 0}
+            async for res_data in redis.iter_documents(f"{space_name}:meta", batch_size=10000):
+                for redis_doc_dict in res_data:
+                    redis_doc_dict = json.loads(redis_doc_dict)
+                    if isinstance(redis_doc_dict, dict):
+                        if "uuid" in redis_doc_dict:
+                            # Handle UUID
+                            if "uuid" in redis_doc_dict and redis_doc_dict["uuid"] in uuid_scanned_entries:
+                                short_uuid = redis_doc_dict["uuid"][:8]
+                                uuid_duplicated_entries.setdefault(
+                                    short_uuid, {"loc": [], "total": 0}
                                 )
-                                slug_duplicated_entries["slug"]["loc"].append(
+                                uuid_duplicated_entries[short_uuid]["loc"].append(
                                     space_name + "/" + redis_doc_dict['subpath'] + "/" + redis_doc_dict['shortname']
                                 )
-                                slug_duplicated_entries["slug"]["total"]+=1
-                            elif "slug" in redis_doc_dict:
-                                slug_scanned_entries.add(redis_doc_dict["slug"])
+                                uuid_duplicated_entries[short_uuid]["total"]+=1
+                            else:
+                                uuid_scanned_entries.add(redis_doc_dict["uuid"])
                         else:
-                            print("Loaded document is not a proper dictionary")
+                            print ("UUID is missing", redis_doc_dict)
+                    
+                        # Handle Slug
+                        if "slug" in redis_doc_dict and redis_doc_dict["slug"] in slug_scanned_entries:
+                            slug_duplicated_entries.setdefault(
+                                "slug", {"loc": [], "total": 0}
+                            )
+                            slug_duplicated_entries["slug"]["loc"].append(
+                                space_name + "/" + redis_doc_dict['subpath'] + "/" + redis_doc_dict['shortname']
+                            )
+                            slug_duplicated_entries["slug"]["total"]+=1
+                        elif "slug" in redis_doc_dict:
+                            slug_scanned_entries.add(redis_doc_dict["slug"])
+                    else:
+                        print("Loaded document is not a proper dictionary")
                         
                         
 
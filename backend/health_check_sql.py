@@ -51,9 +51,9 @@ async def main(health_type: str, space_param: str, schemas_param: list):
 
 
 async def hard_space_check(space):
-    with SQLAdapter().get_session() as session:
+    async with SQLAdapter().get_session() as session:
         sql_stm = select(Entries).where(Entries.space_name == space)
-        entries = list(session.exec(sql_stm).all())
+        entries = list((await session.exec(sql_stm)).all())
         folders_report: dict[str, dict[str, Any]] = {}
         for entry in entries:
             subpath = entry.subpath[1:]
@@ -68,11 +68,11 @@ async def hard_space_check(space):
                 continue
 
             body = entry.payload["body"] # type: ignore
-            schema_data = session.exec(
+            schema_data = (await session.exec(
                 select(Entries)
               .where(Entries.shortname == entry.payload["schema_shortname"]) # type: ignore
               .where(Entries.subpath == "/schema")
-            ).first() # type: ignore
+            )).first() # type: ignore
 
             if schema_data is None or schema_data.payload is None \
                     or not schema_data.payload.get("body", None): # type: ignore
@@ -5,7 +5,7 @@ from contextlib import asynccontextmanager
 import asyncio
 import json
 from os import getpid
-import sys
+from random import random
 import time
 import traceback
 from datetime import datetime
@@ -15,9 +15,8 @@ from jsonschema.exceptions import ValidationError as SchemaValidationError
 from pydantic import ValidationError
 from languages.loader import load_langs
 from utils.middleware import CustomRequestMiddleware, ChannelMiddleware
-from utils.jwt import JWTBearer
-from utils.plugin_manager import plugin_manager
-from utils.spaces import initialize_spaces
+from utils.plugin_manager import plugin_executor, plugin_manager
+from utils.spaces import initialize_spaces, spaces_cache
 from fastapi import Depends, FastAPI, Request, Response, status
 from utils.logger import logging_schema
 from fastapi.logger import logger
@@ -27,10 +26,12 @@ from utils.access_control import access_control
 from fastapi.responses import JSONResponse
 from hypercorn.asyncio import serve
 from hypercorn.config import Config
-from starlette.concurrency import iterate_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import models.api as api
 from utils.settings import settings
+from utils.websocket_fanout import channel_events_batcher
 from asgi_correlation_id import CorrelationIdMiddleware
 
 from api.managed.router import router as managed
@@ -39,6 +40,7 @@ from api.public.router import router as public
 from api.user.router import router as user
 from api.info.router import router as info
 from utils.redis_services import RedisServices
+from data_adapters.adapter import data_adapter as db
 from utils.internal_error_code import InternalErrorCode
 
 
@@ -46,6 +48,7 @@ from utils.internal_error_code import InternalErrorCode
 async def lifespan(app: FastAPI):
     logger.info("Starting up")
     print('{"stage":"starting up"}')
+    listeners: list[asyncio.Task] = []
     try:
         openapi_schema = app.openapi()
         paths = openapi_schema["paths"]
@@ -58,12 +61,21 @@ async def lifespan(app: FastAPI):
 
         await initialize_spaces()
         await access_control.load_permissions_and_roles()
+        listeners.append(asyncio.create_task(access_control.listen_for_invalidations()))
+        await plugin_manager.load_spaces_plugins()
+        listeners.append(asyncio.create_task(spaces_cache.listen_for_changes()))
         # await plugin_manager.load_plugins(app, capture_body)
 
         yield
 
+        await plugin_executor.drain(settings.plugin_drain_timeout)
+        await channel_events_batcher.close()
     finally:
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
         await RedisServices().close_pool()
+        await db.close_engine()
 
     logger.info("Application shutting down")
     print('{"stage":"shutting down"}')
@@ -152,11 +164,14 @@ app.add_middleware(CustomRequestMiddleware)
 app.add_middleware(ChannelMiddleware)
 
 
-def set_middleware_extra(request, response, start_time, user_shortname, exception_data, response_body):
+def set_middleware_extra(
+    request, status_code, response_headers, start_time, timing, user_shortname, exception_data, response_body
+):
     extra = {
         "props": {
             "timestamp": start_time,
-            "duration": 1000 * (time.time() - start_time),
+            "duration": timing["duration"],
+            "time_to_first_byte": timing["time_to_first_byte"],
             "server": settings.servername,
             "process_id": getpid(),
             "user_shortname": user_shortname,
@@ -168,8 +183,8 @@ def set_middleware_extra(request, response, start_time, user_shortname, exceptio
                 "headers": dict(request.headers.items()),
             },
             "response": {
-                "headers": dict(response.headers.items()),
-                "http_status": response.status_code,
+                "headers": dict(response_headers.items()),
+                "http_status": status_code,
             },
         }
     }
@@ -186,7 +201,7 @@ def set_middleware_extra(request, response, start_time, user_shortname, exceptio
     return extra
 
 
-def set_middleware_response_headers(request, response):
+def set_middleware_response_headers(request, headers: MutableHeaders):
     referer = request.headers.get(
         "referer",
         request.headers.get("origin",
@@ -197,32 +212,32 @@ def set_middleware_response_headers(request, response):
                             )),
     )
     origin = urlparse(referer)
-    response.headers[
+    headers[
         "Access-Control-Allow-Origin"
     ] = f"{origin.scheme}://{origin.netloc}"
 
-    if "localhost" in response.headers["Access-Control-Allow-Origin"]:
-        response.headers["Access-Control-Allow-Origin"] = "*"
+    if "localhost" in headers["Access-Control-Allow-Origin"]:
+        headers["Access-Control-Allow-Origin"] = "*"
 
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    response.headers["Access-Control-Allow-Headers"] = "content-type, charset, authorization, accept-language, content-length"
-    response.headers["Access-Control-Max-Age"] = "600"
-    response.headers[
+    headers["Access-Control-Allow-Credentials"] = "true"
+    headers["Access-Control-Allow-Headers"] = "content-type, charset, authorization, accept-language, content-length"
+    headers["Access-Control-Max-Age"] = "600"
+    headers[
         "Access-Control-Allow-Methods"
     ] = "OPTIONS, DELETE, POST, GET, PATCH, PUT"
 
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    response.headers["x-server-time"] = datetime.now().isoformat()
-    response.headers["Access-Control-Expose-Headers"] = "x-server-time"
-    return response
+    headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    headers["Pragma"] = "no-cache"
+    headers["Expires"] = "0"
+    headers["x-server-time"] = datetime.now().isoformat()
+    headers["Access-Control-Expose-Headers"] = "x-server-time"
+    return headers
 
 
-def set_logging(response, extra, request, exception_data):
-    if 400 <= response.status_code < 500:
+def set_logging(status_code, extra, request, exception_data):
+    if 400 <= status_code < 500:
         logger.warning("Served request", extra=extra)
-    elif response.status_code >= 500 or exception_data is not None:
+    elif status_code >= 500 or exception_data is not None:
         logger.error("Served request", extra=extra)
     elif request.method != "OPTIONS":  # Do not log OPTIONS request, to reduce excessive logging
         logger.info("Served request", extra=extra)
@@ -239,39 +254,17 @@ def set_stack(e):
         if "site-packages" not in frame.f_code.co_filename
     ]
 
-@app.middleware("http")
-async def middle(request: Request, call_next):
-    """Wrapper function to manage errors and logging"""
-    if request.url._url.endswith("/docs") or request.url._url.endswith("openapi.json"):
-        return await call_next(request)
 
-    start_time = time.time()
-    response_body: str | dict = {}
-    exception_data: dict[str, Any] | None = None
-    try:
-        response = await call_next(request)
-        raw_response = [section async for section in response.body_iterator]
-        response.body_iterator = iterate_in_threadpool(iter(raw_response))
-        raw_data = b"".join(raw_response)
-        if raw_data:
-            try:
-                response_body = json.loads(raw_data)
-            except Exception:
-                response_body = {}
-    except api.Exception as e:
-        response = JSONResponse(
+def exception_response(e: BaseException) -> JSONResponse:
+    if isinstance(e, api.Exception):
+        return JSONResponse(
             status_code=e.status_code,
             content=jsonable_encoder(
                 api.Response(status=api.Status.failed, error=e.error)
             ),
         )
-        stack = set_stack(e)
-        exception_data = {"props": {"exception": str(e), "stack": stack}}
-        response_body = json.loads(str(response.body, 'utf8'))
-    except ValidationError as e:
-        stack = set_stack(e)
-        exception_data = {"props": {"exception": str(e), "stack": stack}}
-        response = JSONResponse(
+    if isinstance(e, ValidationError):
+        return JSONResponse(
             status_code=422,
             content={
                 "status": "failed",
@@ -282,11 +275,8 @@ async def middle(request: Request, call_next):
                 },
             },
         )
-        response_body = json.loads(str(response.body, 'utf8'))
-    except SchemaValidationError as e:
-        stack = set_stack(e)
-        exception_data = {"props": {"exception": str(e), "stack": stack}}
-        response = JSONResponse(
+    if isinstance(e, SchemaValidationError):
+        return JSONResponse(
             status_code=400,
             content={
                 "status": "failed",
@@ -300,40 +290,111 @@ async def middle(request: Request, call_next):
                 },
             },
         )
-        response_body = json.loads(str(response.body, 'utf8'))
-    except Exception:
-        exception_message = ""
-        stack = None
-        if ee := sys.exc_info()[1]:
-            stack = set_stack(ee)
-            exception_message = str(ee)
-            exception_data = {"props": {"exception": str(ee), "stack": stack}}
-
-        error_log = {"code": 99, "message": exception_message}
-        if settings.debug_enabled:
-            error_log["stack"] = stack
-        response = JSONResponse(
-            status_code=500,
-            content={
-                "status": "failed",
-                "error": error_log,
-            },
-        )
-        response_body = json.loads(str(response.body, 'utf8'))
 
-    response = set_middleware_response_headers(request, response)
+    error_log: dict[str, Any] = {"code": 99, "message": str(e)}
+    if settings.debug_enabled:
+        error_log["stack"] = set_stack(e)
+    return JSONResponse(
+        status_code=500,
+        content={
+            "status": "failed",
+            "error": error_log,
+        },
+    )
 
-    user_shortname = "guest"
-    try:
-        user_shortname = str(await JWTBearer().__call__(request))
-    except Exception:
-        pass
 
-    extra = set_middleware_extra(request, response, start_time, user_shortname, exception_data, response_body)
+class LoggingMiddleware:
+    """
+    Manage errors and logging without buffering the responses,
+    only a prefix of the json bodies of a sample of the requests is kept for the log
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["path"].endswith("/docs")
+            or scope["path"].endswith("openapi.json")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.time()
+        start_counter = time.perf_counter()
+        # Shared with the routes, JWTBearer stores the user shortname in it
+        scope.setdefault("state", {})
+        request = Request(scope, receive)
+        capture_size = (
+            settings.log_response_body_max_size
+            if random() < settings.log_response_body_sample_rate
+            else 0
+        )
+        response_start: dict[str, Any] = {}
+        body_prefix = bytearray()
+        body_truncated = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal capture_size, body_truncated
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                set_middleware_response_headers(request, headers)
+                response_start["status"] = message["status"]
+                response_start["headers"] = headers
+                response_start["time"] = time.perf_counter()
+                if "application/json" not in headers.get("content-type", ""):
+                    capture_size = 0
+            elif message["type"] == "http.response.body" and capture_size:
+                chunk = message.get("body", b"")
+                remaining = capture_size - len(body_prefix)
+                body_prefix.extend(chunk[:remaining])
+                if len(chunk) > remaining:
+                    body_truncated = True
+                    capture_size = 0
+            await send(message)
+
+        exception_data: dict[str, Any] | None = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            exception_data = {"props": {"exception": str(e), "stack": set_stack(e)}}
+            if response_start:
+                # The response is already on its way, it can't be replaced
+                logger.error("Failed while sending the response", extra={"props": exception_data["props"]})
+                raise
+            capture_size = settings.log_response_body_max_size
+            await exception_response(e)(scope, receive, send_wrapper)
+
+        response_body: str | dict = {}
+        if body_truncated:
+            response_body = body_prefix.decode(errors="replace")
+        elif body_prefix:
+            try:
+                response_body = json.loads(body_prefix)
+            except Exception:
+                response_body = {}
+
+        end_counter = time.perf_counter()
+        timing = {
+            "duration": 1000 * (end_counter - start_counter),
+            "time_to_first_byte": 1000 * (response_start.get("time", end_counter) - start_counter),
+        }
+        extra = set_middleware_extra(
+            request,
+            response_start.get("status", 500),
+            response_start.get("headers", {}),
+            start_time,
+            timing,
+            getattr(request.state, "user_shortname", "guest"),
+            exception_data,
+            response_body,
+        )
+
+        set_logging(response_start.get("status", 500), extra, request, exception_data)
 
-    set_logging(response, extra, request, exception_data)
 
-    return response
+app.add_middleware(LoggingMiddleware)
 
 
 app.add_middleware(
@@ -94,6 +94,8 @@ class Query(BaseModel):
     to_date: datetime | None = None
     exclude_fields: list[str] | None = None
     include_fields: list[str] | None = None
+    # Top level attributes of the records, only these are fetched from the search index
+    projection: list[str] | None = None
     highlight_fields: dict[str, str] = {}
     sort_by: str | None = None
     sort_type: SortType | None = None
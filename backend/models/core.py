@@ -21,6 +21,7 @@ from models.enums import (
     ConditionType,
     PluginType,
     EventListenTime,
+    PluginOverflow,
 )
 from utils.helpers import camel_case, remove_none_dict, snake_case
 import utils.regex as regex
@@ -525,6 +526,11 @@ class PluginWrapper(Resource):
     ordinal: int = 9999
     object: PluginBase | None = None
     dependencies: list = []
+    # Seconds before a hook is cancelled, None for settings.plugin_timeout, 0 never cancels
+    # the hooks, even on shutdown
+    timeout: float | None = None
+    # What happens to the events when the plugin's queue is full
+    on_full_queue: PluginOverflow = PluginOverflow.drop
 
 
 class NotificationData(Resource):
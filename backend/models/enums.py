@@ -181,6 +181,11 @@ class EventListenTime(StrEnum):
     after = "after"
 
 
+class PluginOverflow(StrEnum):
+    drop = "drop"
+    wait = "wait"
+
+
 class QueryType(StrEnum):
     search = "search"
     subpath = "subpath"
@@ -1,56 +1,68 @@
+from functools import lru_cache
+
 from models.core import PluginBase, Event
-from utils.async_request import AsyncRequest
 from utils.settings import settings
+from utils.websocket_fanout import channel_events_batcher
+
+all_MKW = "__ALL__"
+
+
+@lru_cache(maxsize=4096)
+def event_channels(
+    space_name: str, subpath: str, schema_shortname: str | None, action_type: str, state: str
+) -> list[str]:
+    # if subpath = parent/child
+    # send to channels with subpaths "parent" and "parent/child"
+    channels: list[str] = []
+    subpath_prefix = ""
+    for subpath_part in subpath.split("/"):
+        if not subpath_part:
+            continue
+        subpath_prefix += subpath_part
+
+        # Consider channels with __ALL__ magic word
+        channels.extend([
+            f"{space_name}:{subpath_prefix}:{schema_shortname}:{action_type}:{state}",
+
+            f"{space_name}:{subpath_prefix}:{all_MKW}:{action_type}:{state}",
+            f"{space_name}:{subpath_prefix}:{schema_shortname}:{all_MKW}:{state}",
+            f"{space_name}:{subpath_prefix}:{schema_shortname}:{action_type}:{all_MKW}",
+
+            f"{space_name}:{subpath_prefix}:{all_MKW}:{all_MKW}:{state}",
+            f"{space_name}:{subpath_prefix}:{schema_shortname}:{all_MKW}:{all_MKW}",
+            f"{space_name}:{subpath_prefix}:{all_MKW}:{action_type}:{all_MKW}",
+
+            f"{space_name}:{subpath_prefix}:{all_MKW}:{all_MKW}:{all_MKW}",
+        ])
+        subpath_prefix += "/"
+
+    return list(dict.fromkeys(channels))
 
 
 class Plugin(PluginBase):
 
     async def hook(self, data: Event):
-        all_MKW = "__ALL__"
-
-        state = data.attributes.get("state", all_MKW)
-
-        # if subpath = parent/child
-        # send to channels with subpaths "parent" and "parent/child"
-        channels = []
-        subpath = ""
-        for subpath_part in data.subpath.split("/"):
-            if not subpath_part:
-                continue
-            subpath += subpath_part
-            
-            # Consider channels with __ALL__ magic word
-            channels.extend([
-                f"{data.space_name}:{subpath}:{data.schema_shortname}:{data.action_type}:{state}",
-
-                f"{data.space_name}:{subpath}:{all_MKW}:{data.action_type}:{state}",
-                f"{data.space_name}:{subpath}:{data.schema_shortname}:{all_MKW}:{state}",
-                f"{data.space_name}:{subpath}:{data.schema_shortname}:{data.action_type}:{all_MKW}",
-
-                f"{data.space_name}:{subpath}:{all_MKW}:{all_MKW}:{state}",
-                f"{data.space_name}:{subpath}:{data.schema_shortname}:{all_MKW}:{all_MKW}",
-                f"{data.space_name}:{subpath}:{all_MKW}:{data.action_type}:{all_MKW}",
-
-                f"{data.space_name}:{subpath}:{all_MKW}:{all_MKW}:{all_MKW}",
-            ])
-            subpath += "/"
-
-        if not settings.websocket_url : 
-            return 
-
-        async with AsyncRequest() as client:
-            await client.post(
-                f"{settings.websocket_url}/broadcast-to-channels",
-                json={
-                    "channels": [*set(channels)],
-                    "message": {
-                        "title": "updated",
-                        "subpath": data.subpath,
-                        "space": data.space_name,
-                        "shortname": data.shortname,
-                        "action_type": data.action_type,
-                        "owner_shortname": data.user_shortname
-                    }
-                }
-            )
-            
+        if settings.websocket_mode != "redis" and not settings.websocket_url:
+            return
+
+        channels = event_channels(
+            data.space_name,
+            data.subpath,
+            data.schema_shortname,
+            data.action_type,
+            data.attributes.get("state", all_MKW),
+        )
+        if not channels:
+            return
+
+        message = {
+            "title": "updated",
+            "subpath": data.subpath,
+            "space": data.space_name,
+            "shortname": data.shortname,
+            "action_type": data.action_type,
+            "owner_shortname": data.user_shortname
+        }
+
+        # Delivered with the other events of its batch by a single publish or POST
+        channel_events_batcher.add(channels, message)
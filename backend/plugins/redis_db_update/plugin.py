@@ -1,5 +1,5 @@
 import sys
-from models.core import ActionType, Attachment, PluginBase, Event, Space
+from models.core import ActionType, Attachment, PluginBase, Event
 from utils.helpers import camel_case
 from utils.repository import generate_payload_string
 from data_adapters.adapter import data_adapter as db
@@ -7,7 +7,7 @@ from models import core
 from models.enums import ContentType, ResourceType
 from utils.redis_services import RedisServices
 from fastapi.logger import logger
-from create_index import main as reload_redis
+from create_index import load_folder_data_to_redis
 from utils.settings import settings
 
 
@@ -26,11 +26,8 @@ class Plugin(PluginBase):
             logger.error("invalid data at redis_db_update")
             return
 
-        spaces = await db.get_spaces()
-        if (
-            data.space_name not in spaces
-            or not Space.model_validate_json(spaces[data.space_name]).indexing_enabled
-        ):
+        space = await db.fetch_space(data.space_name)
+        if space is None or not space.indexing_enabled:
             return
 
         class_type = getattr(
@@ -46,7 +43,7 @@ class Plugin(PluginBase):
                 ActionType.delete,
                 ActionType.move,
             ]:
-                await reload_redis(for_space=data.space_name)
+                await self.reindex_folder(redis_services)
                 return
 
             if data.action_type == ActionType.delete:
@@ -144,6 +141,36 @@ class Plugin(PluginBase):
                         data.subpath,
                     )
 
+    async def reindex_folder(self, redis_services: RedisServices) -> None:
+        """
+        Drop the docs of the deleted or moved folder and everything under it,
+        then load the moved folder from its new location
+        """
+        if self.data.action_type == ActionType.move:
+            src_subpath = self.data.attributes["src_subpath"]
+            src_shortname = self.data.attributes["src_shortname"]
+        else:
+            src_subpath = self.data.subpath
+            src_shortname = self.data.shortname
+        if not src_shortname:
+            return
+
+        folder_doc_id = redis_services.generate_doc_id(
+            self.data.space_name, "meta", src_shortname, src_subpath
+        )
+        folder_doc = await redis_services.get_doc_by_id(folder_doc_id)
+        await redis_services.del_keys(
+            [folder_doc_id] + ([folder_doc["payload_doc_id"]] if folder_doc.get("payload_doc_id") else [])
+        )
+        await redis_services.delete_subpath_docs(
+            self.data.space_name, f"{src_subpath.strip('/')}/{src_shortname}"
+        )
+
+        if self.data.action_type == ActionType.move:
+            await load_folder_data_to_redis(
+                self.data.space_name, f"{self.data.subpath.strip('/')}/{self.data.shortname}"
+            )
+
     async def update_parent_entry_payload_string(self) -> None:
         async with RedisServices() as redis_services:
             # get the parent meta doc
@@ -1,4 +1,5 @@
 from models.core import PluginBase, Event
+from models.enums import ResourceType
 from utils.access_control import access_control
 from utils.settings import settings
 
@@ -8,3 +9,7 @@ class Plugin(PluginBase):
     async def hook(self, data: Event):
         if settings.active_data_db == "file":
             await access_control.load_permissions_and_roles()
+        elif data.resource_type == ResourceType.user:
+            await access_control.invalidate_user_access(data.shortname)
+        else:
+            await access_control.invalidate_user_access()
@@ -0,0 +1,150 @@
+import asyncio
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+import models.api as api
+import models.core as core
+from utils import repository
+from utils.access_control import access_control
+from utils.folder_manifest import MANIFEST_FILENAME, FolderManifest, folder_manifest
+from utils.settings import settings
+
+SPACE = "products"
+SUBPATH = "offers"
+
+
+def write_entry(meta: core.Meta, subpath: str = SUBPATH) -> None:
+    resource_type = meta.__class__.__name__.lower()
+    entry_path = settings.spaces_folder / SPACE / subpath / ".dm" / meta.shortname
+    entry_path.mkdir(parents=True, exist_ok=True)
+    (entry_path / f"meta.{resource_type}.json").write_text(meta.model_dump_json(exclude_none=True))
+
+
+def write_folder(folder: core.Folder, subpath: str = SUBPATH) -> None:
+    folder_path = settings.spaces_folder / SPACE / subpath / folder.shortname / ".dm"
+    folder_path.mkdir(parents=True, exist_ok=True)
+    (folder_path / "meta.folder.json").write_text(folder.model_dump_json(exclude_none=True))
+
+
+def content(index: int, owner_shortname: str = "dmart") -> core.Content:
+    return core.Content(
+        shortname=f"entry_{index:02}",
+        owner_shortname=owner_shortname,
+        tags=["even" if index % 2 == 0 else "odd"],
+        created_at=datetime(2024, 1, 1) + timedelta(hours=(index * 7) % 24),
+    )
+
+
+def manifest_lines() -> list[dict]:
+    manifest_file = folder_manifest.meta_path(SPACE, SUBPATH) / MANIFEST_FILENAME
+    return [json.loads(line) for line in manifest_file.read_text().splitlines()]
+
+
+@pytest.fixture(autouse=True)
+def spaces_folder(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(settings, "spaces_folder", tmp_path)
+    monkeypatch.setattr(FolderManifest, "_cache", OrderedDict())
+    (tmp_path / SPACE / SUBPATH / ".dm").mkdir(parents=True)
+    return tmp_path
+
+
+def test_upsert_and_remove_tombstones() -> None:
+    write_entry(content(1))
+    write_folder(core.Folder(shortname="archive", owner_shortname="dmart"))
+    assert [row["shortname"] for row in folder_manifest.rows(SPACE, SUBPATH)] == ["entry_01", "archive"]
+
+    second = content(2, "alibaba")
+    write_entry(second)
+    folder_manifest.upsert(SPACE, SUBPATH, second)
+    second.is_active = True
+    folder_manifest.upsert(SPACE, SUBPATH, second)
+    folder_manifest.remove(SPACE, SUBPATH, content(1))
+    # Never listed in a subpath
+    folder_manifest.upsert(SPACE, SUBPATH, core.Space(shortname=SPACE, owner_shortname="dmart"))
+
+    lines = manifest_lines()
+    assert len(lines) == 5
+    assert lines[-1] == {"shortname": "entry_01", "resource_type": "content", "deleted": True}
+
+    rows = folder_manifest.rows(SPACE, SUBPATH)
+    assert [row["shortname"] for row in rows] == ["entry_02", "archive"]
+    assert rows[0]["owner_shortname"] == "alibaba" and rows[0]["is_active"] is True
+
+    # Only the appended lines are replayed on the next read
+    folder_manifest.upsert(SPACE, SUBPATH, content(3))
+    assert [row["shortname"] for row in folder_manifest.rows(SPACE, SUBPATH)] == ["entry_02", "entry_03", "archive"]
+
+
+def test_rebuild_when_missing() -> None:
+    for index in range(3):
+        write_entry(content(index))
+    manifest_file = folder_manifest.meta_path(SPACE, SUBPATH) / MANIFEST_FILENAME
+
+    # Nothing is appended before the manifest is built
+    folder_manifest.upsert(SPACE, SUBPATH, content(0))
+    assert not manifest_file.is_file()
+
+    assert len(folder_manifest.rows(SPACE, SUBPATH)) == 3
+    assert len(manifest_lines()) == 3
+
+    write_entry(content(3))
+    manifest_file.unlink()
+    assert sorted(row["shortname"] for row in folder_manifest.rows(SPACE, SUBPATH)) == [
+        "entry_00", "entry_01", "entry_02", "entry_03"
+    ]
+    assert len(manifest_lines()) == 4
+
+    assert folder_manifest.rows(SPACE, "missing") == []
+
+
+def test_query_sorted_pages(monkeypatch) -> None:
+    for index in range(12):
+        write_entry(content(index, "alibaba" if index == 5 else "dmart"))
+
+    async def filter_accessible(user_shortname, space_name, rows, action_type=None):
+        return [row[2] != "alibaba" for row in rows]
+
+    monkeypatch.setattr(access_control, "filter_accessible", filter_accessible)
+    monkeypatch.setattr(settings, "files_query", "manifest")
+
+    def query(**attributes) -> api.Query:
+        return api.Query(type=api.QueryType.subpath, space_name=SPACE, subpath=f"/{SUBPATH}", **attributes)
+
+    async def shortnames(one: api.Query) -> tuple[int, list[str]]:
+        total, records = await repository._serve_query_subpath(one, "dmart")
+        return total, [record.shortname for record in records]
+
+    expected = sorted(
+        (content(index) for index in range(12) if index != 5),
+        key=lambda meta: meta.created_at,
+        reverse=True,
+    )
+    total, listed = asyncio.run(shortnames(query(sort_by="created_at", sort_type=api.SortType.descending, limit=100)))
+    assert total == 11
+    assert listed == [meta.shortname for meta in expected]
+
+    pages = [
+        asyncio.run(shortnames(query(sort_by="shortname", offset=offset, limit=4)))
+        for offset in range(0, 12, 4)
+    ]
+    assert [total for total, _ in pages] == [11, 11, 11]
+    assert [shortname for _, page in pages for shortname in page] == [
+        f"entry_{index:02}" for index in range(12) if index != 5
+    ]
+
+    total, page = asyncio.run(shortnames(query(sort_by="shortname", filter_tags=["odd"], offset=1, limit=2)))
+    assert (total, page) == (5, ["entry_03", "entry_07"])
+
+
+def test_cache_is_bounded(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "folder_manifest_cache_size", 2)
+    for subpath in ["one", "two", "three"]:
+        write_entry(content(0), subpath)
+        folder_manifest.rows(SPACE, subpath)
+    folder_manifest.rows(SPACE, "two")
+
+    assert [Path(key).parent.parent.name for key in FolderManifest._cache] == ["three", "two"]
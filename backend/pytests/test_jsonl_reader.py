@@ -0,0 +1,126 @@
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from utils.jsonl_reader import JsonlReader, TIMESTAMP_SAMPLE_EVERY
+from utils.settings import settings
+
+START = datetime(2024, 1, 1)
+
+
+def line(number: int) -> str:
+    return json.dumps({
+        "timestamp": (START + timedelta(minutes=number)).isoformat(),
+        "number": number,
+        "tag": "even" if number % 2 == 0 else "odd",
+    })
+
+
+def append_lines(path: Path, start: int, stop: int) -> None:
+    with open(path, "a") as file:
+        for number in range(start, stop):
+            file.write(line(number) + "\n")
+
+
+def numbers(lines: list[str]) -> list[int]:
+    return [json.loads(one)["number"] for one in lines]
+
+
+@pytest.fixture
+def reader(monkeypatch) -> JsonlReader:
+    monkeypatch.setattr(JsonlReader, "_indexes", OrderedDict())
+    return JsonlReader()
+
+
+def test_read_range_and_latest_pages(tmp_path: Path, reader: JsonlReader) -> None:
+    path = tmp_path / "events.jsonl"
+    append_lines(path, 0, 500)
+
+    assert reader.count(path) == 500
+    assert reader.read_range(path, 0, 3) == (500, [line(0), line(1), line(2)])
+    total, page = reader.read_range(path, 495, 10)
+    assert total == 500 and numbers(page) == [495, 496, 497, 498, 499]
+
+    total, page = reader.read_latest(path, 0, 4)
+    assert total == 500 and numbers(page) == [499, 498, 497, 496]
+    total, page = reader.read_latest(path, 10, 3)
+    assert numbers(page) == [489, 488, 487]
+    assert reader.read_latest(path, 500, 10) == (500, [])
+
+    total, page = reader.read_latest(path, 2, 3, search="even")
+    assert total == 250 and numbers(page) == [494, 492, 490]
+
+
+def test_read_latest_date_range(tmp_path: Path, reader: JsonlReader) -> None:
+    path = tmp_path / "events.jsonl"
+    lines_count = TIMESTAMP_SAMPLE_EVERY * 5 + 7
+    append_lines(path, 0, lines_count)
+
+    for low, high in [(0, lines_count - 1), (1, 64), (63, 64), (64, 65), (100, 300), (320, lines_count - 1)]:
+        total, page = reader.read_latest(
+            path,
+            0,
+            lines_count,
+            from_date=START + timedelta(minutes=low),
+            to_date=START + timedelta(minutes=high),
+        )
+        assert total == high - low + 1
+        assert numbers(page) == list(range(high, low - 1, -1))
+
+    total, page = reader.read_latest(path, 1, 2, from_date=START + timedelta(minutes=200))
+    assert total == lines_count - 200 and numbers(page) == [lines_count - 2, lines_count - 3]
+    total, page = reader.read_latest(path, 0, 2, to_date=START - timedelta(minutes=1))
+    assert (total, page) == (0, [])
+
+    total, page = reader.read_latest(
+        path, 0, 3, from_date=START + timedelta(minutes=100), to_date=START + timedelta(minutes=110), search="odd"
+    )
+    assert total == 5 and numbers(page) == [109, 107, 105]
+
+
+def test_incremental_growth(tmp_path: Path, reader: JsonlReader) -> None:
+    path = tmp_path / "history.jsonl"
+    append_lines(path, 0, 100)
+    assert reader.count(path) == 100
+
+    append_lines(path, 100, 150)
+    # A line still being written is not counted
+    with open(path, "a") as file:
+        file.write(line(150)[:10])
+    assert reader.count(path) == 150
+    assert numbers(reader.read_latest(path, 0, 1)[1]) == [149]
+
+    with open(path, "a") as file:
+        file.write(line(150)[10:] + "\n")
+    assert numbers(reader.read_range(path, 148, 5)[1]) == [148, 149, 150]
+
+    # Another worker reuses the sidecar index
+    fresh = JsonlReader()
+    fresh._indexes = OrderedDict()
+    assert fresh.count(path) == 151
+    assert numbers(fresh.read_latest(path, 0, 2, from_date=START + timedelta(minutes=149))[1]) == [150, 149]
+
+    # A replaced file is indexed from scratch
+    replaced = tmp_path / "replaced.jsonl"
+    append_lines(replaced, 1000, 1003)
+    replaced.replace(path)
+    assert reader.read_range(path, 0, 10) == (3, [line(1000), line(1001), line(1002)])
+
+
+def test_indexes_cache_is_bounded(tmp_path: Path, reader: JsonlReader, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "jsonl_index_cache_size", 3)
+    paths = [tmp_path / f"{number}.jsonl" for number in range(5)]
+    for number, path in enumerate(paths):
+        append_lines(path, 0, number + 1)
+
+    for path in paths[:3]:
+        reader.count(path)
+    reader.count(paths[0])
+    reader.count(paths[3])
+    reader.count(paths[4])
+
+    assert list(reader._indexes) == [str(paths[0]), str(paths[3]), str(paths[4])]
+    assert [reader.count(path) for path in paths] == [1, 2, 3, 4, 5]
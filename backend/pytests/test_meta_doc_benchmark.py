@@ -0,0 +1,150 @@
+import json
+import random
+import time
+
+import models.core as core
+from models.enums import ResourceType
+from utils.redis_services import RedisServices
+from utils.settings import settings
+
+SPACES = ["products", "applications", "management"]
+SEGMENTS = ["offers", "protected", "mine", "catalog", "drafts"]
+
+
+def legacy_generate_query_policies(
+    space_name: str,
+    subpath: str,
+    resource_type: str,
+    is_active: bool,
+    owner_shortname: str,
+    owner_group_shortname: str | None,
+    entry_shortname: str | None = None,
+) -> list:
+    """The per call policies walk the cached subpath prefixes replaced, kept as the reference"""
+    subpath_parts = ["/"]
+    subpath_parts += subpath.strip("/").split("/")
+
+    if resource_type == ResourceType.folder and entry_shortname:
+        subpath_parts.append(entry_shortname)
+
+    query_policies: list = []
+    full_subpath = ""
+    for subpath_part in subpath_parts:
+        full_subpath += subpath_part
+        query_policies.append(
+            f"{space_name}:{full_subpath.strip('/')}:{resource_type}:{str(is_active).lower()}:{owner_shortname}"
+        )
+        if owner_group_shortname is None:
+            query_policies.append(
+                f"{space_name}:{full_subpath.strip('/')}:{resource_type}:{str(is_active).lower()}"
+            )
+        else:
+            query_policies.append(
+                f"{space_name}:{full_subpath.strip('/')}:{resource_type}:{str(is_active).lower()}:{owner_group_shortname}"
+            )
+
+        full_subpath_parts = full_subpath.split("/")
+        if len(full_subpath_parts) > 1:
+            subpath_with_magic_keyword = (
+                "/".join(full_subpath_parts[:1]) + "/" + settings.all_subpaths_mw
+            )
+            if len(full_subpath_parts) > 2:
+                subpath_with_magic_keyword += "/" + "/".join(full_subpath_parts[2:])
+            query_policies.append(
+                f"{space_name}:{subpath_with_magic_keyword.strip('/')}:{resource_type}:{str(is_active).lower()}"
+            )
+
+        if full_subpath == "/":
+            full_subpath = ""
+        else:
+            full_subpath += "/"
+
+    return query_policies
+
+
+def legacy_prepare_meta_doc(redis_services: RedisServices, space_name: str, subpath: str, meta: core.Meta):
+    """The json round trip prepare_meta_doc replaced, kept as the reference"""
+    resource_type = ResourceType(meta.__class__.__name__.lower())
+    meta_doc_id = redis_services.generate_doc_id(space_name, "meta", meta.shortname, subpath)
+    payload_doc_id = None
+    if meta.payload and meta.payload.schema_shortname:
+        payload_doc_id = redis_services.generate_doc_id(
+            space_name, meta.payload.schema_shortname, meta.shortname, subpath
+        )
+    meta.model_rebuild()
+    meta_json = json.loads(meta.model_dump_json(serialize_as_any=False, exclude_none=True, warnings="error"))
+    meta_json["query_policies"] = legacy_generate_query_policies(
+        space_name,
+        subpath,
+        resource_type,
+        meta.is_active,
+        meta.owner_shortname,
+        meta.owner_group_shortname,
+        meta.shortname,
+    )
+    meta_json["view_acl"] = redis_services.generate_view_acl(meta_json.get("acl"))
+    meta_json["subpath"] = subpath
+    meta_json["resource_type"] = resource_type
+    meta_json["created_at"] = meta.created_at.timestamp()
+    meta_json["updated_at"] = meta.updated_at.timestamp()
+    meta_json["payload_doc_id"] = payload_doc_id
+
+    return meta_doc_id, meta_json
+
+
+def random_meta(rng: random.Random, index: int) -> core.Meta:
+    attributes: dict = {
+        "shortname": f"entry_{index}",
+        "owner_shortname": rng.choice(["dmart", "alibaba"]),
+        "owner_group_shortname": rng.choice([None, "admins"]),
+        "is_active": rng.random() < 0.5,
+        "tags": rng.sample(["one", "two", "three"], rng.randint(0, 3)),
+        "displayname": {"en": f"Entry {index}", "ar": f"عنصر {index}"},
+        "acl": rng.choice([None, [{"user_shortname": "alibaba", "allowed_actions": ["view", "update"]}]]),
+    }
+    match rng.choice([ResourceType.content, ResourceType.folder, ResourceType.ticket]):
+        case ResourceType.content:
+            attributes["payload"] = {
+                "content_type": "json",
+                "schema_shortname": "offer",
+                "body": f"entry_{index}.json",
+            }
+            return core.Content(**attributes)
+        case ResourceType.folder:
+            return core.Folder(**attributes)
+        case _:
+            return core.Ticket(**attributes, state="open", workflow_shortname="workflow", is_open=True)
+
+
+def test_prepare_meta_doc_matches_and_benchmark() -> None:
+    rng = random.Random(11)
+    redis_services = RedisServices()
+    cases = [
+        (
+            rng.choice(SPACES),
+            "/".join(rng.choice(SEGMENTS) for _ in range(rng.randint(0, 4))) or "/",
+            random_meta(rng, index),
+        )
+        for index in range(2000)
+    ]
+
+    legacy_start = time.perf_counter()
+    legacy_docs = [
+        legacy_prepare_meta_doc(redis_services, space_name, subpath, meta)
+        for space_name, subpath, meta in cases
+    ]
+    legacy_time = time.perf_counter() - legacy_start
+
+    fast_start = time.perf_counter()
+    fast_docs = [
+        redis_services.prepare_meta_doc(space_name, subpath, meta)
+        for space_name, subpath, meta in cases
+    ]
+    fast_time = time.perf_counter() - fast_start
+
+    assert fast_docs == legacy_docs
+    assert any(meta_json["payload_doc_id"] for _, meta_json in fast_docs)
+    print(
+        f"\n{len(cases)} meta docs: legacy {len(cases) / legacy_time:.0f} docs/sec, "
+        f"single dump {len(cases) / fast_time:.0f} docs/sec"
+    )
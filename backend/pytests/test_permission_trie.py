@@ -0,0 +1,178 @@
+import asyncio
+import random
+import time
+
+from models.enums import ActionType, ConditionType, ResourceType
+from utils.access_control import access_control
+from utils.helpers import flatten_dict
+from utils.permission_trie import PermissionTrie
+from utils.settings import settings
+
+SPACES = ["products", "applications", "management"]
+SEGMENTS = ["offers", "protected", "mine", "catalog", "drafts"]
+RESOURCE_TYPES = [ResourceType.content, ResourceType.folder, ResourceType.ticket]
+ACTIONS = [ActionType.view, ActionType.query, ActionType.create, ActionType.update, ActionType.delete]
+
+
+async def legacy_check_access(
+    user_permissions: dict,
+    user_shortname: str,
+    space_name: str,
+    subpath: str,
+    resource_type: str,
+    action_type: ActionType,
+    resource_is_active: bool,
+    resource_owner_shortname: str | None,
+    record_attributes: dict,
+) -> bool:
+    """The string-key permission walk the trie replaced, kept as the reference"""
+
+    def restriction(permission: dict) -> bool:
+        if action_type not in [ActionType.create, ActionType.update]:
+            return True
+        flattened_attributes = flatten_dict(record_attributes)
+        for restricted_field in permission["restricted_fields"]:
+            if restricted_field in flattened_attributes:
+                return False
+        for field_name, field_values in permission["allowed_fields_values"].items():
+            if field_name in flattened_attributes and flattened_attributes[field_name] not in field_values:
+                return False
+        return True
+
+    def allowed(permission: dict) -> bool:
+        return (
+            action_type in permission["allowed_actions"]
+            and (
+                action_type in [ActionType.create, ActionType.query]
+                or set(permission["conditions"]).issubset(achieved)
+            )
+            and restriction(permission)
+        )
+
+    achieved = set()
+    if resource_is_active:
+        achieved.add(ConditionType.is_active)
+    if resource_owner_shortname == user_shortname:
+        achieved.add(ConditionType.own)
+
+    subpath_parts = ["/"] + list(filter(None, subpath.strip("/").split("/")))
+    search_subpath = ""
+    for subpath_part in subpath_parts:
+        search_subpath += subpath_part
+        global_subpath_parts = search_subpath.split("/")
+        if len(global_subpath_parts) > 1:
+            global_subpath_parts[-2] = settings.all_subpaths_mw
+            global_subpath = "/".join(global_subpath_parts)
+        else:
+            global_subpath = settings.all_subpaths_mw
+        if global_subpath[-1] == "/" and len(global_subpath) > 1:
+            global_subpath = global_subpath[:-1]
+
+        permission_key = None
+        if f"{settings.all_spaces_mw}:{global_subpath}:{resource_type}" in user_permissions:
+            permission_key = f"{settings.all_spaces_mw}:{global_subpath}:{resource_type}"
+        if f"{space_name}:{global_subpath}:{resource_type}" in user_permissions:
+            permission_key = f"{space_name}:{global_subpath}:{resource_type}"
+        if f"{settings.all_spaces_mw}:{search_subpath}:{resource_type}" in user_permissions:
+            permission_key = f"{settings.all_spaces_mw}:{search_subpath}:{resource_type}"
+        if permission_key and allowed(user_permissions[permission_key]):
+            return True
+
+        permission_key = f"{space_name}:{search_subpath}:{resource_type}"
+        if permission_key in user_permissions and allowed(user_permissions[permission_key]):
+            return True
+
+        search_subpath = "" if search_subpath == "/" else search_subpath + "/"
+
+    return False
+
+
+def random_subpath(rng: random.Random, with_magic_words: bool) -> str:
+    segments = [rng.choice(SEGMENTS) for _ in range(rng.randint(0, 3))]
+    if with_magic_words and segments and rng.random() < 0.3:
+        segments[rng.randrange(len(segments))] = settings.all_subpaths_mw
+    return "/".join(segments) or "/"
+
+
+def random_permission_subpath(rng: random.Random) -> str:
+    subpath = random_subpath(rng, True)
+    # Keys as written in the roles, leading and trailing slashes never match a checked subpath
+    if subpath != "/" and rng.random() < 0.3:
+        subpath = rng.choice([f"/{subpath}", f"{subpath}/", f"/{subpath}/"])
+    return subpath
+
+
+def random_permissions(rng: random.Random, count: int) -> dict:
+    user_permissions: dict = {}
+    for _ in range(count):
+        space_name = rng.choice(SPACES + [settings.all_spaces_mw])
+        key = f"{space_name}:{random_permission_subpath(rng)}:{rng.choice(RESOURCE_TYPES)}"
+        user_permissions[key] = {
+            "allowed_actions": rng.sample(ACTIONS, rng.randint(1, len(ACTIONS))),
+            "conditions": rng.sample(list(ConditionType), rng.randint(0, 2)),
+            "restricted_fields": rng.sample(["payload.body.price", "tags"], rng.randint(0, 1)),
+            "allowed_fields_values": {},
+        }
+    return user_permissions
+
+
+def test_permission_trie_matches_and_benchmark(monkeypatch) -> None:
+    rng = random.Random(7)
+    user_permissions = random_permissions(rng, 60)
+    resolved: tuple[dict, list[str], PermissionTrie] = (user_permissions, [], PermissionTrie(user_permissions))
+
+    async def resolve_user_access(_):
+        return resolved
+
+    monkeypatch.setattr(access_control, "resolve_user_access", resolve_user_access)
+
+    cases = [
+        (
+            rng.choice(SPACES),
+            random_subpath(rng, False),
+            rng.choice(RESOURCE_TYPES),
+            rng.choice(ACTIONS),
+            rng.random() < 0.5,
+            rng.choice(["alibaba", "dmart"]),
+            rng.choice([{}, {"tags": ["one"]}]),
+        )
+        for _ in range(2000)
+    ]
+
+    async def run_trie() -> list[bool]:
+        return [
+            await access_control.check_access(
+                user_shortname="alibaba",
+                space_name=space_name,
+                subpath=subpath,
+                resource_type=resource_type,
+                action_type=action_type,
+                resource_is_active=is_active,
+                resource_owner_shortname=owner,
+                record_attributes=attributes,
+            )
+            for space_name, subpath, resource_type, action_type, is_active, owner, attributes in cases
+        ]
+
+    async def run_legacy() -> list[bool]:
+        return [
+            await legacy_check_access(
+                user_permissions, "alibaba", space_name, subpath, resource_type,
+                action_type, is_active, owner, attributes,
+            )
+            for space_name, subpath, resource_type, action_type, is_active, owner, attributes in cases
+        ]
+
+    legacy_start = time.perf_counter()
+    legacy_results = asyncio.run(run_legacy())
+    legacy_time = time.perf_counter() - legacy_start
+
+    trie_start = time.perf_counter()
+    trie_results = asyncio.run(run_trie())
+    trie_time = time.perf_counter() - trie_start
+
+    assert trie_results == legacy_results
+    assert any(trie_results) and not all(trie_results)
+    print(
+        f"\n{len(cases)} access checks: legacy {legacy_time * 1000:.1f} ms, trie {trie_time * 1000:.1f} ms"
+    )
@@ -1,8 +1,10 @@
 #!/usr/bin/env -S BACKEND_ENV=config.env python3
+from sqlalchemy import update
 from data_adapters.sql_adapter import SQLAdapter
 from utils.database.create_tables import Users
 from utils.password_hashing import hash_password
 from utils.settings import settings
+import asyncio
 import json
 import getpass
 import subprocess
@@ -31,10 +33,15 @@ if settings.active_data_db == "file":
             with open(file_name, 'w') as write_file:
                 write_file.write(json.dumps(data))
 else:
-    with SQLAdapter().get_session() as session:
-        for key in users.keys():
-            session.query(Users).filter(Users.shortname == key).update({Users.password: hashed}) # type: ignore
-            session.commit()
+    async def update_passwords():
+        adapter = SQLAdapter()
+        async with adapter.get_session() as session:
+            for key in users.keys():
+                await session.exec(update(Users).where(Users.shortname == key).values(password=hashed)) # type: ignore
+                await session.commit()
+        await adapter.close_engine()
+
+    asyncio.run(update_passwords())
 
 
 with open("./login_creds.sh", 'w') as creds:
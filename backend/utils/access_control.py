@@ -1,11 +1,12 @@
+import asyncio
 import json
 import re
 import sys
+import time
 from typing import Any
 
 from redis.commands.search.field import TextField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
-from redis.commands.search.query import Query
 from models.core import ACL, ActionType, ConditionType, Group, Permission, Role, User
 from models.enums import ResourceType
 from utils.database.create_tables import Users
@@ -15,6 +16,17 @@ from data_adapters.adapter import data_adapter as db
 import models.core as core
 from utils.regex import FILE_PATTERN
 from utils.redis_services import RedisServices
+from utils.middleware import get_request_data
+from utils.permission_trie import ACTION_BITS, CONDITION_BITS, PermissionTrie
+from fastapi.logger import logger
+
+# (subpath, resource_type, owner_shortname, owner_group_shortname, is_active, attributes, entry_shortname)
+AccessRow = tuple[str, str, str | None, str | None, bool, dict, str | None]
+
+# Pub/sub channel used to drop the resolved users access across all workers,
+# the message is a user shortname or "*" for all users
+ACCESS_INVALIDATION_CHANNEL = "dmart:access_control:invalidate"
+RESOLVED_ACCESS_MAX_SIZE = 10000
 
 
 class AccessControl:
@@ -22,6 +34,10 @@ class AccessControl:
     groups: dict[str, Group] = {}
     roles: dict[str, Role] = {}
     users: dict[str, User] = {}
+    # Resolved users access: user_shortname -> (expires at, permissions map, groups, compiled permissions)
+    resolved_access: dict[str, tuple[float, dict, list[str], PermissionTrie]] = {}
+    # Bumped on every invalidation so a resolution racing with it is not cached
+    resolved_access_generation: int = 0
 
     async def load_permissions_and_roles(self) -> None:
         if settings.active_data_db == "file":
@@ -61,6 +77,8 @@ class AccessControl:
             await self.store_modules_to_redis()
             await self.delete_user_permissions_map_in_redis()
 
+        await self.invalidate_user_access()
+
     async def create_user_premission_index(self) -> None:
         async with RedisServices() as redis_services:
             try:
@@ -93,14 +111,87 @@ class AccessControl:
 
     async def delete_user_permissions_map_in_redis(self) -> None:
         async with RedisServices() as redis_services:
-            search_query = Query("*").no_content()
-            docs: dict = await redis_services. \
-                ft("user_permission"). \
-                search(search_query)  # type: ignore
-            if docs and len(docs.get("results", [])):
-                keys = [doc["id"] for doc in docs["results"]]
-                if len(keys) > 0:
+            try:
+                async for keys in redis_services.iter_document_ids("user_permission"):
                     await redis_services.del_keys(keys)
+            except Exception as e:
+                logger.warning(f"Error at access_control.delete_user_permissions_map_in_redis: {e}")
+
+    def clear_resolved_access(self, user_shortname: str | None = None) -> None:
+        self.resolved_access_generation += 1
+        if user_shortname:
+            self.resolved_access.pop(user_shortname, None)
+        else:
+            self.resolved_access.clear()
+
+    async def invalidate_user_access(self, user_shortname: str | None = None) -> None:
+        """Drop the resolved access of the user (or all users) in this worker and notify the other workers"""
+        self.clear_resolved_access(user_shortname)
+        try:
+            async with RedisServices() as redis_services:
+                await redis_services.publish(ACCESS_INVALIDATION_CHANNEL, user_shortname or "*")
+        except Exception as e:
+            logger.warning(f"Error at access_control.invalidate_user_access: {e}")
+
+    async def listen_for_invalidations(self) -> None:
+        """Long running task applying the invalidations published by the other workers"""
+        while True:
+            try:
+                async with RedisServices() as redis_services:
+                    async with redis_services.pubsub() as pubsub:
+                        await pubsub.subscribe(ACCESS_INVALIDATION_CHANNEL)
+                        # Messages could have been missed while disconnected
+                        self.clear_resolved_access()
+                        async for message in pubsub.listen():
+                            if message["type"] != "message":
+                                continue
+                            self.clear_resolved_access(
+                                None if message["data"] == "*" else message["data"]
+                            )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error at access_control.listen_for_invalidations: {e}")
+                self.clear_resolved_access()
+                await asyncio.sleep(5)
+
+    async def resolve_user_access(self, user_shortname: str) -> tuple[dict, list[str], PermissionTrie]:
+        """
+        Return the user's permissions map, groups and compiled permissions trie,
+        memoized for the current request and for `settings.user_access_cache_ttl` seconds in the worker.
+        The returned objects are shared, callers must not mutate them.
+        """
+        request_access: dict[str, tuple[dict, list[str], PermissionTrie]] | None = (
+            get_request_data().get("user_access")
+        )
+        if request_access is not None and user_shortname in request_access:
+            return request_access[user_shortname]
+
+        cached = self.resolved_access.get(user_shortname)
+        if cached and cached[0] > time.monotonic():
+            resolved = (cached[1], cached[2], cached[3])
+        else:
+            generation = self.resolved_access_generation
+            user_permissions = await self.get_user_permissions(user_shortname)
+            user_groups = (await self.load_user_meta(user_shortname)).groups or []
+            resolved = (user_permissions, user_groups, PermissionTrie(user_permissions))
+            if settings.user_access_cache_ttl > 0 and generation == self.resolved_access_generation:
+                self.remember_resolved_access(user_shortname, resolved)
+
+        if request_access is not None:
+            request_access[user_shortname] = resolved
+        return resolved
+
+    def remember_resolved_access(
+        self, user_shortname: str, resolved: tuple[dict, list[str], PermissionTrie]
+    ) -> None:
+        now = time.monotonic()
+        if len(self.resolved_access) >= RESOLVED_ACCESS_MAX_SIZE:
+            for key in [key for key, cached in self.resolved_access.items() if cached[0] <= now]:
+                del self.resolved_access[key]
+            if len(self.resolved_access) >= RESOLVED_ACCESS_MAX_SIZE:
+                self.resolved_access.clear()
+        self.resolved_access[user_shortname] = (now + settings.user_access_cache_ttl, *resolved)
 
     def generate_user_permission_doc_id(self, user_shortname: str):
         return f"users_permissions_{user_shortname}"
@@ -152,63 +243,108 @@ class AccessControl:
                 entry_shortname
             )
         # print("Checking check_space_access access")
-        user_permissions = await self.get_user_permissions(user_shortname)
-
-        user_groups = (await self.load_user_meta(user_shortname)).groups or []
+        _, user_groups, permission_trie = await self.resolve_user_access(user_shortname)
+        return self.has_access(
+            permission_trie,
+            user_groups,
+            user_shortname,
+            space_name,
+            subpath,
+            resource_type,
+            action_type,
+            resource_is_active,
+            resource_owner_shortname,
+            resource_owner_group,
+            record_attributes,
+            entry_shortname,
+        )
 
-        # Generate set of achevied conditions on the resource
+    async def filter_accessible(
+            self,
+            user_shortname: str,
+            space_name: str,
+            rows: list[AccessRow],
+            action_type: ActionType | list[ActionType] = ActionType.view,
+    ) -> list[bool]:
+        """
+        Batch version of `check_access`, resolves the user's access once and returns
+        whether each row is accessible.
+        Each row is (subpath, resource_type, owner_shortname, owner_group_shortname,
+        is_active, attributes, entry_shortname), `action_type` is either shared by
+        all rows or given per row.
+        """
+        user_permissions, user_groups, permission_trie = await self.resolve_user_access(user_shortname)
+        mask: list[bool] = []
+        for idx, (subpath, resource_type, owner_shortname, owner_group, is_active, attributes, entry_shortname) in enumerate(rows):
+            if resource_type == ResourceType.space and entry_shortname:
+                mask.append(self.has_space_access(user_permissions, entry_shortname))
+                continue
+            mask.append(self.has_access(
+                permission_trie,
+                user_groups,
+                user_shortname,
+                space_name,
+                subpath,
+                resource_type,
+                action_type[idx] if isinstance(action_type, list) else action_type,
+                is_active,
+                owner_shortname,
+                owner_group,
+                attributes,
+                entry_shortname,
+            ))
+        return mask
+
+    def has_access(
+            self,
+            permission_trie: PermissionTrie,
+            user_groups: list[str],
+            user_shortname: str,
+            space_name: str,
+            subpath: str,
+            resource_type: str,
+            action_type: ActionType,
+            resource_is_active: bool,
+            resource_owner_shortname: str | None,
+            resource_owner_group: str | None,
+            record_attributes: dict,
+            entry_shortname: str | None,
+    ) -> bool:
+        # Bitmask of the achieved conditions on the resource
         # ex: {"is_active", "own"}
-        resource_achieved_conditions: set[ConditionType] = set()
+        resource_achieved_conditions = 0
         if resource_is_active:
-            resource_achieved_conditions.add(ConditionType.is_active)
+            resource_achieved_conditions |= CONDITION_BITS[ConditionType.is_active]
         if resource_owner_shortname == user_shortname or resource_owner_group in user_groups:
-            resource_achieved_conditions.add(ConditionType.own)
+            resource_achieved_conditions |= CONDITION_BITS[ConditionType.own]
 
-        # Allow checking for root permissions
-        subpath_parts = ["/"]
-        subpath_parts += list(filter(None, subpath.strip("/").split("/")))
+        subpath_segments = list(filter(None, subpath.strip("/").split("/")))
         if resource_type == ResourceType.folder and entry_shortname:
-            subpath_parts.append(entry_shortname)
+            subpath_segments.append(entry_shortname)
 
-        search_subpath = ""
-        for subpath_part in subpath_parts:
-            search_subpath += subpath_part
-            # Check if the user has global access
-            global_access = self.has_global_access(
-                space_name,
-                user_permissions,
-                search_subpath,
-                action_type,
-                resource_type,
-                resource_achieved_conditions,
-                record_attributes
-            )
-            if global_access:
-                return True
-
-            permission_key = f"{space_name}:{search_subpath}:{resource_type}"
+        action_bit = ACTION_BITS.get(str(action_type), 0)
+        # actions of type query will be handled in the query function
+        # actions of type create shouldn't check for permission conditions
+        check_conditions = action_type not in [ActionType.create, ActionType.query]
+        for permission in permission_trie.candidates(space_name, subpath_segments, str(resource_type)):
             if (
-                permission_key in user_permissions
-                and action_type in user_permissions[permission_key]["allowed_actions"]
-                and self.check_access_conditions(
-                    set(user_permissions[permission_key]["conditions"]),
-                    set(resource_achieved_conditions),
-                    action_type,
+                permission.actions & action_bit
+                and (
+                    not check_conditions
+                    or not permission.conditions & ~resource_achieved_conditions
                 )
-                and self.check_access_restriction(
-                    user_permissions[permission_key]["restricted_fields"],
-                    user_permissions[permission_key]["allowed_fields_values"],
-                    action_type,
-                    record_attributes
+                and (
+                    not permission.is_restricted
+                    or self.check_access_restriction(
+                        permission.restricted_fields,
+                        permission.allowed_fields_values,
+                        action_type,
+                        record_attributes
+                    )
                 )
             ):
                 return True
 
-            if search_subpath == "/":
-                search_subpath = ""
-            else:
-                search_subpath += "/"
-
         return False
 
     async def check_access_control_list(
@@ -243,67 +379,6 @@ class AccessControl:
 
         return action_type in user_acl.allowed_actions
 
-    def has_global_access(
-            self,
-            space_name: str,
-            user_permissions: dict,
-            search_subpath: str,
-            action_type: ActionType,
-            resource_type: str,
-            resource_achieved_conditions: set,
-            record_attributes: dict
-    ) -> bool:
-        """
-        check if has access to global subpath by replacing the following
-        subpath = / => __all_subpaths__
-        subpath = {subpath} => __all_subpaths__
-        subpath = {subpath}/protected => __all_subpaths__/protected
-        subpath = {subpath}/protected/mine => {subpath}/__all_subpaths__/mine
-        """
-        original_subpath = search_subpath
-        search_subpath_parts = search_subpath.split("/")
-        if len(search_subpath_parts) > 1:
-            search_subpath_parts[-2] = settings.all_subpaths_mw
-            search_subpath = "/".join(search_subpath_parts)
-        elif len(search_subpath_parts) == 1:
-            search_subpath = settings.all_subpaths_mw
-        if search_subpath[-1] == "/" and len(search_subpath) > 1:
-            search_subpath = search_subpath[:-1]
-
-        permission_key = None
-        # check if has access to all spaces
-        if f"{settings.all_spaces_mw}:{search_subpath}:{resource_type}" in user_permissions:
-            permission_key = f"{settings.all_spaces_mw}:{search_subpath}:{resource_type}"
-
-        # check if has access to current spaces
-        if f"{space_name}:{search_subpath}:{resource_type}" in user_permissions:
-            permission_key = f"{space_name}:{search_subpath}:{resource_type}"
-
-        # check if has access to current subpath
-        if f"{settings.all_spaces_mw}:{original_subpath}:{resource_type}" in user_permissions:
-            permission_key = f"{settings.all_spaces_mw}:{original_subpath}:{resource_type}"
-
-        if not permission_key:
-            return False
-
-        if (
-                action_type in user_permissions[permission_key]["allowed_actions"]
-                and self.check_access_conditions(
-            set(user_permissions[permission_key]["conditions"]),
-            set(resource_achieved_conditions),
-            action_type,
-        )
-                and self.check_access_restriction(
-            user_permissions[permission_key]["restricted_fields"],
-            user_permissions[permission_key]["allowed_fields_values"],
-            action_type,
-            record_attributes
-        )
-        ):
-            return True
-
-        return False
-
     def check_access_conditions(
             self,
             premission_conditions: set,
@@ -355,7 +430,10 @@ class AccessControl:
         return True
 
     async def check_space_access(self, user_shortname: str, space_name: str) -> bool:
-        user_permissions = await access_control.get_user_permissions(user_shortname)
+        user_permissions, _, _ = await self.resolve_user_access(user_shortname)
+        return self.has_space_access(user_permissions, space_name)
+
+    def has_space_access(self, user_permissions: dict, space_name: str) -> bool:
         prog = re.compile(f"{space_name}:*|{settings.all_spaces_mw}:*")
         return bool(list(filter(prog.match, user_permissions.keys())))
 
@@ -637,9 +715,8 @@ class AccessControl:
             "products:offers:content:*", # IF conditions = {}
         ]
         """
-        user_permissions = await self.get_user_permissions(user_shortname)
-        user_groups = (await self.load_user_meta(user_shortname)).groups or []
-        user_groups.append(user_shortname)
+        user_permissions, user_groups, _ = await self.resolve_user_access(user_shortname)
+        user_groups = [*user_groups, user_shortname]
 
         redis_query_policies = []
         for perm_key, permission in user_permissions.items():
@@ -1,4 +1,5 @@
 import json
+import time
 from typing import Any
 import aiofiles
 from fastapi import status
@@ -17,6 +18,75 @@ from starlette.datastructures import UploadFile
 from data_adapters.adapter import data_adapter as db
 
 
+class SchemaValidators:
+    """
+    Process wide cache of compiled schema validators keyed by (space, schema_shortname).
+
+    In file mode an entry is reused as long as the schema file keeps the same path, mtime and size.
+    In sql mode an entry is trusted for `settings.schema_validator_cache_ttl` seconds, then the schema
+    is loaded again and only recompiled when its `updated_at` changed.
+    Schemas updated through the API are invalidated right away.
+    """
+
+    # (space, schema_shortname) -> (version, trusted until, validator)
+    _validators: dict[tuple[str, str], tuple[Any, float, Draft7Validator]] = {}
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+    async def get(self, space_name: str, schema_shortname: str) -> Draft7Validator:
+        key = (space_name, schema_shortname)
+        cached = self._validators.get(key)
+
+        if settings.active_data_db == "file":
+            schema_path = get_schema_path(
+                space_name=space_name,
+                schema_shortname=f"{schema_shortname}.json",
+            )
+            stat = schema_path.stat()
+            version: Any = (str(schema_path), stat.st_mtime_ns, stat.st_size)
+            if cached and cached[0] == version:
+                self.hits += 1
+                return cached[2]
+            schema = json.loads(schema_path.read_text())
+        else:
+            if cached and cached[1] > time.monotonic():
+                self.hits += 1
+                return cached[2]
+            if schema_shortname in ["folder_rendering", "meta_schema"]:
+                space_name = "management"
+            schema_meta = await db.load(space_name, "/schema", schema_shortname, core.Schema)
+            version = schema_meta.updated_at
+            if cached and cached[0] == version:
+                self.hits += 1
+                self._validators[key] = (version, time.monotonic() + settings.schema_validator_cache_ttl, cached[2])
+                return cached[2]
+            schema = schema_meta.payload.model_dump()['body'] if schema_meta.payload else schema_meta
+
+        self.misses += 1
+        validator = Draft7Validator(schema) # type: ignore
+        self._validators[key] = (version, time.monotonic() + settings.schema_validator_cache_ttl, validator)
+        return validator
+
+    def invalidate(self, space_name: str, schema_shortname: str) -> None:
+        # Schemas of the management space are shared by all spaces
+        for key in list(self._validators):
+            if key[1] == schema_shortname and (space_name in [key[0], settings.management_space]):
+                self._validators.pop(key, None)
+                self.invalidations += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._validators),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+schema_validators = SchemaValidators()
+
+
 async def validate_payload_with_schema(
     payload_data: UploadFile | dict,
     space_name: str,
@@ -32,19 +102,7 @@ async def validate_payload_with_schema(
                 message="Invalid payload.body",
             ),
         )
-    if settings.active_data_db == "file":
-        schema_path = get_schema_path(
-            space_name=space_name,
-            schema_shortname=f"{schema_shortname}.json",
-        )
-
-        schema = json.loads(FSPath(schema_path).read_text())
-    else:
-        if schema_shortname in ["folder_rendering", "meta_schema"]:
-            space_name = "management"
-        schema = await db.load(space_name, "/schema", schema_shortname, core.Schema)
-        if schema.payload:
-            schema = schema.payload.model_dump()['body']
+    validator = await schema_validators.get(space_name, schema_shortname)
 
     if not isinstance(payload_data, dict):
         data = json.load(payload_data.file)
@@ -52,7 +110,7 @@ async def validate_payload_with_schema(
     else:
         data = payload_data
 
-    Draft7Validator(schema).validate(data) # type: ignore
+    validator.validate(data) # type: ignore
 
 
 def get_schema_path(space_name: str, schema_shortname: str):
@@ -235,17 +293,12 @@ async def validate_jsonl_with_schema(
     schema_shortname: str,
 ) -> None:
 
-    schema_path = get_schema_path(
-        space_name=space_name,
-        schema_shortname=f"{schema_shortname}.json",
-    )
-
-    schema = json.loads(FSPath(schema_path).read_text())
+    validator = await schema_validators.get(space_name, schema_shortname)
 
     async with aiofiles.open(file_path, "r") as file:
         lines = await file.readlines()
         for line in lines:
-            Draft7Validator(schema).validate(line)
+            validator.validate(line)
             
             
 async def validate_csv_with_schema(
@@ -254,13 +307,8 @@ async def validate_csv_with_schema(
     schema_shortname: str,
 ) -> None:
 
-    schema_path = get_schema_path(
-        space_name=space_name,
-        schema_shortname=f"{schema_shortname}.json",
-    )
-
-    schema = json.loads(FSPath(schema_path).read_text())
+    validator = await schema_validators.get(space_name, schema_shortname)
 
     jsonl: list[dict[str, Any]] = await csv_file_to_json(file_path)
     for json_item in jsonl:
-        Draft7Validator(schema).validate(json_item)
\ No newline at end of file
+        validator.validate(json_item)
\ No newline at end of file
@@ -0,0 +1,220 @@
+import fcntl
+import json
+import os
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+import models.core as core
+from models.enums import ResourceType
+from utils.helpers import camel_case, snake_case
+from utils.regex import FILE_PATTERN, FOLDER_PATTERN
+from utils.settings import settings
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+# Rows sortable straight from the manifest without opening the meta files
+SORTABLE_FIELDS = ["shortname", "resource_type", "owner_shortname", "is_active", "created_at", "updated_at"]
+
+# Meta classes that never show up in a subpath listing
+UNINDEXED_CLASSES: tuple[type[core.Meta], ...] = (core.Space, core.Attachment, core.History)
+
+
+def row_key(resource_type: str, shortname: str) -> str:
+    return f"{resource_type}/{shortname}"
+
+
+def resource_type_of(meta: core.Meta) -> str:
+    return ResourceType(snake_case(meta.__class__.__name__)).value
+
+
+def meta_to_row(meta: core.Meta) -> dict[str, Any]:
+    return {
+        "shortname": meta.shortname,
+        "resource_type": resource_type_of(meta),
+        "tags": meta.tags,
+        "owner_shortname": meta.owner_shortname,
+        "owner_group_shortname": meta.owner_group_shortname,
+        "is_active": meta.is_active,
+        "created_at": meta.created_at.timestamp(),
+        "updated_at": meta.updated_at.timestamp(),
+        "schema_shortname": meta.payload.schema_shortname if meta.payload else None,
+    }
+
+
+class FolderManifest:
+    """
+    Maintains an append-only manifest per folder at `{subpath}/.dm/manifest.jsonl`
+    holding the listing attributes of every entry and sub folder in that subpath,
+    so subpath queries can filter, sort and page without opening every meta file.
+
+    Each line is either a row (see `meta_to_row`) or a tombstone `{"shortname", "resource_type", "deleted": true}`.
+    The manifest is built lazily on the first read and only updated afterwards,
+    removing the manifest file forces a full rebuild on the next query.
+    The rows of the `settings.folder_manifest_cache_size` most recently queried folders are kept in memory.
+    """
+
+    # Replayed manifests per file: path -> (inode, read offset, number of lines, rows)
+    _cache: OrderedDict[str, tuple[int, int, int, dict[str, dict]]] = OrderedDict()
+
+    def meta_path(self, space_name: str, subpath: str) -> Path:
+        subpath = subpath.strip("/") or "."
+        return settings.spaces_folder / space_name / subpath / ".dm"
+
+    @contextmanager
+    def _locked(self, dm_path: Path) -> Iterator[None]:
+        fd = os.open(dm_path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _append(self, space_name: str, subpath: str, line: dict) -> None:
+        dm_path = self.meta_path(space_name, subpath)
+        manifest_file = dm_path / MANIFEST_FILENAME
+        if not dm_path.is_dir():
+            return
+        # Checked under the rebuild lock, a rebuild scanning the folder meanwhile
+        # may have missed this entry and must finish before we decide to skip
+        with self._locked(dm_path):
+            # Manifest not built yet, the next read will scan the folder anyway
+            if not manifest_file.is_file():
+                return
+            with open(manifest_file, "a") as file:
+                file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def upsert(self, space_name: str, subpath: str, meta: core.Meta) -> None:
+        if isinstance(meta, UNINDEXED_CLASSES):
+            return
+        self._append(space_name, subpath, meta_to_row(meta))
+
+    def remove(self, space_name: str, subpath: str, meta: core.Meta) -> None:
+        if isinstance(meta, UNINDEXED_CLASSES):
+            return
+        self._append(
+            space_name,
+            subpath,
+            {
+                "shortname": meta.shortname,
+                "resource_type": resource_type_of(meta),
+                "deleted": True,
+            },
+        )
+
+    def scan(self, space_name: str, subpath: str) -> dict[str, dict]:
+        """Build the manifest rows by reading every meta file in the folder"""
+        dm_path = self.meta_path(space_name, subpath)
+        rows: dict[str, dict] = {}
+        for entry in os.scandir(dm_path):
+            if not entry.is_dir():
+                continue
+            for one in os.scandir(entry):
+                match = FILE_PATTERN.search(one.path)
+                if not match or not one.is_file():
+                    continue
+                resource_class = getattr(sys.modules["models.core"], camel_case(match.group(2).lower()), None)
+                if not resource_class:
+                    continue
+                try:
+                    meta = resource_class.model_validate_json(Path(one.path).read_text())
+                except Exception:
+                    continue
+                row = meta_to_row(meta)
+                row["shortname"] = match.group(1)
+                rows[row_key(row["resource_type"], row["shortname"])] = row
+
+        for one in os.scandir(dm_path.parent):
+            if not one.is_dir():
+                continue
+            folder_meta = Path(one.path) / ".dm/meta.folder.json"
+            match = FOLDER_PATTERN.search(str(folder_meta))
+            if not match or not folder_meta.is_file():
+                continue
+            try:
+                folder = core.Folder.model_validate_json(folder_meta.read_text())
+            except Exception:
+                continue
+            row = meta_to_row(folder)
+            row["shortname"] = match.group(1)
+            rows[row_key(ResourceType.folder.value, row["shortname"])] = row
+
+        return rows
+
+    def _write(self, dm_path: Path, rows: dict[str, dict]) -> None:
+        tmp_file = dm_path / f".{MANIFEST_FILENAME}.{os.getpid()}"
+        with open(tmp_file, "w") as file:
+            for row in rows.values():
+                file.write(json.dumps(row, separators=(",", ":")) + "\n")
+        os.replace(tmp_file, dm_path / MANIFEST_FILENAME)
+
+    def rebuild(self, space_name: str, subpath: str) -> dict[str, dict]:
+        dm_path = self.meta_path(space_name, subpath)
+        with self._locked(dm_path):
+            rows = self.scan(space_name, subpath)
+            self._write(dm_path, rows)
+        self._cache.pop(str(dm_path / MANIFEST_FILENAME), None)
+        return rows
+
+    def _replay(self, manifest_file: Path, offset: int, lines_count: int, rows: dict[str, dict]) -> tuple[int, int]:
+        with open(manifest_file, "rb") as file:
+            file.seek(offset)
+            chunk = file.read()
+        # Keep a partially written last line for the next read
+        consumed = chunk.rfind(b"\n") + 1
+        for line in chunk[:consumed].splitlines():
+            if not line.strip():
+                continue
+            lines_count += 1
+            row = json.loads(line)
+            _key = row_key(row["resource_type"], row["shortname"])
+            if row.get("deleted"):
+                rows.pop(_key, None)
+            else:
+                rows[_key] = row
+        return offset + consumed, lines_count
+
+    def rows(self, space_name: str, subpath: str) -> list[dict]:
+        """
+        Return the live rows of the folder, entries first then sub folders.
+        Only the bytes appended since the previous call are read and replayed.
+        """
+        dm_path = self.meta_path(space_name, subpath)
+        if not dm_path.is_dir():
+            return []
+
+        manifest_file = dm_path / MANIFEST_FILENAME
+        if not manifest_file.is_file():
+            self.rebuild(space_name, subpath)
+
+        key = str(manifest_file)
+        stat = manifest_file.stat()
+        inode, offset, lines_count, rows = self._cache.get(key, (0, 0, 0, {}))
+        if inode != stat.st_ino or stat.st_size < offset:
+            inode, offset, lines_count, rows = stat.st_ino, 0, 0, {}
+
+        if stat.st_size > offset:
+            offset, lines_count = self._replay(manifest_file, offset, lines_count, rows)
+
+        # Compact when the superseded lines outweigh the live rows
+        if lines_count > 1000 and lines_count > 2 * len(rows):
+            with self._locked(dm_path):
+                # Pick up lines appended by other workers before rewriting
+                self._replay(manifest_file, offset, lines_count, rows)
+                self._write(dm_path, rows)
+            self._cache.pop(key, None)
+        else:
+            self._cache[key] = (inode, offset, lines_count, rows)
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.folder_manifest_cache_size:
+                self._cache.popitem(last=False)
+
+        folders = [row for row in rows.values() if row["resource_type"] == ResourceType.folder.value]
+        entries = [row for row in rows.values() if row["resource_type"] != ResourceType.folder.value]
+        return entries + folders
+
+
+folder_manifest = FolderManifest()
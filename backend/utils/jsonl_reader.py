@@ -0,0 +1,214 @@
+import fcntl
+import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from utils.settings import settings
+
+INDEX_SUFFIX = ".idx"
+# A line timestamp is sampled every N lines for the date range lookups
+TIMESTAMP_SAMPLE_EVERY = 64
+# Lines read at once when scanning backwards for a search
+SEARCH_BLOCK_LINES = 4096
+READ_CHUNK = 1 << 20
+
+
+def line_timestamp(line: bytes) -> datetime:
+    try:
+        return datetime.fromisoformat(json.loads(line)["timestamp"]).replace(tzinfo=None)
+    except Exception:
+        return datetime.min
+
+
+class LineIndex:
+    def __init__(self, inode: int):
+        self.inode = inode
+        # Byte offset right after each complete line
+        self.ends = array("Q")
+        # Timestamp of the lines 0, N, 2N, ...
+        self.timestamps: list[datetime] = []
+
+    @property
+    def size(self) -> int:
+        return self.ends[-1] if self.ends else 0
+
+    def start(self, line: int) -> int:
+        return self.ends[line - 1] if line else 0
+
+
+class JsonlReader:
+    """
+    Reads append-only jsonl files (events.jsonl, history.jsonl) without scanning them.
+
+    A sidecar `{file}.idx` holds the inode of the indexed file followed by the end offset of
+    every line as uint64, it is extended with the lines appended since the last read,
+    so counting is O(1) and any page of lines is a single seek and read.
+    Date ranges are resolved by binary search on timestamps sampled every
+    `TIMESTAMP_SAMPLE_EVERY` lines, assuming the lines are appended in time order.
+    The indexes of the `settings.jsonl_index_cache_size` most recently read files are kept in memory.
+    """
+
+    _indexes: OrderedDict[str, LineIndex] = OrderedDict()
+
+    def index(self, path: Path) -> LineIndex:
+        stat = path.stat()
+        key = str(path)
+        index = self._indexes.get(key)
+        if index and index.inode == stat.st_ino and index.size == stat.st_size:
+            self._indexes.move_to_end(key)
+            return index
+        if not index or index.inode != stat.st_ino or index.size > stat.st_size:
+            index = LineIndex(stat.st_ino)
+
+        with open(path.with_name(path.name + INDEX_SUFFIX), "a+b") as sidecar:
+            fcntl.flock(sidecar.fileno(), fcntl.LOCK_EX)
+            try:
+                self._sync_sidecar(sidecar, index, stat.st_size)
+                self._index_appended(path, sidecar, index, stat.st_size)
+            finally:
+                fcntl.flock(sidecar.fileno(), fcntl.LOCK_UN)
+
+        self._indexes[key] = index
+        self._indexes.move_to_end(key)
+        while len(self._indexes) > settings.jsonl_index_cache_size:
+            self._indexes.popitem(last=False)
+        return index
+
+    def _sync_sidecar(self, sidecar, index: LineIndex, file_size: int) -> None:
+        """Load the lines indexed by other processes, or rewrite the sidecar when it's stale"""
+        sidecar.seek(0, os.SEEK_END)
+        sidecar_size = sidecar.tell()
+        sidecar.seek(0)
+        header = sidecar.read(8)
+        stored = array("Q", header) if len(header) == 8 else None
+        lines_count = (sidecar_size - 8) // 8 if stored else 0
+
+        if stored and stored[0] == index.inode and lines_count > len(index.ends):
+            sidecar.seek(8 + 8 * len(index.ends))
+            extra = array("Q", sidecar.read(8 * (lines_count - len(index.ends))))
+            if extra[-1] <= file_size:
+                index.ends.extend(extra)
+                return
+            # The file was truncated in place
+            index.ends = array("Q")
+            index.timestamps = []
+            stored = None
+
+        if not stored or stored[0] != index.inode or (sidecar_size - 8) % 8:
+            sidecar.truncate(0)
+            sidecar.write(array("Q", [index.inode]).tobytes())
+            sidecar.write(index.ends.tobytes())
+        elif lines_count < len(index.ends):
+            sidecar.write(index.ends[lines_count:].tobytes())
+
+    def _index_appended(self, path: Path, sidecar, index: LineIndex, file_size: int) -> None:
+        if index.size >= file_size:
+            return
+        new_ends = array("Q")
+        offset = index.size
+        with open(path, "rb") as file:
+            file.seek(offset)
+            while offset < file_size:
+                chunk = file.read(min(READ_CHUNK, file_size - offset))
+                if not chunk:
+                    break
+                position = chunk.find(b"\n")
+                while position != -1:
+                    new_ends.append(offset + position + 1)
+                    position = chunk.find(b"\n", position + 1)
+                offset += len(chunk)
+        # A trailing line without a newline is still being written
+        index.ends.extend(new_ends)
+        sidecar.write(new_ends.tobytes())
+
+    def count(self, path: Path) -> int:
+        return len(self.index(path).ends)
+
+    def _read_lines(self, path: Path, index: LineIndex, start: int, stop: int) -> list[bytes]:
+        if start >= stop:
+            return []
+        with open(path, "rb") as file:
+            file.seek(index.start(start))
+            data = file.read(index.ends[stop - 1] - index.start(start))
+        return data.split(b"\n")[:-1]
+
+    def _sample_timestamps(self, path: Path, index: LineIndex) -> list[datetime]:
+        lines_count = len(index.ends)
+        next_line = len(index.timestamps) * TIMESTAMP_SAMPLE_EVERY
+        if next_line < lines_count:
+            with open(path, "rb") as file:
+                for line in range(next_line, lines_count, TIMESTAMP_SAMPLE_EVERY):
+                    file.seek(index.start(line))
+                    index.timestamps.append(line_timestamp(file.readline()))
+        return index.timestamps
+
+    def _first_line_after(self, path: Path, index: LineIndex, timestamp: datetime, inclusive: bool) -> int:
+        """First line with a timestamp >= `timestamp` (> when not inclusive)"""
+        timestamps = self._sample_timestamps(path, index)
+        sample = bisect_left(timestamps, timestamp) if inclusive else bisect_right(timestamps, timestamp)
+        start = max((sample - 1) * TIMESTAMP_SAMPLE_EVERY + 1, 0)
+        stop = min(sample * TIMESTAMP_SAMPLE_EVERY, len(index.ends))
+        for line_number, line in enumerate(self._read_lines(path, index, start, stop), start):
+            line_time = line_timestamp(line)
+            if line_time >= timestamp if inclusive else line_time > timestamp:
+                return line_number
+        return stop
+
+    def _lines_range(
+        self, path: Path, index: LineIndex, from_date: datetime | None, to_date: datetime | None
+    ) -> tuple[int, int]:
+        low, high = 0, len(index.ends)
+        if from_date:
+            low = self._first_line_after(path, index, from_date.replace(tzinfo=None), True)
+        if to_date:
+            high = self._first_line_after(path, index, to_date.replace(tzinfo=None), False)
+        return low, max(low, high)
+
+    def read_range(self, path: Path, start: int, limit: int) -> tuple[int, list[str]]:
+        """Total lines count and `limit` lines from line `start` in file order"""
+        index = self.index(path)
+        stop = min(start + limit, len(index.ends))
+        return len(index.ends), [line.decode() for line in self._read_lines(path, index, start, stop)]
+
+    def read_latest(
+        self,
+        path: Path,
+        offset: int,
+        limit: int,
+        from_date: datetime | None = None,
+        to_date: datetime | None = None,
+        search: str | None = None,
+    ) -> tuple[int, list[str]]:
+        """
+        Newest first page of the lines within the date range, or of the lines containing
+        `search` as a quoted json string. Returns the count of the matching lines and the page.
+        """
+        index = self.index(path)
+        low, high = self._lines_range(path, index, from_date, to_date)
+
+        if not search:
+            stop = max(high - offset, low)
+            start = max(stop - limit, low)
+            return high - low, [line.decode() for line in reversed(self._read_lines(path, index, start, stop))]
+
+        needle = f'"{search}"'.encode()
+        total = 0
+        page: list[str] = []
+        block_stop = high
+        while block_stop > low:
+            block_start = max(block_stop - SEARCH_BLOCK_LINES, low)
+            for line in reversed(self._read_lines(path, index, block_start, block_stop)):
+                if needle not in line:
+                    continue
+                if offset <= total < offset + limit:
+                    page.append(line.decode())
+                total += 1
+            block_stop = block_start
+        return total, page
+
+
+jsonl_reader = JsonlReader()
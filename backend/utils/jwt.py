@@ -1,4 +1,4 @@
-from time import time
+from time import monotonic, time
 from typing import Optional, Any
 
 from fastapi import Request, status
@@ -7,7 +7,11 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import models.api as api
 from utils.internal_error_code import InternalErrorCode
-from utils.password_hashing import hash_password, verify_password
+from utils.password_hashing import (
+    is_session_fingerprint,
+    session_fingerprint,
+    verify_session_fingerprint,
+)
 from utils.redis_services import RedisServices
 from utils.settings import settings
 from data_adapters.adapter import data_adapter as db
@@ -51,6 +55,33 @@ def decode_jwt(token: str) -> dict[str, Any]:
         )
 
 
+# Session fingerprint => (user shortname, monotonic expiry) of the tokens verified by this worker
+verified_sessions: dict[str, tuple[str, float]] = {}
+VERIFIED_SESSIONS_MAX_SIZE = 10000
+
+
+def is_verified_session(fingerprint: str, user_shortname: str) -> bool:
+    verified = verified_sessions.get(fingerprint)
+    return bool(verified and verified[0] == user_shortname and verified[1] > monotonic())
+
+
+def remember_verified_session(fingerprint: str, user_shortname: str) -> None:
+    if settings.session_verification_cache_ttl <= 0:
+        return
+    now = monotonic()
+    if len(verified_sessions) >= VERIFIED_SESSIONS_MAX_SIZE:
+        for key in [key for key, (_, expires) in verified_sessions.items() if expires <= now]:
+            del verified_sessions[key]
+        if len(verified_sessions) >= VERIFIED_SESSIONS_MAX_SIZE:
+            verified_sessions.clear()
+    verified_sessions[fingerprint] = (user_shortname, now + settings.session_verification_cache_ttl)
+
+
+def forget_verified_sessions(user_shortname: str) -> None:
+    for key in [key for key, (shortname, _) in verified_sessions.items() if shortname == user_shortname]:
+        verified_sessions.pop(key, None)
+
+
 class JWTBearer(HTTPBearer):
     is_required: bool = True
 
@@ -87,11 +118,28 @@ class JWTBearer(HTTPBearer):
                 api.Error(type="jwtauth", code=InternalErrorCode.NOT_AUTHENTICATED, message="Not authenticated [2]"),
             )
 
-        if settings.one_session_per_user:
-            active_session_token = await get_active_session(user_shortname)
-            if not isinstance(active_session_token, str) or not verify_password(
-                    auth_token, active_session_token
-            ):
+        fingerprint = session_fingerprint(auth_token)
+        if not is_verified_session(fingerprint, user_shortname):
+            if settings.one_session_per_user:
+                active_session_token = await get_active_session(user_shortname)
+                if not isinstance(active_session_token, str) or not await verify_session_fingerprint(
+                        auth_token, active_session_token
+                ):
+                    raise api.Exception(
+                        status.HTTP_401_UNAUTHORIZED,
+                        api.Error(
+                            type="jwtauth", code=InternalErrorCode.NOT_AUTHENTICATED, message="Not authenticated [3]"
+                        ),
+                    )
+
+                if is_session_fingerprint(active_session_token):
+                    await refresh_active_session(user_shortname)
+                else:
+                    # Replace the session hashed with bcrypt by its fingerprint
+                    await set_active_session(user_shortname, auth_token)
+
+            user_session_token = await get_user_session(user_shortname)
+            if not isinstance(user_session_token, str):
                 raise api.Exception(
                     status.HTTP_401_UNAUTHORIZED,
                     api.Error(
@@ -99,18 +147,10 @@ class JWTBearer(HTTPBearer):
                     ),
                 )
 
-            # await set_active_session(user_shortname, active_session_token) # Do not hash the already hashed token
-            await set_active_session(user_shortname, auth_token)
-
-        user_session_token = await get_user_session(user_shortname)
-        if not isinstance(user_session_token, str):
-            raise api.Exception(
-                status.HTTP_401_UNAUTHORIZED,
-                api.Error(
-                    type="jwtauth", code=InternalErrorCode.NOT_AUTHENTICATED, message="Not authenticated [3]"
-                ),
-            )
+            remember_verified_session(fingerprint, user_shortname)
 
+        # Picked up by the logging middleware
+        request.state.user_shortname = user_shortname
         return user_shortname
 
 
@@ -137,6 +177,7 @@ def generate_jwt(data: dict, expires: int = 86400) -> str:
 
 async def sign_jwt(data: dict, expires: int = 86400) -> str:
     token = generate_jwt(data, expires)
+    forget_verified_sessions(data["shortname"])
     await set_user_session(data["shortname"], token)
     if settings.one_session_per_user:
         await set_active_session(data["shortname"], token)
@@ -171,7 +212,16 @@ async def get_user_session(user_shortname: str):
         return await db.get_sql_user_session(user_shortname)
 
 
+async def refresh_active_session(user_shortname: str) -> bool:
+    """Slide the active session expiry without rewriting it"""
+    if settings.active_data_db == "file":
+        return await refresh_redis_active_session(user_shortname)
+    else:
+        return bool(await db.refresh_sql_active_session(user_shortname))
+
+
 async def remove_active_session(user_shortname: str) -> bool:
+    forget_verified_sessions(user_shortname)
     if settings.active_data_db == "file":
         return await remove_redis_active_session(user_shortname)
     else:
@@ -179,6 +229,7 @@ async def remove_active_session(user_shortname: str) -> bool:
 
 
 async def remove_user_session(user_shortname: str) -> bool:
+    forget_verified_sessions(user_shortname)
     if settings.active_data_db == "file":
         return await remove_redis_user_session(user_shortname)
     else:
@@ -189,7 +240,7 @@ async def set_redis_active_session(user_shortname: str, token: str) -> bool:
     async with RedisServices() as redis:
         return bool(await redis.set_key(
             key=f"active_session:{user_shortname}",
-            value=hash_password(token),
+            value=session_fingerprint(token),
             ex=settings.session_inactivity_ttl,
         ))
 
@@ -198,11 +249,18 @@ async def set_redis_user_session(user_shortname: str, token: str) -> bool:
     async with RedisServices() as redis:
         return bool(await redis.set_key(
             key=f"user_session:{user_shortname}",
-            value=hash_password(token),
+            value=session_fingerprint(token),
             ex=settings.session_inactivity_ttl,
         ))
 
 
+async def refresh_redis_active_session(user_shortname: str) -> bool:
+    async with RedisServices() as redis:
+        return bool(await redis.set_ttl(
+            f"active_session:{user_shortname}", settings.session_inactivity_ttl
+        ))
+
+
 async def get_redis_active_session(user_shortname: str):
     async with RedisServices() as redis:
         return await redis.get_key(
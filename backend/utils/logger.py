@@ -1,6 +1,12 @@
-import json
 import logging
 import logging.config
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler
+from time import monotonic
+
+import orjson
 from utils.settings import settings
 
 
@@ -22,7 +28,151 @@ class CustomFormatter(logging.Formatter):
             # "lineno": record.lineno,
             # "funcName": record.funcName,
         }
-        return json.dumps(data)
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+_STOP = object()
+
+
+class BatchingQueueHandler(QueueHandler):
+    """
+    Hands the records to a bounded queue drained by a writer thread of the current process,
+    the writer formats them and writes them in batches of `batch_size` lines or every `flush_interval` seconds.
+    Records are dropped and counted when the queue is full, so logging never waits on the writes.
+    """
+
+    def __init__(
+        self,
+        targets: list[str],
+        log_file: str,
+        queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+    ):
+        # QueueHandler types its queue as the minimal put_nowait/get interface,
+        # the writer thread uses the blocking calls of the same queue
+        self.records: queue.Queue = queue.Queue(queue_size)
+        super().__init__(self.records)
+        self.targets = targets
+        self.log_file = log_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._reported_dropped = 0
+        self._writer: threading.Thread | None = None
+        self._writer_lock = threading.Lock()
+        self._target_handlers: list[logging.Handler] | None = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the message is resolved here, the serialization is left to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_writer()
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self) -> None:
+        # Started on the first record, so each forked worker gets its own writer
+        if self._writer and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="log-writer", daemon=True)
+            self._writer.start()
+
+    def _create_target_handlers(self) -> list[logging.Handler]:
+        handlers: list[logging.Handler] = []
+        if "console" in self.targets:
+            handlers.append(logging.StreamHandler(sys.stdout))
+        if "file" in self.targets:
+            from concurrent_log_handler import ConcurrentRotatingFileHandler
+            handlers.append(ConcurrentRotatingFileHandler(
+                self.log_file, backupCount=5, maxBytes=1048576, use_gzip=True
+            ))
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter("%(message)s"))
+        return handlers
+
+    def _write_loop(self) -> None:
+        if self._target_handlers is None:
+            self._target_handlers = self._create_target_handlers()
+        lines: list[str] = []
+        deadline = 0.0
+        while True:
+            try:
+                record = self.records.get(
+                    timeout=max(deadline - monotonic(), 0) if lines else None
+                )
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._flush_lines(lines)
+                return
+            if record is not None:
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+                if len(lines) == 1:
+                    deadline = monotonic() + self.flush_interval
+
+            if lines and (len(lines) >= self.batch_size or monotonic() >= deadline):
+                self._flush_lines(lines)
+                lines = []
+
+    def _flush_lines(self, lines: list[str]) -> None:
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            lines.append(self.format(logging.makeLogRecord({
+                "name": "fastapi",
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Dropped {dropped - self._reported_dropped} log records, the log queue was full",
+            })))
+            self._reported_dropped = dropped
+        if not lines:
+            return
+
+        batch = logging.makeLogRecord({"msg": "\n".join(lines), "levelno": logging.INFO})
+        for handler in self._target_handlers or []:
+            handler.handle(batch)
+        self.written += len(lines)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.records.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    def close(self) -> None:
+        if self._writer and self._writer.is_alive():
+            try:
+                self.records.put(_STOP, timeout=self.flush_interval)
+                self._writer.join(timeout=5)
+            except queue.Full:
+                pass
+        for handler in self._target_handlers or []:
+            handler.close()
+        super().close()
+
+
+def log_queue_stats() -> dict:
+    stats = {"queued": 0, "written": 0, "dropped": 0}
+    for handler in logging.getLogger("fastapi").handlers:
+        if isinstance(handler, BatchingQueueHandler):
+            for key, value in handler.stats().items():
+                stats[key] += value
+    return stats
 
 
 logging_schema : dict = {
@@ -37,26 +187,21 @@ logging_schema : dict = {
     },
     "formatters": {"json": {"()": CustomFormatter}},
     "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
+        "queue": {
+            "()": BatchingQueueHandler,
             "filters": ["correlation_id"],
             "level": "INFO",
             "formatter": "json",
-            "stream": "ext://sys.stdout",  # Default is stderr
-        },
-        "file": {
-            "class": "concurrent_log_handler.ConcurrentRotatingFileHandler",
-            "filters": ["correlation_id"],
-            "filename": settings.log_file,
-            "backupCount": 5,
-            "maxBytes": 1048576,
-            "use_gzip": True,
-            "formatter": "json",
+            "targets": settings.log_handlers,
+            "log_file": settings.log_file,
+            "queue_size": settings.log_queue_size,
+            "batch_size": settings.log_batch_size,
+            "flush_interval": settings.log_flush_interval,
         },
     },
     "loggers": {
         "fastapi": {
-            "handlers": settings.log_handlers,
+            "handlers": ["queue"],
             "level": logging.INFO,
             "propagate": True,
         }
@@ -66,6 +211,6 @@ logging_schema : dict = {
 
 def changeLogFile(log_file: str | None = None) -> None:
     global logging_schema
-    if (log_file and "handlers" in logging_schema and "file" in logging_schema["handlers"] 
-        and "filename" in logging_schema["handlers"]["file"]):
-        logging_schema["handlers"]["file"]["filename"] = log_file
+    if (log_file and "handlers" in logging_schema and "queue" in logging_schema["handlers"]
+        and "log_file" in logging_schema["handlers"]["queue"]):
+        logging_schema["handlers"]["queue"]["log_file"] = log_file
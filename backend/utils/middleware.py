@@ -35,6 +35,8 @@ class CustomRequestMiddleware:
 
         request_data = _request_data_ctx_var.set({
             "request_headers": request_headers,
+            # Resolved users access memoized by access_control for this request
+            "user_access": {},
         })
 
         await self.app(scope, receive, send)
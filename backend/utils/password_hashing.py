@@ -1,4 +1,17 @@
+import asyncio
+import hashlib
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, TypeVar
+
 import bcrypt
+from fastapi import status
+from utils.settings import settings
+
+T = TypeVar("T")
+
+SESSION_FINGERPRINT_PREFIX = "hmac-sha256$"
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
@@ -13,3 +26,105 @@ def hash_password(password: str) -> str:
     bytes = password.encode('utf-8')
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(bytes, salt).decode("ascii")
+
+def session_fingerprint(token: str) -> str:
+    """Keyed digest of a session token, stored instead of the token itself"""
+    digest = hmac.new(
+        settings.jwt_secret.encode('utf-8'),
+        b"session:" + token.encode('utf-8'),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"{SESSION_FINGERPRINT_PREFIX}{digest}"
+
+def is_session_fingerprint(stored_value: str) -> bool:
+    return stored_value.startswith(SESSION_FINGERPRINT_PREFIX)
+
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated, size-limited thread pool so it doesn't block the event loop.
+    Once the workers are busy and `password_hashing_queue_size` calls are waiting,
+    the next calls are refused with a 503 instead of piling up.
+    """
+
+    def __init__(self):
+        self.executor: ThreadPoolExecutor | None = None
+        self.pending = 0
+        self.calls = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.hash_time = 0.0
+        self.max_hash_time = 0.0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                settings.password_hashing_workers, thread_name_prefix="password-hashing"
+            )
+        return self.executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.pending >= settings.password_hashing_workers + settings.password_hashing_queue_size:
+            self.rejected += 1
+            import models.api as api
+            from utils.internal_error_code import InternalErrorCode
+            raise api.Exception(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                api.Error(
+                    type="system",
+                    code=InternalErrorCode.SERVER_BUSY,
+                    message="The server is busy, please try again later",
+                ),
+            )
+
+        def timed_call() -> tuple[T, float, float]:
+            started_at = perf_counter()
+            result = func(*args)
+            return result, started_at, perf_counter()
+
+        self.pending += 1
+        submitted_at = perf_counter()
+        try:
+            result, started_at, finished_at = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), timed_call
+            )
+        finally:
+            self.pending -= 1
+
+        self.calls += 1
+        self.wait_time += started_at - submitted_at
+        self.max_wait_time = max(self.max_wait_time, started_at - submitted_at)
+        self.hash_time += finished_at - started_at
+        self.max_hash_time = max(self.max_hash_time, finished_at - started_at)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": settings.password_hashing_workers,
+            "pending": self.pending,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "avg_wait_ms": 1000 * self.wait_time / self.calls if self.calls else 0,
+            "max_wait_ms": 1000 * self.max_wait_time,
+            "avg_hash_ms": 1000 * self.hash_time / self.calls if self.calls else 0,
+            "max_hash_ms": 1000 * self.max_hash_time,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+async def verify_session_fingerprint(token: str, stored_value: str) -> bool:
+    if is_session_fingerprint(stored_value):
+        return hmac.compare_digest(session_fingerprint(token), stored_value)
+    # Sessions stored before the fingerprints hold a bcrypt hash of the token,
+    # bcrypt only ever hashed its first 72 bytes
+    return await password_hasher.verify(token[:72], stored_value)
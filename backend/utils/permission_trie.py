@@ -0,0 +1,111 @@
+from typing import Iterator
+
+from models.enums import ActionType, ConditionType
+from utils.settings import settings
+
+ACTION_BITS: dict[str, int] = {action.value: 1 << i for i, action in enumerate(ActionType)}
+CONDITION_BITS: dict[str, int] = {condition.value: 1 << i for i, condition in enumerate(ConditionType)}
+
+
+def to_mask(values: list | set, bits: dict[str, int]) -> int:
+    mask = 0
+    for value in values:
+        mask |= bits.get(str(value), 0)
+    return mask
+
+
+class CompiledPermission:
+    """One `{space}:{subpath}:{resource_type}` entry of the user permissions map"""
+
+    def __init__(self, permission: dict):
+        self.actions: int = to_mask(permission["allowed_actions"], ACTION_BITS)
+        self.conditions: int = to_mask(permission["conditions"], CONDITION_BITS)
+        self.restricted_fields: list = permission["restricted_fields"] or []
+        self.allowed_fields_values: dict = permission["allowed_fields_values"] or {}
+        self.is_restricted: bool = bool(self.restricted_fields or self.allowed_fields_values)
+
+
+class PermissionNode:
+    def __init__(self) -> None:
+        self.children: dict[str, PermissionNode] = {}
+        self.resource_types: dict[str, CompiledPermission] = {}
+
+
+class PermissionTrie:
+    """
+    The user permissions map compiled into a prefix trie:
+    space -> subpath segments -> resource type -> allowed actions and conditions bitmasks.
+    The root node of each space stands for the "/" subpath.
+    """
+
+    def __init__(self, user_permissions: dict):
+        self.spaces: dict[str, PermissionNode] = {}
+        for permission_key, permission in user_permissions.items():
+            parts = permission_key.split(":")
+            if len(parts) < 3:
+                continue
+            space_name, resource_type = parts[0], parts[-1]
+            subpath = ":".join(parts[1:-1])
+            # Subpaths are matched as written, only "/" and "a/b" forms are ever looked up,
+            # so keys like "/a", "a/" or "a//b" never grant anything
+            segments = [] if subpath == "/" else subpath.split("/")
+            if "" in segments:
+                continue
+            node = self.spaces.setdefault(space_name, PermissionNode())
+            for segment in segments:
+                node = node.children.setdefault(segment, PermissionNode())
+            node.resource_types[resource_type] = CompiledPermission(permission)
+
+    def candidates(self, space_name: str, segments: list[str], resource_type: str) -> Iterator[CompiledPermission]:
+        """
+        Yield the permissions to evaluate for a resource under `segments`, from the root subpath down.
+        At each subpath prefix the global permission is yielded first then the exact one.
+        The global permission is the first found of
+        {all_spaces}:{subpath}, {space}:{global subpath} and {all_spaces}:{global subpath},
+        where the global subpath replaces the parent segment by all_subpaths:
+        / and a => __all_subpaths__, a/b => __all_subpaths__/b, a/b/c => a/__all_subpaths__/c
+        """
+        space_node = self.spaces.get(space_name)
+        all_node = self.spaces.get(settings.all_spaces_mw)
+        if not space_node and not all_node:
+            return
+
+        all_subpaths = settings.all_subpaths_mw
+        # Nodes of the current prefix and of the two previous ones for each root
+        space_path: list[PermissionNode | None] = [space_node]
+        all_path: list[PermissionNode | None] = [all_node]
+        for depth in range(len(segments) + 1):
+            if depth:
+                segment = segments[depth - 1]
+                parent = space_path[-1]
+                space_path.append(parent.children.get(segment) if parent else None)
+                parent = all_path[-1]
+                all_path.append(parent.children.get(segment) if parent else None)
+
+            space_exact = space_path[depth]
+            all_exact = all_path[depth]
+
+            permission = all_exact.resource_types.get(resource_type) if all_exact else None
+            if not permission:
+                space_global = self.global_node(space_path, segments, depth, all_subpaths)
+                permission = space_global.resource_types.get(resource_type) if space_global else None
+            if not permission:
+                all_global = self.global_node(all_path, segments, depth, all_subpaths)
+                permission = all_global.resource_types.get(resource_type) if all_global else None
+            if permission:
+                yield permission
+
+            permission = space_exact.resource_types.get(resource_type) if space_exact else None
+            if permission:
+                yield permission
+
+    @staticmethod
+    def global_node(
+        path: list["PermissionNode | None"], segments: list[str], depth: int, all_subpaths: str
+    ) -> PermissionNode | None:
+        if depth < 2:
+            root = path[0]
+            return root.children.get(all_subpaths) if root else None
+        grandparent = path[depth - 2]
+        node = grandparent.children.get(all_subpaths) if grandparent else None
+        return node.children.get(segments[depth - 1]) if node else None
@@ -1,9 +1,11 @@
 import asyncio
+import json
 import os
 import sys
 from importlib.util import find_spec, module_from_spec
 from inspect import iscoroutine
 from pathlib import Path
+from time import monotonic
 
 import aiofiles
 from fastapi import Depends, FastAPI
@@ -18,10 +20,13 @@ from models.core import (
     EventFilter,
     EventListenTime,
 )
-from models.enums import ResourceType, PluginType
+from models.enums import ResourceType, PluginType, PluginOverflow
 from utils.settings import settings
+from utils.spaces import spaces_cache
 
 CUSTOM_PLUGINS_PATH = settings.spaces_folder / "custom_plugins"
+# The dispatch table is reset beyond this count of (space, action, listen time, resource type, schema) keys
+DISPATCH_TABLE_MAX_SIZE = 10000
 
 # Allow python to search for modules inside the custom plugins
 # be including the path to the parent folder of the custom plugins to sys.path
@@ -41,11 +46,177 @@ sys.path.append(
     "/".join(CUSTOM_PLUGINS_PATH.parts[back_to_spaces:-1])
 )
 
+class PluginLane:
+    """The bounded queue of the hook events of one plugin and the workers executing them"""
+
+    def __init__(
+        self,
+        shortname: str,
+        queue_size: int,
+        concurrency: int,
+        timeout: float,
+        on_full_queue: PluginOverflow,
+    ) -> None:
+        self.shortname = shortname
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[tuple[PluginWrapper, Event, float]] = asyncio.Queue(queue_size)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.on_full_queue = on_full_queue
+        self.workers: list[asyncio.Task] = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def stats(self) -> dict:
+        executed = self.completed + self.failed + self.timed_out
+        return {
+            "queued": self.queue.qsize(),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / executed * 1000, 3) if executed else 0,
+            "avg_time_ms": round(self.total_time / executed * 1000, 3) if executed else 0,
+            "max_time_ms": round(self.max_time * 1000, 3),
+        }
+
+
+class PluginExecutor:
+    """
+    Runs the hooks of each plugin from a queue of up to `queue_size` events with
+    `concurrency` workers of the current worker process.
+    Each hook is cancelled after the plugin's `timeout`, `timeout` seconds by default,
+    the hooks of the plugins with a 0 timeout are never cancelled.
+    When the plugin's queue is full the event is rejected and counted,
+    or awaits a free slot when the plugin's `on_full_queue` is wait.
+    """
+
+    def __init__(self, queue_size: int = 1000, concurrency: int = 4, timeout: float = 30) -> None:
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lanes: dict[str, PluginLane] = {}
+        self.draining = False
+
+    def lane(self, plugin_model: PluginWrapper) -> PluginLane:
+        lane = self.lanes.get(plugin_model.shortname)
+        # Lanes are bound to the loop that created them, and stopped by a drain
+        if (
+            lane is None
+            or lane.loop is not asyncio.get_running_loop()
+            or all(worker.done() for worker in lane.workers)
+        ):
+            lane = PluginLane(
+                plugin_model.shortname,
+                self.queue_size,
+                self.concurrency,
+                self.timeout if plugin_model.timeout is None else plugin_model.timeout,
+                plugin_model.on_full_queue,
+            )
+            lane.workers = [
+                asyncio.create_task(self.work(lane), name=f"plugin:{plugin_model.shortname}:{i}")
+                for i in range(lane.concurrency)
+            ]
+            self.lanes[plugin_model.shortname] = lane
+        return lane
+
+    async def submit(self, plugin_model: PluginWrapper, event: Event) -> bool:
+        lane = self.lane(plugin_model)
+        # The hooks that are never cancelled are still awaited by the drain
+        if self.draining and lane.timeout:
+            lane.rejected += 1
+            logger.warning(f"Plugin:{plugin_model.shortname}: shutting down, the event was dropped")
+            return False
+        if lane.on_full_queue == PluginOverflow.wait:
+            await lane.queue.put((plugin_model, event, monotonic()))
+            return True
+        try:
+            lane.queue.put_nowait((plugin_model, event, monotonic()))
+            return True
+        except asyncio.QueueFull:
+            lane.rejected += 1
+            logger.warning(f"Plugin:{plugin_model.shortname}: queue is full, the event was dropped")
+            return False
+
+    async def work(self, lane: PluginLane) -> None:
+        while True:
+            plugin_model, event, queued_at = await lane.queue.get()
+            started = monotonic()
+            lane.total_wait += started - queued_at
+            lane.running += 1
+            try:
+                async with asyncio.timeout(lane.timeout or None):
+                    if isinstance(plugin_model.object, PluginBase):
+                        plugin_execution = plugin_model.object.hook(event)
+                        if iscoroutine(plugin_execution):
+                            await plugin_execution
+                lane.completed += 1
+            except TimeoutError:
+                lane.timed_out += 1
+                logger.error(f"Plugin:{plugin_model.shortname}: timed out after {lane.timeout}s")
+            except Exception as e:
+                lane.failed += 1
+                logger.error(f"Plugin:{plugin_model.shortname}:{str(e)}")
+            finally:
+                elapsed = monotonic() - started
+                lane.total_time += elapsed
+                lane.max_time = max(lane.max_time, elapsed)
+                lane.running -= 1
+                lane.queue.task_done()
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Wait up to `timeout` seconds for the queued hooks then stop the workers,
+        the hooks of the plugins that are never cancelled are all awaited
+        """
+        self.draining = True
+        lanes = list(self.lanes.values())
+        try:
+            async with asyncio.timeout(timeout):
+                for lane in lanes:
+                    await lane.queue.join()
+        except TimeoutError:
+            pending = {lane.shortname: lane.queue.qsize() + lane.running for lane in lanes}
+            logger.warning(f"Plugin hooks left unfinished on shutdown: {pending}")
+            for lane in lanes:
+                if not lane.timeout:
+                    await lane.queue.join()
+
+        workers = [worker for lane in lanes for worker in lane.workers]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.draining = False
+
+    def stats(self) -> dict:
+        return {shortname: lane.stats() for shortname, lane in self.lanes.items()}
+
+
+plugin_executor = PluginExecutor(
+    settings.plugin_queue_size,
+    settings.plugin_concurrency,
+    settings.plugin_timeout,
+)
+
+
 class PluginManager:
 
     plugins_wrappers: dict[
         ActionType, list[PluginWrapper]
     ] = {}  # {action_type: list_of_plugins_wrappers]}
+    # plugin shortname -> normalized subpaths of its filters, None for __ALL__
+    plugins_subpaths: dict[str, frozenset[str] | None] = {}
+    # space_name -> shortnames of the space's active plugins
+    spaces_plugins: dict[str, frozenset[str]] = {}
+    # (space_name, action_type, listen_time, resource_type, schema_shortname) -> matching plugins
+    dispatch_table: dict[tuple, list[PluginWrapper]] = {}
 
     async def load_plugins(self, app: FastAPI, capture_body):
         # Load core plugins
@@ -118,6 +289,13 @@ class PluginManager:
         if plugin_wrapper.filters:
             for action in plugin_wrapper.filters.actions:
                 self.plugins_wrappers.setdefault(action, []).append(plugin_wrapper)
+            self.plugins_subpaths[plugin_wrapper.shortname] = (
+                None if "__ALL__" in plugin_wrapper.filters.subpaths
+                else frozenset(
+                    self.normalized_subpath(subpath) for subpath in plugin_wrapper.filters.subpaths
+                )
+            )
+        self.dispatch_table.clear()
 
     def sort_plugins(self):
         """Sort plugins based on plugin_wrapper.ordinal"""
@@ -126,19 +304,17 @@ class PluginManager:
             self.plugins_wrappers[action_type] = sorted(
                 plugins, key=lambda x: x.ordinal
             )
+        self.dispatch_table.clear()
 
-    def matched_filters(self, plugin_filters: EventFilter, event: Event):
-        formats_of_subpath = [event.subpath]
-        if event.subpath and event.subpath[0] == "/":
-            formats_of_subpath.append(event.subpath[1:])
-        else:
-            formats_of_subpath.append(f"/{event.subpath}")
+    @staticmethod
+    def normalized_subpath(subpath: str) -> str:
+        return subpath[1:] if subpath and subpath[0] == "/" else subpath
 
-        if "__ALL__" not in plugin_filters.subpaths and not any(
-            subpath in plugin_filters.subpaths for subpath in formats_of_subpath
-        ):
-            return False
+    def matched_subpath(self, plugin_model: PluginWrapper, subpath: str) -> bool:
+        plugin_subpaths = self.plugins_subpaths.get(plugin_model.shortname)
+        return plugin_subpaths is None or self.normalized_subpath(subpath) in plugin_subpaths
 
+    def matched_resource_filters(self, plugin_filters: EventFilter, event: Event) -> bool:
         if event.resource_type == ResourceType.content and (
             "__ALL__" not in plugin_filters.schema_shortnames
             and event.schema_shortname not in plugin_filters.schema_shortnames
@@ -154,65 +330,81 @@ class PluginManager:
 
         return True
 
-    async def before_action(self, event: Event):
-        if event.action_type not in self.plugins_wrappers:
-            return
+    def matched_filters(self, plugin_filters: EventFilter, event: Event):
+        formats_of_subpath = [event.subpath]
+        if event.subpath and event.subpath[0] == "/":
+            formats_of_subpath.append(event.subpath[1:])
+        else:
+            formats_of_subpath.append(f"/{event.subpath}")
 
-        space = await db.fetch_space(event.space_name)
-        if space is None:
-            return
-        space_plugins = space.active_plugins
+        if "__ALL__" not in plugin_filters.subpaths and not any(
+            subpath in plugin_filters.subpaths for subpath in formats_of_subpath
+        ):
+            return False
 
-        loop = asyncio.get_event_loop()
-        for plugin_model in self.plugins_wrappers[event.action_type]:
-            if (
-                plugin_model.shortname in space_plugins
-                and plugin_model.listen_time == EventListenTime.before
-                and plugin_model.filters
-                and self.matched_filters(plugin_model.filters, event)
-            ):
-                try:
-                    object = plugin_model.object
-                    if isinstance(object, PluginBase):
-                        plugin_execution = object.hook(event)
-                        if iscoroutine(plugin_execution):
-                            loop.create_task(plugin_execution)
-                except Exception as e:
-                    # print(f"Plugin:{plugin_model}:{str(e)}")
-                    logger.error(f"Plugin:{plugin_model}:{str(e)}")
+        return self.matched_resource_filters(plugin_filters, event)
 
-    async def after_action(self, event: Event):
-        if event.action_type not in self.plugins_wrappers:
+    async def load_spaces_plugins(self) -> None:
+        """Load the active plugins of each space, the dispatch table is rebuilt from them"""
+        try:
+            spaces = await db.get_spaces()
+        except Exception as e:
+            logger.warning(f"Error at plugin_manager.load_spaces_plugins: {e}")
             return
 
-        space = await db.fetch_space(event.space_name)
-        if space is None:
-            return
-        space_plugins = space.active_plugins
+        spaces_plugins: dict[str, frozenset[str]] = {}
+        for space_name, space in spaces.items():
+            space_data = json.loads(space) if isinstance(space, str) else space
+            spaces_plugins[space_name] = frozenset(space_data.get("active_plugins") or [])
+        self.spaces_plugins = spaces_plugins
+        self.dispatch_table.clear()
+
+    def event_plugins(self, event: Event, listen_time: EventListenTime) -> list[PluginWrapper]:
+        """The plugins of the event's space listening to it, in their ordinal order"""
+        key = (
+            event.space_name,
+            event.action_type,
+            listen_time,
+            event.resource_type,
+            event.schema_shortname,
+        )
+        plugins = self.dispatch_table.get(key)
+        if plugins is None:
+            space_plugins = self.spaces_plugins.get(event.space_name, frozenset())
+            plugins = [
+                plugin_model
+                for plugin_model in self.plugins_wrappers.get(event.action_type, [])
+                if plugin_model.shortname in space_plugins
+                and plugin_model.listen_time == listen_time
+                and plugin_model.filters
+                and self.matched_resource_filters(plugin_model.filters, event)
+            ]
+            if len(self.dispatch_table) >= DISPATCH_TABLE_MAX_SIZE:
+                self.dispatch_table.clear()
+            self.dispatch_table[key] = plugins
+
+        return [
+            plugin_model
+            for plugin_model in plugins
+            if self.matched_subpath(plugin_model, event.subpath)
+        ]
 
-        loop = asyncio.get_event_loop()
-        _plugin_model = None
-        try:
-            for plugin_model in self.plugins_wrappers[event.action_type]:
-                _plugin_model = plugin_model
-                if (
-                    plugin_model.shortname in space_plugins
-                    and plugin_model.listen_time == EventListenTime.after
-                    and plugin_model.filters
-                    and self.matched_filters(plugin_model.filters, event)
-                ):
-                    try:
-                        object = plugin_model.object
-                        if isinstance(object, PluginBase):
-                            plugin_execution = object.hook(event)
-                            if iscoroutine(plugin_execution):
-                                loop.create_task(plugin_execution)
-                    except Exception as e:
-                        # print(f"PluginError:{plugin_model}:{str(e)}")
-                        logger.error(f"Plugin:{plugin_model}:{str(e)}")
-        except Exception as e:
-            # print(f"PluginError:{_plugin_model}:{str(e)}")
-            logger.error(f"Plugin:{_plugin_model}:{str(e)}")
+    async def before_action(self, event: Event):
+        for plugin_model in self.event_plugins(event, EventListenTime.before):
+            try:
+                await plugin_executor.submit(plugin_model, event)
+            except Exception as e:
+                # print(f"Plugin:{plugin_model}:{str(e)}")
+                logger.error(f"Plugin:{plugin_model}:{str(e)}")
+
+    async def after_action(self, event: Event):
+        for plugin_model in self.event_plugins(event, EventListenTime.after):
+            try:
+                await plugin_executor.submit(plugin_model, event)
+            except Exception as e:
+                # print(f"PluginError:{plugin_model}:{str(e)}")
+                logger.error(f"Plugin:{plugin_model}:{str(e)}")
 
 
 plugin_manager = PluginManager()
+spaces_cache.on_change(plugin_manager.load_spaces_plugins)
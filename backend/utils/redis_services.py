@@ -1,8 +1,11 @@
 import re
 import json
 import sys
-from typing import Any, Awaitable
+from functools import lru_cache
+from time import monotonic
+from typing import Any, AsyncIterator, Awaitable
 from redis.asyncio import Redis
+from redis.exceptions import ResponseError
 from redis.asyncio.connection import BlockingConnectionPool
 from models.api import RedisReducer, SortType
 import models.core as core
@@ -24,6 +27,96 @@ from fastapi import status
 from fastapi.logger import logger
 
 
+# Hash of `{space}:{schema}` alias => the versioned index it points to, set by the blue/green reindexing
+INDEX_ALIASES_KEY = "dmart:index_aliases"
+# Hash of `{space}:{schema}` => json progress of its last reindexing
+REINDEX_PROGRESS_KEY = "dmart:reindex_progress"
+
+
+def escape_glob(value: str) -> str:
+    """Escape the glob special characters for a SCAN match pattern"""
+    return re.sub(r"([*?\[\]\\])", r"\\\1", value)
+
+
+@lru_cache(maxsize=10000)
+def query_policy_subpaths(subpath: str, entry_shortname: str | None = None) -> tuple:
+    """
+    The subpath prefixes of the query policies of the entries under `subpath`,
+    each paired with its variant through the all subpaths magic word (None for the first level ones)
+    """
+    subpath_parts = ["/"]
+    subpath_parts += subpath.strip("/").split("/")
+    if entry_shortname:
+        subpath_parts.append(entry_shortname)
+
+    prefixes: list = []
+    full_subpath = ""
+    for subpath_part in subpath_parts:
+        full_subpath += subpath_part
+        subpath_with_magic_keyword = None
+        full_subpath_parts = full_subpath.split("/")
+        if len(full_subpath_parts) > 1:
+            subpath_with_magic_keyword = (
+                "/".join(full_subpath_parts[:1]) + "/" + settings.all_subpaths_mw
+            )
+            if len(full_subpath_parts) > 2:
+                subpath_with_magic_keyword += "/" + "/".join(full_subpath_parts[2:])
+            subpath_with_magic_keyword = subpath_with_magic_keyword.strip("/")
+        prefixes.append((full_subpath.strip("/"), subpath_with_magic_keyword))
+
+        if full_subpath == "/":
+            full_subpath = ""
+        else:
+            full_subpath += "/"
+
+    return tuple(prefixes)
+
+
+class IndexRegistry:
+    """
+    Per-worker set of the existing RediSearch indices, so the queries go straight to FT.SEARCH / FT.AGGREGATE.
+    It's kept current by create_index / drop_index, an index it doesn't know is looked up again with FT._LIST
+    at most every `refresh_interval` seconds, and an "unknown index" reply drops the index from it.
+    """
+
+    def __init__(self, refresh_interval: float = 10) -> None:
+        self.refresh_interval = refresh_interval
+        self.names: set[str] = set()
+        self.loaded_at: float | None = None
+
+    def add(self, name: str) -> None:
+        self.names.add(name)
+
+    def discard(self, name: str) -> None:
+        self.names.discard(name)
+        # An index created by another process could be missing too
+        self.loaded_at = None
+
+    async def exists(self, redis_services: "RedisServices", name: str) -> bool:
+        if name in self.names:
+            return True
+        if self.loaded_at is None or monotonic() - self.loaded_at > self.refresh_interval:
+            names = set(await redis_services.list_indices() or [])
+            # FT._LIST doesn't return the aliases
+            aliases = await redis_services.get_hash(INDEX_ALIASES_KEY)
+            names.update(alias for alias, index_name in aliases.items() if index_name in names)
+            self.names = names
+            self.loaded_at = monotonic()
+        return name in self.names
+
+    def check_error(self, name: str, e: Exception) -> bool:
+        """Whether `e` is the reply to a query on a missing index, which is then forgotten"""
+        if isinstance(e, ResponseError) and any(
+            reply in str(e).lower() for reply in ("no such index", "unknown index")
+        ):
+            self.discard(name)
+            return True
+        return False
+
+
+index_registry = IndexRegistry(settings.redis_indices_refresh_interval)
+
+
 class RedisServices(Redis):
 
 
@@ -235,6 +328,16 @@ class RedisServices(Redis):
         await RedisServices.POOL.aclose()
         await RedisServices.POOL.disconnect(True)
 
+    @staticmethod
+    def index_definition(space_name: str, schema_name: str) -> IndexDefinition:
+        return IndexDefinition(
+            prefix=[
+                f"{space_name}:{schema_name}:",
+                f"{space_name}:{schema_name}/",
+            ],
+            index_type=IndexType.JSON,
+        )
+
     async def create_index(
         self,
         space_name: str,
@@ -245,26 +348,87 @@ class RedisServices(Redis):
         """
         create redis schema index, drop it if exist first
         """
-        try:
-            await self.redis_indices[space_name][schema_name].dropindex(
-                delete_documents=del_docs
-            )
-        except Exception as _:
-            pass
-            # logger.error(f"Error at redis_services.create_index: {e}")
+        await self.drop_index(f"{space_name}:{schema_name}", del_docs)
 
         await self.redis_indices[space_name][schema_name].create_index(
             redis_schema,
-            definition=IndexDefinition(
-                prefix=[
-                    f"{space_name}:{schema_name}:",
-                    f"{space_name}:{schema_name}/",
-                ],
-                index_type=IndexType.JSON,
-            ),
+            definition=self.index_definition(space_name, schema_name),
         )
+        index_registry.add(f"{space_name}:{schema_name}")
         # print(f"Created new index named {space_name}:{schema_name}\n")
 
+    async def create_index_version(
+        self,
+        space_name: str,
+        schema_name: str,
+        redis_schema: list[Field],
+    ) -> str:
+        """
+        Create a new version of the `{space}:{schema}` index over the same documents,
+        it's only queried once promote_index_version points the alias to it
+        """
+        index_name = f"{space_name}:{schema_name}:v{int(datetime.now().timestamp() * 1000)}"
+        await self.ft(index_name).create_index(
+            redis_schema,
+            definition=self.index_definition(space_name, schema_name),
+        )
+        return index_name
+
+    async def index_progress(self, index_name: str) -> tuple[bool, float]:
+        """Whether the index is still indexing the existing documents, and the indexed share of them"""
+        info = await self.ft(index_name).info()
+        return (
+            bool(int(info.get("indexing", 0))),
+            float(info.get("percent_indexed", 1)),
+        )
+
+    async def promote_index_version(self, space_name: str, schema_name: str, index_name: str) -> str | None:
+        """
+        Atomically point the `{space}:{schema}` alias to `index_name`,
+        returns the previous index version it pointed to, to be dropped by the caller
+        """
+        alias = f"{space_name}:{schema_name}"
+        previous = await self.get_hash_field(INDEX_ALIASES_KEY, alias)
+        if previous is None and alias in (await self.list_indices() or []):
+            # An index created before the blue/green reindexing holds the name
+            pipe = self.pipeline(transaction=True)
+            pipe.execute_command("FT.DROPINDEX", alias)
+            pipe.execute_command("FT.ALIASUPDATE", alias, index_name)
+            await pipe.execute()
+        else:
+            await self.ft(index_name).aliasupdate(alias)
+        await self.set_hash_field(INDEX_ALIASES_KEY, alias, index_name)
+        index_registry.add(alias)
+        return previous if previous != index_name else None
+
+    async def drop_index_versions(self, space_name: str, schema_name: str, keep: str) -> list[str]:
+        """Drop the versions of the `{space}:{schema}` index other than `keep`, keeping their documents"""
+        version_pattern = re.compile(rf"{re.escape(f'{space_name}:{schema_name}')}:v\d+")
+        dropped = []
+        for index_name in await self.list_indices() or []:
+            if index_name != keep and version_pattern.fullmatch(index_name):
+                await self.drop_index(index_name)
+                dropped.append(index_name)
+        return dropped
+
+    async def scan_keys(self, prefixes: list[str], count: int = 1000) -> set[str]:
+        keys: set[str] = set()
+        for prefix in prefixes:
+            async for batch in self.iter_keys(escape_glob(prefix) + "*", count):
+                keys.update(batch)
+        return keys
+
+    async def set_reindex_progress(self, space_name: str, schema_name: str, **progress) -> None:
+        await self.set_hash_field(
+            REINDEX_PROGRESS_KEY,
+            f"{space_name}:{schema_name}",
+            json.dumps({**progress, "updated_at": datetime.now().isoformat()}),
+        )
+
+    async def get_reindex_progress(self) -> dict[str, dict]:
+        progress = await self.get_hash(REINDEX_PROGRESS_KEY)
+        return {index: json.loads(value) for index, value in progress.items()}
+
     def get_redis_index_fields(self, key_chain, property, redis_schema_definition):
         """
         takes a key and a value of a schema definition, and returns the redis schema index
@@ -372,7 +536,7 @@ class RedisServices(Redis):
 
         return redis_schema
 
-    async def create_custom_indices(self, for_space: str | None = None):
+    def custom_index_definitions(self, for_space: str | None = None) -> dict[tuple[str, str], list[Field]]:
         redis_schemas: dict[str, list] = {}
         for i, index in enumerate(self.CUSTOM_INDICES):
             if (
@@ -385,9 +549,6 @@ class RedisServices(Redis):
             exclude_from_index: list = index["exclude_from_index"]
 
             redis_schemas.setdefault(f"{index['space']}", [])
-            self.redis_indices.setdefault(
-                f"{index['space']}:meta", {}
-            )
 
             generated_schema_fields : list[Field] = self.generate_redis_index_from_class(
                 self.CUSTOM_CLASSES[i], exclude_from_index
@@ -400,29 +561,30 @@ class RedisServices(Redis):
                 )
             )
 
-        for space_name, redis_schema in redis_schemas.items():
-            redis_schema = self.append_unique_index_fields(
-                redis_schema,
-                self.META_SCHEMA,
-            )
-            await self.create_index(
-                f"{space_name}",
-                "meta",
-                redis_schema,
+        return {
+            (space_name, "meta"): list(self.append_unique_index_fields(redis_schema, self.META_SCHEMA))
+            for space_name, redis_schema in redis_schemas.items()
+        }
+
+    async def create_custom_indices(self, for_space: str | None = None):
+        for (space_name, schema_name), redis_schema in self.custom_index_definitions(for_space).items():
+            self.redis_indices.setdefault(space_name, {})[schema_name] = self.ft(
+                f"{space_name}:{schema_name}"
             )
+            await self.create_index(space_name, schema_name, redis_schema)
 
-    async def create_indices(
+    async def index_definitions(
         self,
         for_space: str | None = None,
         for_schemas: list | None = None,
         for_custom_indices: bool = True,
-        del_docs: bool = True,
-    ):
+    ) -> dict[tuple[str, str], list[Field]]:
         """
-        Loop over all spaces, and for each one we create: (only if indexing_enabled is true for the space)
+        The fields of each (space_name, schema_name) index of the spaces with indexing_enabled:
         1-index for meta file called space_name:meta
         2-indices for schema files called space_name:schema_shortname
         """
+        definitions: dict[tuple[str, str], list[Field]] = {}
         spaces = await self.get_doc_by_id("spaces")
         for space_name in spaces:
             space_obj = core.Space.model_validate_json(spaces[space_name])
@@ -431,17 +593,12 @@ class RedisServices(Redis):
             ) or not space_obj.indexing_enabled:
                 continue
 
-            # CREATE REDIS INDEX FOR THE META FILES INSIDE THE SPACE
-            self.redis_indices[f"{space_name}"] = {}
-            self.redis_indices[f"{space_name}"]["meta"] = self.ft(
-                f"{space_name}:meta"
-            )
-
-            await self.create_index(
-                f"{space_name}", "meta", self.META_SCHEMA, del_docs
-            )
+            # INDEX FOR THE META FILES INSIDE THE SPACE
+            # The fields lists are copied as they are when the index would have been created,
+            # append_unique_index_fields extends META_SCHEMA itself
+            definitions[(space_name, "meta")] = list(self.META_SCHEMA)
 
-            # CREATE REDIS INDEX FOR EACH SCHEMA DEFINITION INSIDE THE SPACE
+            # INDEX FOR EACH SCHEMA DEFINITION INSIDE THE SPACE
             schemas_file_pattern = re.compile(r"(\w*).json")
             schemas_glob = "*.json"
             path = (
@@ -490,22 +647,35 @@ class RedisServices(Redis):
                             )
 
                 if redis_schema_definition:
-                    self.redis_indices[f"{space_name}"][
-                        schema_shortname
-                    ] = self.ft(f"{space_name}:{schema_shortname}")
                     field_names = [f.as_name for f in redis_schema_definition]
                     if "meta_doc_id" not in field_names:
                         redis_schema_definition.append(TextField("$.meta_doc_id", no_stem=True, as_name="meta_doc_id"))
+                    definitions[(space_name, schema_shortname)] = list(redis_schema_definition)
 
-                    await self.create_index(
-                        f"{space_name}",
-                        schema_shortname,
-                        redis_schema_definition,
-                        del_docs,
-                    )
-
+        # The custom indices extend the meta index of their space
         if for_custom_indices:
-            await self.create_custom_indices(for_space)
+            definitions.update(self.custom_index_definitions(for_space))
+
+        return definitions
+
+    async def create_indices(
+        self,
+        for_space: str | None = None,
+        for_schemas: list | None = None,
+        for_custom_indices: bool = True,
+        del_docs: bool = True,
+    ):
+        """
+        Loop over all spaces, and for each one we create: (only if indexing_enabled is true for the space)
+        1-index for meta file called space_name:meta
+        2-indices for schema files called space_name:schema_shortname
+        """
+        definitions = await self.index_definitions(for_space, for_schemas, for_custom_indices)
+        for (space_name, schema_name), redis_schema in definitions.items():
+            self.redis_indices.setdefault(space_name, {})[schema_name] = self.ft(
+                f"{space_name}:{schema_name}"
+            )
+            await self.create_index(space_name, schema_name, redis_schema, del_docs)
 
     def append_unique_index_fields(self, new_index: list[Field], base_index: list[Field]):
         for field in new_index:
@@ -546,43 +716,22 @@ class RedisServices(Redis):
         owner_group_shortname: str | None,
         entry_shortname: str | None = None,
     ) -> list:
-        subpath_parts = ["/"]
-        subpath_parts += subpath.strip("/").split("/")
-
-        if resource_type == ResourceType.folder and entry_shortname:
-            subpath_parts.append(entry_shortname)
+        if resource_type != ResourceType.folder:
+            entry_shortname = None
+        is_active_str = str(is_active).lower()
 
         query_policies: list = []
-        full_subpath = ""
-        for subpath_part in subpath_parts:
-            full_subpath += subpath_part
-            query_policies.append(
-                f"{space_name}:{full_subpath.strip('/')}:{resource_type}:{str(is_active).lower()}:{owner_shortname}"
-            )
+        for subpath_prefix, subpath_with_magic_keyword in query_policy_subpaths(subpath, entry_shortname):
+            policy = f"{space_name}:{subpath_prefix}:{resource_type}:{is_active_str}"
+            query_policies.append(f"{policy}:{owner_shortname}")
             if owner_group_shortname is None:
-                query_policies.append(
-                    f"{space_name}:{full_subpath.strip('/')}:{resource_type}:{str(is_active).lower()}"
-                )
+                query_policies.append(policy)
             else:
+                query_policies.append(f"{policy}:{owner_group_shortname}")
+            if subpath_with_magic_keyword is not None:
                 query_policies.append(
-                    f"{space_name}:{full_subpath.strip('/')}:{resource_type}:{str(is_active).lower()}:{owner_group_shortname}"
-                )
-
-            full_subpath_parts = full_subpath.split("/")
-            if len(full_subpath_parts) > 1:
-                subpath_with_magic_keyword = (
-                    "/".join(full_subpath_parts[:1]) + "/" + settings.all_subpaths_mw
+                    f"{space_name}:{subpath_with_magic_keyword}:{resource_type}:{is_active_str}"
                 )
-                if len(full_subpath_parts) > 2:
-                    subpath_with_magic_keyword += "/" + "/".join(full_subpath_parts[2:])
-                query_policies.append(
-                    f"{space_name}:{subpath_with_magic_keyword.strip('/')}:{resource_type}:{str(is_active).lower()}"
-                )
-
-            if full_subpath == "/":
-                full_subpath = ""
-            else:
-                full_subpath += "/"
 
         return query_policies
 
@@ -601,8 +750,10 @@ class RedisServices(Redis):
                 meta.shortname,
                 subpath,
             )
-        meta.model_rebuild()
-        meta_json = json.loads(meta.model_dump_json(serialize_as_any=False, exclude_none=True,warnings="error"))
+        # A single dump straight to json compatible types, the timestamps are set below
+        meta_json = meta.model_dump(
+            mode="json", exclude={"created_at", "updated_at"}, exclude_none=True, warnings="error"
+        )
         meta_json["query_policies"] = self.generate_query_policies(
             space_name,
             subpath,
@@ -812,7 +963,8 @@ class RedisServices(Redis):
             await x
 
     async def save_bulk(self, data: list, path: str = Path.root_path()):
-        pipe = self.pipeline()
+        # Pipelined without MULTI/EXEC, the docs are independent
+        pipe = self.pipeline(transaction=False)
         for document in data:
             pipe.json().set(document["doc_id"], path, document["payload"])
         return await pipe.execute()
@@ -846,14 +998,20 @@ class RedisServices(Redis):
         return_fields: list = [],
     ):
         # Tries to get the index from the provided space
+        index_name = f"{space_name}:{schema_name}"
         try:
-            ft_index = self.ft(f"{space_name}:{schema_name}")
-            await ft_index.info()
+            index_exists = await index_registry.exists(self, index_name)
         except Exception as e:
             logger.error(
-                f"Error accessing index: {space_name}:{schema_name}, at redis_services.search: {e}"
+                f"Error accessing index: {index_name}, at redis_services.search: {e}"
+            )
+            return {"data": [], "total": 0}
+        if not index_exists:
+            logger.error(
+                f"Error accessing index: {index_name}, at redis_services.search: no such index"
             )
             return {"data": [], "total": 0}
+        ft_index = self.ft(index_name)
 
         search_query = Query(
             query_string=self.prepare_query_string(search, filters, exact_subpath)
@@ -865,8 +1023,9 @@ class RedisServices(Redis):
         if sort_by:
             search_query.sort_by(sort_by, sort_type == SortType.ascending)
 
-        if return_fields:
-            search_query.return_fields(*return_fields)
+        # Top level attributes returned instead of the whole document
+        for field in return_fields:
+            search_query.return_field(f"$.{field}", as_field=field)
 
         search_query.paging(offset, limit)
 
@@ -881,7 +1040,7 @@ class RedisServices(Redis):
 
                 return {
                     "data": [
-                        one["extra_attributes"]["$"]
+                        one["extra_attributes"] if return_fields else one["extra_attributes"]["$"]
                         for one in search_res["results"]
                         if "extra_attributes" in one
                     ],
@@ -889,7 +1048,12 @@ class RedisServices(Redis):
                 }
             else:
                 return {}
-        except Exception:
+        except Exception as e:
+            if index_registry.check_error(index_name, e):
+                logger.error(
+                    f"Error accessing index: {index_name}, at redis_services.search: {e}"
+                )
+                return {"data": [], "total": 0}
             return {}
 
     async def aggregate(
@@ -907,11 +1071,13 @@ class RedisServices(Redis):
         load: list = [],
     ) -> list:
         # Tries to get the index from the provided space
+        index_name = f"{space_name}:{schema_name}"
         try:
-            ft_index = self.ft(f"{space_name}:{schema_name}")
-            await ft_index.info()
+            if not await index_registry.exists(self, index_name):
+                return []
         except Exception:
             return []
+        ft_index = self.ft(index_name)
 
         aggr_request = aggregation.AggregateRequest(
             self.prepare_query_string(search, filters, exact_subpath)
@@ -944,8 +1110,8 @@ class RedisServices(Redis):
             aggr_res = await ft_index.aggregate(aggr_request)  # type: ignore
             if aggr_res.get("results") and isinstance(aggr_res["results"], list):
                 return aggr_res["results"]
-        except Exception:
-            pass
+        except Exception as e:
+            index_registry.check_error(index_name, e)
         return []
 
     def prepare_query_string(
@@ -1083,11 +1249,46 @@ class RedisServices(Redis):
         except Exception as e:
             logger.warning(f"Error at redis_services.move_meta_doc: {e}")
 
+    async def delete_subpath_docs(self, space_name: str, subpath: str, batch_size: int = 1000) -> int:
+        """
+        Delete the docs of every entry under subpath (at any depth) of all the schemas,
+        the `{space}:{schema}:{subpath}/` keys are found through SCAN, returns the deleted meta docs count
+        """
+        subpath = subpath.strip("/")
+        if not subpath:
+            return 0
+        pattern = f"{escape_glob(space_name)}:*:{escape_glob(subpath)}/*"
+
+        deleted = 0
+        try:
+            async for keys in self.iter_keys(pattern, batch_size):
+                docs_ids = []
+                for key in keys:
+                    # The * of the pattern could span over more than the schema shortname
+                    parts = key.split(":", 2)
+                    if len(parts) == 3 and parts[0] == space_name and parts[2].startswith(f"{subpath}/"):
+                        docs_ids.append(key)
+                        deleted += parts[1] == "meta"
+                if docs_ids:
+                    await self.del_keys(docs_ids)
+        except Exception as e:
+            logger.warning(f"Error at redis_services.delete_subpath_docs: {e}")
+
+        return deleted
+
+    async def iter_keys(self, pattern: str = "*", batch_size: int = 1000) -> AsyncIterator[list[str]]:
+        """Yield the keys matching the pattern in batches, through SCAN instead of the blocking KEYS"""
+        cursor = 0
+        while True:
+            cursor, keys = await self.scan(cursor, match=pattern, count=batch_size)
+            if keys:
+                yield keys
+            if not cursor:
+                return
+
     async def get_keys(self, pattern: str = "*") -> list:
         try:
-            value = await self.keys(pattern)
-            if isinstance(value, list):
-                return value
+            return [key async for keys in self.iter_keys(pattern) for key in keys]
         except Exception as e:
             logger.warning(f"Error at redis_services.get_keys: {e}")
         return []
@@ -1119,10 +1320,41 @@ class RedisServices(Redis):
     async def set_ttl(self, key: str, ttl: int):
         return await self.expire(key, ttl)
 
+    async def get_hash(self, name: str) -> dict[str, str]:
+        x = self.hgetall(name)
+        value = await x if isinstance(x, Awaitable) else x
+        return value if isinstance(value, dict) else {}
+
+    async def get_hash_field(self, name: str, key: str) -> str | None:
+        x = self.hget(name, key)
+        value = await x if isinstance(x, Awaitable) else x
+        return value if isinstance(value, str) else None
+
+    async def set_hash_field(self, name: str, key: str, value: str) -> None:
+        x = self.hset(name, key, value)
+        if isinstance(x, Awaitable):
+            await x
+
+    async def del_hash_fields(self, name: str, keys: list[str]) -> None:
+        # The stubs type each of the *keys as a list
+        x = self.hdel(name, *keys)  # type: ignore
+        if isinstance(x, Awaitable):
+            await x
+
     async def drop_index(self, name: str, delete_docs: bool = False):
         try:
-            ft_index = self.ft(name)
+            # The name can be the alias of an index version
+            index_name = await self.get_hash_field(INDEX_ALIASES_KEY, name) or name
+            ft_index = self.ft(index_name)
             await ft_index.dropindex(delete_docs)
+            aliases = [
+                alias for alias, target in (await self.get_hash(INDEX_ALIASES_KEY)).items()
+                if target == index_name
+            ]
+            if aliases:
+                await self.del_hash_fields(INDEX_ALIASES_KEY, aliases)
+            for dropped_name in {name, index_name, *aliases}:
+                index_registry.discard(dropped_name)
             return True
         except Exception:
             return False
@@ -1134,24 +1366,59 @@ class RedisServices(Redis):
         
     
     
-    async def get_all_document_ids(self, index: str, search_str: str = "*") -> list[str]:        
-        # Initialize the list to hold document IDs
-        document_ids = []
-        
-        # Fetch all document IDs
+    async def iter_aggregate(
+        self,
+        index: str,
+        search_str: str = "*",
+        load: list[str] | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Yield the attributes loaded for the documents matching `search_str` in batches of up to `batch_size`,
+        read through an FT.AGGREGATE cursor so each batch costs the same however deep the scan is.
+        `load` defaults to the document key as "__key" and the whole json document as "$".
+        """
         ft_index = self.ft(index)
-        total_docs = int((await ft_index.info())['num_docs'])
-        
-        batch_size = 10000  # You can adjust the batch size based on your needs
-        
-        for offset in range(0, total_docs, batch_size):
-            query = Query(search_str).paging(offset, batch_size)
-            results = ft_index.search(query)
-            if results and isinstance(results, Awaitable):
-                results = await results
-            
-            if 'results' not in results or not isinstance(results['results'], list):
-                break
-            document_ids.extend([doc['id'] for doc in results['results']]) #type: ignore
-        
-        return document_ids
+        load_fields: list[Any] = load or ["@__key", "$"]
+        aggr_request = aggregation.AggregateRequest(search_str) \
+            .load(*load_fields) \
+            .cursor(count=batch_size)
+        cursor_id = 0
+        try:
+            reply = await ft_index.aggregate(aggr_request)  # type: ignore
+            while True:
+                results, cursor_id = reply
+                rows = [one.get("extra_attributes", {}) for one in results.get("results", [])]
+                if rows:
+                    yield rows
+                if not cursor_id:
+                    return
+                reply = await ft_index.aggregate(aggregation.Cursor(cursor_id))  # type: ignore
+        finally:
+            # The scan was stopped before the end of the cursor
+            if cursor_id:
+                try:
+                    await self.execute_command("FT.CURSOR", "DEL", index, cursor_id)
+                except Exception:
+                    pass
+
+    async def iter_documents(
+        self, index: str, search_str: str = "*", batch_size: int = 1000
+    ) -> AsyncIterator[list[str]]:
+        """Yield the json documents matching `search_str` in batches"""
+        async for rows in self.iter_aggregate(index, search_str, ["$"], batch_size):
+            yield [row["$"] for row in rows if "$" in row]
+
+    async def iter_document_ids(
+        self, index: str, search_str: str = "*", batch_size: int = 10000
+    ) -> AsyncIterator[list[str]]:
+        """Yield the ids of the documents matching `search_str` in batches"""
+        async for rows in self.iter_aggregate(index, search_str, ["@__key"], batch_size):
+            yield [row["__key"] for row in rows if "__key" in row]
+
+    async def get_all_document_ids(self, index: str, search_str: str = "*") -> list[str]:
+        return [
+            document_id
+            async for document_ids in self.iter_document_ids(index, search_str)
+            for document_id in document_ids
+        ]
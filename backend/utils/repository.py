@@ -1,12 +1,13 @@
 import json
 import os
 import re
-import subprocess
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Any
-from uuid import uuid4
+from functools import lru_cache
+from types import UnionType
+from typing import Annotated, Any, Union, get_args, get_origin
+from uuid import UUID, uuid4
 import aiofiles
 from fastapi import status
 from fastapi.encoders import jsonable_encoder
@@ -19,12 +20,14 @@ from data_adapters.adapter import data_adapter as db
 from utils.access_control import access_control
 from utils.custom_validations import validate_payload_with_schema
 from utils.database.create_tables import Users
+from utils.folder_manifest import SORTABLE_FIELDS, folder_manifest
 from utils.helpers import (
     camel_case,
     flatten_all,
-    snake_case, str_to_datetime, alter_dict_keys,
+    snake_case, alter_dict_keys,
 )
 from utils.internal_error_code import InternalErrorCode
+from utils.jsonl_reader import jsonl_reader
 from utils.jwt import generate_jwt
 from utils.plugin_manager import plugin_manager
 from utils.redis_services import RedisServices
@@ -85,10 +88,15 @@ async def _serve_query_search(query, logged_in_user, redis_query_policies):
     records = []
     total = 0
 
-    search_res, total = await redis_query_search(query, logged_in_user, redis_query_policies)
+    return_fields = search_return_fields(query)
+    search_res, total = await redis_query_search(
+        query, logged_in_user, redis_query_policies, return_fields
+    )
     res_data = []
     for redis_document in search_res:
-        res_data.append(json.loads(redis_document))
+        res_data.append(
+            decode_projected_doc(redis_document) if return_fields else json.loads(redis_document)
+        )
     if len(query.filter_schema_names) > 1:
         if query.sort_by:
             res_data = sorted(
@@ -133,6 +141,12 @@ async def _serve_query_search(query, logged_in_user, redis_query_policies):
             query.include_fields,
             query.exclude_fields,
         )
+        if query.projection is not None:
+            resource_base_record.attributes = {
+                key: value
+                for key, value in resource_base_record.attributes.items()
+                if key in query.projection
+            }
 
         records.append(resource_base_record)
 
@@ -209,7 +223,163 @@ async def set_attachment_for_payload(path, folder_obj, folder_record, query, met
     return folder_record
 
 
+async def _serve_query_subpath_manifest(query, logged_in_user):
+    """
+    Same listing as `_serve_query_subpath` but filtered, sorted and paged from the folder manifest,
+    only the meta files of the returned page are opened. The first `offset` rows are skipped,
+    so consecutive offset/limit pages neither overlap nor leave rows out.
+    """
+    records : list[Record] = []
+    total = 0
+
+    subpath = query.subpath
+    if subpath[0] == "/":
+        subpath = "." + subpath
+
+    path = (
+        settings.spaces_folder
+        / query.space_name
+        / subpath
+    )
+    meta_path = path / ".dm"
+
+    if query.include_fields is None:
+        query.include_fields = []
+
+    rows = folder_manifest.rows(query.space_name, query.subpath)
+    if query.sort_by in SORTABLE_FIELDS:
+        rows = sorted(
+            rows,
+            key=lambda row: row[str(query.sort_by)],
+            reverse=(query.sort_type == api.SortType.descending),
+        )
+
+    candidates: list[dict] = []
+    for row in rows:
+        if query.filter_shortnames and row["shortname"] not in query.filter_shortnames:
+            continue
+        if row["resource_type"] != ResourceType.folder:
+            if query.filter_types and ResourceType(row["resource_type"]) not in query.filter_types:
+                continue
+            if query.filter_tags and (
+                not row["tags"]
+                or not any(item in row["tags"] for item in query.filter_tags)
+            ):
+                continue
+        candidates.append(row)
+
+    accessible = await access_control.filter_accessible(
+        logged_in_user,
+        query.space_name,
+        [
+            (f"{query.subpath}/{row['shortname']}", ResourceType.folder, None, None, False, {}, row["shortname"])
+            if row["resource_type"] == ResourceType.folder
+            else (
+                query.subpath,
+                row["resource_type"],
+                row["owner_shortname"],
+                row["owner_group_shortname"],
+                row["is_active"],
+                {},
+                row["shortname"],
+            )
+            for row in candidates
+        ],
+        [
+            core.ActionType.query if row["resource_type"] == ResourceType.folder else core.ActionType.view
+            for row in candidates
+        ],
+    )
+
+    async with RedisServices() as redis_services:
+        for row, is_accessible in zip(candidates, accessible):
+            if not is_accessible:
+                continue
+
+            shortname = row["shortname"]
+            resource_type = ResourceType(row["resource_type"])
+            total += 1
+            if len(records) >= query.limit or total <= query.offset:
+                continue
+
+            if resource_type == ResourceType.folder:
+                subfolder_meta = path / shortname / ".dm/meta.folder.json"
+                if not subfolder_meta.is_file():
+                    continue
+                folder_obj = core.Folder.model_validate_json(subfolder_meta.read_text())
+                folder_record = folder_obj.to_record(
+                    query.subpath,
+                    shortname,
+                    query.include_fields,
+                )
+                await set_attachment_for_payload(
+                    path, folder_obj, folder_record, query, meta_path, shortname
+                )
+                records.append(folder_record)
+                continue
+
+            meta_file = meta_path / shortname / f"meta.{resource_type}.json"
+            if not meta_file.is_file():
+                continue
+            resource_class = getattr(
+                sys.modules["models.core"], camel_case(resource_type)
+            )
+            async with aiofiles.open(meta_file, "r") as file:
+                resource_obj = resource_class.model_validate_json(await file.read())
+
+            resource_base_record : Record = resource_obj.to_record(
+                query.subpath,
+                shortname,
+                query.include_fields,
+            )
+            if query.retrieve_lock_status and resource_base_record:
+                locked_data = await redis_services.get_lock_doc(
+                    query.space_name,
+                    query.subpath,
+                    resource_obj.shortname,
+                )
+                if locked_data:
+                    resource_base_record.attributes["locked"] = locked_data
+
+            if (
+                query.retrieve_json_payload
+                and resource_obj.payload
+                and resource_obj.payload.content_type
+                and resource_obj.payload.content_type == ContentType.json
+                and (path / resource_obj.payload.body).is_file()
+            ):
+                async with aiofiles.open(
+                        path / resource_obj.payload.body, "r"
+                ) as payload_file_content:
+                    resource_base_record.attributes["payload"].body = json.loads(
+                        await payload_file_content.read()
+                    )
+
+            if resource_obj.payload and resource_obj.payload.schema_shortname:
+                try:
+                    await _serve_query_subpath_check_payload(resource_base_record, path, resource_obj, query)
+                except Exception:
+                    continue
+
+            resource_base_record.attachments = await db.get_entry_attachments(
+                subpath=f"{query.subpath}/{shortname}",
+                attachments_path=(meta_path / shortname),
+                filter_types=query.filter_types,
+                include_fields=query.include_fields,
+                retrieve_json_payload=query.retrieve_json_payload,
+            )
+            records.append(resource_base_record)
+
+    if query.sort_by and query.sort_by not in SORTABLE_FIELDS:
+        records = await _serve_query_subpath_sorting(query, records)
+
+    return total, records
+
+
 async def _serve_query_subpath(query, logged_in_user):
+    if settings.files_query == "manifest":
+        return await _serve_query_subpath_manifest(query, logged_in_user)
+
     records : list[Record] = []
     total = 0
 
@@ -228,130 +398,142 @@ async def _serve_query_subpath(query, logged_in_user):
 
     meta_path = path / ".dm"
     if meta_path.is_dir():
+        candidates: list[tuple[str, str, core.Meta]] = []
         path_iterator = os.scandir(meta_path)
-        async with RedisServices() as redis_services:
-            for entry in path_iterator:
-                if not entry.is_dir():
-                    continue
+        for entry in path_iterator:
+            if not entry.is_dir():
+                continue
 
-                subpath_iterator = os.scandir(entry)  # type: ignore
-                for one in subpath_iterator:
-                    # for one in path.glob(entries_glob):
-                    match = regex.FILE_PATTERN.search(str(one.path))
-                    if not match or not one.is_file():
-                        continue
+            subpath_iterator = os.scandir(entry)  # type: ignore
+            for one in subpath_iterator:
+                # for one in path.glob(entries_glob):
+                match = regex.FILE_PATTERN.search(str(one.path))
+                if not match or not one.is_file():
+                    continue
 
-                    shortname = match.group(1)
-                    resource_name = match.group(2).lower()
-                    if (
-                        query.filter_types
-                        and ResourceType(resource_name) not in query.filter_types
-                    ):
-                        continue
+                shortname = match.group(1)
+                resource_name = match.group(2).lower()
+                if (
+                    query.filter_types
+                    and ResourceType(resource_name) not in query.filter_types
+                ):
+                    continue
 
-                    if (
-                        query.filter_shortnames
-                        and shortname not in query.filter_shortnames
-                    ):
-                        continue
+                if (
+                    query.filter_shortnames
+                    and shortname not in query.filter_shortnames
+                ):
+                    continue
 
-                    resource_class = getattr(
-                        sys.modules["models.core"], camel_case(
-                            resource_name)
+                resource_class = getattr(
+                    sys.modules["models.core"], camel_case(
+                        resource_name)
+                )
+                async with aiofiles.open(one.path, "r") as meta_file:
+                    resource_obj = resource_class.model_validate_json(
+                        await meta_file.read()
                     )
-                    async with aiofiles.open(str(one), "r") as meta_file:
-                        resource_obj = resource_class.model_validate_json(
-                            await meta_file.read()
+
+                if query.filter_tags and (
+                        not resource_obj.tags
+                        or not any(
+                            item in resource_obj.tags
+                            for item in query.filter_tags
                         )
+                ):
+                    continue
 
-                    if query.filter_tags and (
-                            not resource_obj.tags
-                            or not any(
-                                item in resource_obj.tags
-                                for item in query.filter_tags
-                            )
-                    ):
-                        continue
+                candidates.append((shortname, resource_name, resource_obj))
 
-                    # apply check access
-                    if not await access_control.check_access(
-                        user_shortname=logged_in_user,
-                        space_name=query.space_name,
-                        subpath=query.subpath,
-                        resource_type=ResourceType(resource_name),
-                        action_type=core.ActionType.view,
-                        resource_is_active=resource_obj.is_active,
-                        resource_owner_shortname=resource_obj.owner_shortname,
-                        resource_owner_group=resource_obj.owner_group_shortname,
-                        entry_shortname=shortname,
-                    ):
-                        continue
+            subpath_iterator.close()
+        if path_iterator:
+            path_iterator.close()
 
-                    total += 1
-                    if len(records) >= query.limit or total < query.offset:
-                        continue
+        # apply check access
+        accessible = await access_control.filter_accessible(
+            logged_in_user,
+            query.space_name,
+            [
+                (
+                    query.subpath,
+                    resource_name,
+                    resource_obj.owner_shortname,
+                    resource_obj.owner_group_shortname,
+                    resource_obj.is_active,
+                    {},
+                    shortname,
+                )
+                for shortname, resource_name, resource_obj in candidates
+            ],
+        )
+
+        async with RedisServices() as redis_services:
+            for (shortname, resource_name, resource_obj), is_accessible in zip(candidates, accessible):
+                if not is_accessible:
+                    continue
 
-                    resource_base_record : Record = resource_obj.to_record(
+                total += 1
+                if len(records) >= query.limit or total < query.offset:
+                    continue
+
+                resource_base_record : Record = resource_obj.to_record(
+                    query.subpath,
+                    shortname,
+                    query.include_fields,
+                )
+                if query.retrieve_lock_status and resource_base_record:
+                    locked_data = await redis_services.get_lock_doc(
+                        query.space_name,
                         query.subpath,
-                        shortname,
-                        query.include_fields,
+                        resource_obj.shortname,
                     )
-                    if query.retrieve_lock_status and resource_base_record:
-                        locked_data = await redis_services.get_lock_doc(
-                            query.space_name,
-                            query.subpath,
-                            resource_obj.shortname,
+                    if locked_data:
+                        resource_base_record.attributes[
+                            "locked"
+                        ] = locked_data
+
+                if (
+                    query.retrieve_json_payload
+                    and resource_obj.payload
+                    and resource_obj.payload.content_type
+                    and resource_obj.payload.content_type
+                    == ContentType.json
+                    and (path / resource_obj.payload.body).is_file()
+                ):
+                    async with aiofiles.open(
+                            path / resource_obj.payload.body, "r"
+                    ) as payload_file_content:
+                        resource_base_record.attributes[
+                            "payload"
+                        ].body = json.loads(
+                            await payload_file_content.read()
                         )
-                        if locked_data:
-                            resource_base_record.attributes[
-                                "locked"
-                            ] = locked_data
 
-                    if (
-                        query.retrieve_json_payload
-                        and resource_obj.payload
-                        and resource_obj.payload.content_type
-                        and resource_obj.payload.content_type
-                        == ContentType.json
-                        and (path / resource_obj.payload.body).is_file()
-                    ):
-                        async with aiofiles.open(
-                                path / resource_obj.payload.body, "r"
-                        ) as payload_file_content:
-                            resource_base_record.attributes[
-                                "payload"
-                            ].body = json.loads(
-                                await payload_file_content.read()
-                            )
+                if (
+                    resource_obj.payload
+                    and resource_obj.payload.schema_shortname
+                ):
+                    try:
+                        await _serve_query_subpath_check_payload(resource_base_record, path, resource_obj, query)
+                    except Exception:
+                        continue
 
-                    if (
-                        resource_obj.payload
-                        and resource_obj.payload.schema_shortname
-                    ):
-                        try:
-                            await _serve_query_subpath_check_payload(resource_base_record, path, resource_obj, query)
-                        except Exception:
-                            continue
-
-                    resource_base_record.attachments = (
-                        await db.get_entry_attachments(
-                            subpath=f"{query.subpath}/{shortname}",
-                            attachments_path=(meta_path / shortname),
-                            filter_types=query.filter_types,
-                            include_fields=query.include_fields,
-                            retrieve_json_payload=query.retrieve_json_payload,
-                        )
+                resource_base_record.attachments = (
+                    await db.get_entry_attachments(
+                        subpath=f"{query.subpath}/{shortname}",
+                        attachments_path=(meta_path / shortname),
+                        filter_types=query.filter_types,
+                        include_fields=query.include_fields,
+                        retrieve_json_payload=query.retrieve_json_payload,
                     )
-                    records.append(resource_base_record)
-
-                subpath_iterator.close()
-            if path_iterator:
-                path_iterator.close()
+                )
+                records.append(resource_base_record)
 
     # Get all matching sub folders
     # apply check access
 
     if meta_path.is_dir():
+        subfolders: list[tuple[str, Path]] = []
         subfolders_iterator = os.scandir(path)
         for one in subfolders_iterator:
             if not one.is_dir():
@@ -365,22 +547,31 @@ async def _serve_query_subpath(query, logged_in_user):
                 continue
 
             shortname = match.group(1)
-            if not await access_control.check_access(
-                    user_shortname=logged_in_user,
-                    space_name=query.space_name,
-                    subpath=f"{query.subpath}/{shortname}",
-                    resource_type=ResourceType.folder,
-                    action_type=core.ActionType.query,
-                    entry_shortname=shortname
-            ):
-                continue
-
             if (
                 query.filter_shortnames
                 and shortname not in query.filter_shortnames
             ):
                 continue
 
+            subfolders.append((shortname, subfolder_meta))
+
+        if subfolders_iterator:
+            subfolders_iterator.close()
+
+        accessible = await access_control.filter_accessible(
+            logged_in_user,
+            query.space_name,
+            [
+                (f"{query.subpath}/{shortname}", ResourceType.folder, None, None, False, {}, shortname)
+                for shortname, _ in subfolders
+            ],
+            core.ActionType.query,
+        )
+
+        for (shortname, subfolder_meta), is_accessible in zip(subfolders, accessible):
+            if not is_accessible:
+                continue
+
             total += 1
             if len(records) >= query.limit or total < query.offset:
                 continue
@@ -400,9 +591,6 @@ async def _serve_query_subpath(query, logged_in_user):
 
             records.append(folder_record)
 
-        if subfolders_iterator:
-            subfolders_iterator.close()
-
     if query.sort_by:
         records = await _serve_query_subpath_sorting(query, records)
 
@@ -558,41 +746,9 @@ async def _serve_query_history(query, logged_in_user):
     path = Path(f"{settings.spaces_folder}/{query.space_name}/"
                 f"{query.subpath}/.dm/{query.filter_shortnames[0]}/history.jsonl")
     if path.is_file():
-        r1 = subprocess.Popen(
-            ["tail", "-n", f"+{query.offset}", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-        )
-        rn = subprocess.Popen(
-            ["sed", "-e", "$a\\\n"], stdin=r1.stdout, stdout=subprocess.PIPE,
-        )
-        r2 = subprocess.Popen(
-            ["head", "-n", f"{query.limit}"], stdin=rn.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-        )
-        r3 = subprocess.Popen(
-            ["tac"], stdin=r2.stdout, stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        r4, _ = r3.communicate()
-        if r4 is None:
-            result = []
-        else:
-            result = list(
-                filter(
-                    None,
-                    r4.decode().split("\n"),
-                )
-            )
-
-        r, _ = subprocess.Popen(
-            f"wc -l {path}".split(" "), stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        ).communicate()
-
-        if r is None:
-            total = 0
-        else:
-            total = int(
-                r.decode().split()[0],
-                10,
-            )
+        # Pages run from the oldest entry, line `offset` (1-based) first, each page newest first
+        total, result = jsonl_reader.read_range(path, max(query.offset - 1, 0), query.limit)
+        result.reverse()
 
         for line in result:
             action_obj = json.loads(line)
@@ -620,89 +776,35 @@ async def _serve_query_events(query, logged_in_user):
     path = Path(
         f"{settings.spaces_folder}/{query.space_name}/.dm/events.jsonl")
     if path.is_file():
-        result = []
-        if query.search:
-            p = subprocess.Popen(
-                ["grep", f'"{query.search}"', path], stdout=subprocess.PIPE
-            )
-            p = subprocess.Popen(
-                ["tail", "-n", f"{query.limit + query.offset}"],
-                stdin=p.stdout,
-                stdout=subprocess.PIPE,
-            )
-            p = subprocess.Popen(
-                ["tac"], stdin=p.stdout, stdout=subprocess.PIPE
-            )
-            if query.offset > 0:
-                p = subprocess.Popen(
-                    ["sed", f"1,{query.offset}d"],
-                    stdin=p.stdout,
-                    stdout=subprocess.PIPE,
-                )
-            r, _ = p.communicate()
-            result = list(filter(None, r.decode("utf-8").split("\n")))
-        else:
-            r1 = subprocess.Popen(
-                ["tail", "-n", f"{query.limit + query.offset}", path], stdout=subprocess.PIPE,
-            )
-
-            r1 = subprocess.Popen(
-                ["sed", "-e", "$a\\\n"], stdin=r1.stdout, stdout=subprocess.PIPE,
-            )
-            if query.offset > 0:
-                r1 = subprocess.Popen(
-                    ["head", "-n", f"{query.limit}"], stdin=r1.stdout, stdout=subprocess.PIPE,
-                )
-
-            r6, _ = subprocess.Popen(
-                ["tac"], stdin=r1.stdout, stdout=subprocess.PIPE,
-            ).communicate()
-
-            if r6 is None:
-                result = []
-            else:
-                result = list(
-                    filter(
-                        None,
-                        r6.decode().split("\n"),
-                    )
+        total, result = jsonl_reader.read_latest(
+            path,
+            query.offset,
+            query.limit,
+            from_date=query.from_date,
+            to_date=query.to_date,
+            search=query.search,
+        )
+        actions = [json.loads(line) for line in result]
+
+        accessible = await access_control.filter_accessible(
+            logged_in_user,
+            query.space_name,
+            [
+                (
+                    action_obj.get("resource", {}).get("subpath", "/"),
+                    action_obj["resource"]["type"],
+                    None,
+                    None,
+                    False,
+                    {},
+                    None,
                 )
-
-        r, _ = subprocess.Popen(
-            f"wc -l {path}".split(" "), stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        ).communicate()
-
-        if r is None:
-            total = 0
-        else:
-            total = int(
-                r.decode().split()[0],
-                10,
-            )
-
-        for line in result:
-            action_obj = json.loads(line)
-
-            if (
-                    query.from_date
-                    and str_to_datetime(action_obj["timestamp"]) < query.from_date
-            ):
-                continue
-
-            if (
-                    query.to_date
-                    and str_to_datetime(action_obj["timestamp"]) > query.to_date
-            ):
-                break
-
-            if not await access_control.check_access(
-                    user_shortname=logged_in_user,
-                    space_name=query.space_name,
-                    subpath=action_obj.get(
-                        "resource", {}).get("subpath", "/"),
-                    resource_type=action_obj["resource"]["type"],
-                    action_type=core.ActionType(action_obj["request"]),
-            ):
+                for action_obj in actions
+            ],
+            [core.ActionType(action_obj["request"]) for action_obj in actions],
+        )
+        for action_obj, is_accessible in zip(actions, accessible):
+            if not is_accessible:
                 continue
             records.append(
                 core.Record(
@@ -888,8 +990,79 @@ async def redis_query_aggregate(
             return []
 
 
+# Attributes get_record_from_redis_doc reads besides the required fields of the resource
+RECORD_SEARCH_FIELDS = ["resource_type", "subpath", "shortname", "uuid", "created_at", "updated_at"]
+
+
+def search_return_fields(query: api.Query) -> list[str]:
+    """
+    Top level attributes to fetch from the search index when the records only need part of the documents,
+    empty when the whole documents are needed.
+    Only the attributes of the resources are projected, their types tell how to decode the returned values.
+    """
+    if (not query.include_fields and query.projection is None) or (
+        query.retrieve_json_payload
+        or query.highlight_fields
+        # The rows of the schemas are sorted on any attribute of the whole documents
+        or (query.sort_by and len(query.filter_schema_names) > 1)
+    ):
+        return []
+
+    fields = list(RECORD_SEARCH_FIELDS)
+    resources_fields: set[str] = set()
+    for resource_type in query.filter_types or list(ResourceType):
+        resource_class = getattr(sys.modules["models.core"], camel_case(resource_type), None)
+        if resource_class:
+            resources_fields.update(resource_class.model_fields)
+            fields.extend(
+                name for name, field in resource_class.model_fields.items() if field.is_required()
+            )
+    fields.extend(field.split(".")[0] for field in query.include_fields or [])
+    fields.extend(query.projection or [])
+    return [field for field in dict.fromkeys(fields) if field in resources_fields or field in RECORD_SEARCH_FIELDS]
+
+
+def is_text_annotation(annotation: Any) -> bool:
+    if get_origin(annotation) in (Union, UnionType):
+        return all(is_text_annotation(arg) for arg in get_args(annotation) if arg is not type(None))
+    if get_origin(annotation) is Annotated:
+        return is_text_annotation(get_args(annotation)[0])
+    return isinstance(annotation, type) and issubclass(annotation, (str, UUID, datetime))
+
+
+@lru_cache
+def projected_text_fields(resource_class: type) -> frozenset[str]:
+    """The attributes of the resource that a projected search returns as plain strings"""
+    return frozenset(
+        name
+        for name, field in resource_class.model_fields.items()
+        # The timestamps are indexed as numbers
+        if name not in ("created_at", "updated_at") and is_text_annotation(field.annotation)
+    )
+
+
+def decode_projected_doc(doc: dict) -> dict:
+    """
+    The attributes returned by a projected search are strings,
+    json encoded unless the resource declares them as text
+    """
+    resource_class = getattr(sys.modules["models.core"], camel_case(doc["resource_type"]))
+    text_fields = projected_text_fields(resource_class)
+    decoded = {}
+    for key, value in doc.items():
+        if key in RedisServices.SYS_ATTRIBUTES or key in text_fields:
+            decoded[key] = value
+        # Other attributes never make it to the record
+        elif key in resource_class.model_fields:
+            decoded[key] = json.loads(value)
+    return decoded
+
+
 async def redis_query_search(
-        query: api.Query, user_shortname: str, redis_query_policies: list = []
+        query: api.Query,
+        user_shortname: str,
+        redis_query_policies: list = [],
+        return_fields: list = [],
 ) -> tuple:
     search_res: list = []
     total = 0
@@ -945,6 +1118,7 @@ async def redis_query_search(
                 highlight_fields=list(query.highlight_fields.keys()),
                 sort_by=query.sort_by,
                 sort_type=query.sort_type or api.SortType.ascending,
+                return_fields=return_fields,
             )
 
             if redis_res:
@@ -18,11 +18,22 @@ class Settings(BaseSettings):
     app_name: str = "dmart"
     websocket_url: str = "" # http://127.0.0.1:8484"
     websocket_port: int = 8484
+    websocket_mode: str = "http"  # allowed values: http, redis
+    websocket_send_queue_size: int = 100  # messages waiting to be sent to a websocket client
+    websocket_slow_consumer_policy: str = "drop"  # allowed values: drop, disconnect
+    websocket_batch_size: int = 100  # channel events sent to the websocket server at once
+    websocket_batch_interval: float = 0.05  # seconds an event waits for its batch to fill
+    websocket_batch_max_pending: int = 10000  # events waiting to be sent before new ones are dropped
     base_path: str = ""
     debug_enabled: bool = True
     log_handlers: list[str] = ['console', 'file']
     log_file: str = "../logs/dmart.ljson.log"
     ws_log_file: str = "../logs/websocket.ljson.log"
+    log_queue_size: int = 10000  # log records waiting for the writer thread, the extra records are dropped
+    log_batch_size: int = 100
+    log_flush_interval: float = 0.5  # seconds
+    log_response_body_max_size: int = 4096  # bytes of json response bodies attached to the request log, 0 disables
+    log_response_body_sample_rate: float = 1.0  # share of the requests logged with their response body
     jwt_secret: str = "".join(random.sample(string.ascii_letters + string.digits,12))
     jwt_algorithm: str = "HS256"
     jwt_access_expires: int = 30 * 86400  # 30 days
@@ -32,11 +43,16 @@ class Settings(BaseSettings):
     redis_password: str = ""
     redis_port: int = 6379
     redis_pool_max_connections: int = 20
+    redis_indices_refresh_interval: float = 10  # seconds before FT._LIST is read again for an unknown index
     one_session_per_user: bool = False
     management_space: str = "management"
     users_subpath: str = "users"
     spaces_folder: Path = Path("../sample/spaces/")
     lock_period: int = 300
+    plugin_queue_size: int = 1000  # hook events waiting per plugin, the plugin's on_full_queue applies to the extra ones
+    plugin_concurrency: int = 4  # hooks of the same plugin running at once
+    plugin_timeout: float = 30  # seconds before a hook is cancelled unless the plugin sets its timeout, 0 disables
+    plugin_drain_timeout: float = 10  # seconds the queued hooks are awaited on shutdown
     servername: str = ""  # This is for print purposes only.
     auto_uuid_rule: str = "auto"  # Used to generate a shortname from UUID
     google_application_credentials: str = ""
@@ -61,7 +77,8 @@ class Settings(BaseSettings):
     send_sms_api: str = ""
     send_email_api: str = ""
     mock_smtp_api: bool = True
-    files_query: str = "scandir"
+    files_query: str = "scandir"  # allowed values: scandir, manifest
+    folder_manifest_cache_size: int = 256  # folders whose manifest rows a worker keeps in memory
     mock_smpp_api: bool = True
     invitation_link: str = ""
     ldap_url: str = "ldap://"
@@ -69,7 +86,12 @@ class Settings(BaseSettings):
     ldap_root_dn: str = ""
     ldap_pass: str = ""
     max_query_limit: int = 10000
+    csv_export_page_size: int = 1000
+    jsonl_index_cache_size: int = 256  # events/history files whose line index a worker keeps in memory
+    schema_validator_cache_ttl: int = 60  # seconds a compiled validator is trusted in sql mode
     session_inactivity_ttl: int = 60 * 60 * 24 * 7  # 7 days
+    session_verification_cache_ttl: int = 5  # seconds a verified session token is trusted by a worker, 0 disables
+    user_access_cache_ttl: int = 10  # seconds a user's resolved permissions are reused by a worker, 0 disables
 
     url_shorter_expires: int = 60 * 60 * 48  # 48 hours
 
@@ -92,8 +114,15 @@ class Settings(BaseSettings):
     database_host: str = 'localhost'
     database_port: int = 5432
     database_name: str = 'dmart'
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+    database_pool_timeout: int = 30
+    database_pool_recycle: int = 30 * 60  # Recycle connections older than 30 minutes
+    database_pool_pre_ping: bool = True
 
     max_failed_login_attempts: int = 5
+    password_hashing_workers: int = 4  # threads running bcrypt in each worker
+    password_hashing_queue_size: int = 32  # bcrypt calls allowed to wait for a thread before answering 503
 
     model_config = SettingsConfigDict(
         env_file=os.getenv(
@@ -1,8 +1,101 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from fastapi.logger import logger
+
 import models.core as core
 from utils.settings import settings
 from utils.redis_services import RedisServices
 from utils.regex import SPACES_PATTERN
 
+# Pub/sub channel telling all workers to reload what they derived from the spaces
+SPACES_CHANGED_CHANNEL = "dmart:spaces:changed"
+
+
+class SpacesCache:
+    """
+    Per-worker copy of the redis "spaces" doc and of the core.Space models parsed from it.
+    It is only kept while `listen_for_changes` is subscribed to SPACES_CHANGED_CHANNEL,
+    so processes without the listener always read redis.
+    The returned documents and models are shared, callers must not mutate them.
+    """
+
+    def __init__(self) -> None:
+        self.documents: dict | None = None
+        self.spaces: dict[str, core.Space] = {}
+        # Bumped on every change so a load racing with it is not cached
+        self.generation = 0
+        self.listening = False
+        self.change_callbacks: list[Callable[[], Awaitable[None]]] = []
+
+    def on_change(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Run `callback` after the cache is dropped because the spaces changed"""
+        self.change_callbacks.append(callback)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.documents = None
+        self.spaces = {}
+
+    async def get_documents(self) -> dict:
+        if self.documents is not None:
+            return self.documents
+
+        generation = self.generation
+        async with RedisServices() as redis_services:
+            value = await redis_services.get_doc_by_id("spaces")
+        documents = value if isinstance(value, dict) else {}
+        if self.listening and generation == self.generation:
+            self.documents = documents
+        return documents
+
+    async def get_space(self, space_name: str) -> core.Space | None:
+        documents = await self.get_documents()
+        if space_name not in documents:
+            return None
+        if documents is not self.documents:
+            return core.Space.model_validate_json(documents[space_name])
+
+        space = self.spaces.get(space_name)
+        if space is None:
+            space = core.Space.model_validate_json(documents[space_name])
+            self.spaces[space_name] = space
+        return space
+
+    async def changed(self) -> None:
+        self.clear()
+        for callback in self.change_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.warning(f"Error at spaces_cache.changed: {e}")
+
+    async def listen_for_changes(self) -> None:
+        """Long running task dropping the cache when any worker changes the spaces"""
+        while True:
+            try:
+                async with RedisServices() as redis_services:
+                    async with redis_services.pubsub() as pubsub:
+                        await pubsub.subscribe(SPACES_CHANGED_CHANNEL)
+                        self.listening = True
+                        # Changes could have been missed while disconnected
+                        await self.changed()
+                        async for message in pubsub.listen():
+                            if message["type"] == "message":
+                                await self.changed()
+            except asyncio.CancelledError:
+                self.listening = False
+                self.clear()
+                raise
+            except Exception as e:
+                logger.warning(f"Error at spaces_cache.listen_for_changes: {e}")
+                self.listening = False
+                self.clear()
+                await asyncio.sleep(5)
+
+
+spaces_cache = SpacesCache()
+
 
 async def initialize_spaces() -> None:
     if settings.active_data_db == "file":
@@ -23,3 +116,15 @@ async def initialize_spaces() -> None:
 
         async with RedisServices() as redis_services:
             await redis_services.save_doc("spaces", spaces)
+
+    await notify_spaces_changed()
+
+
+async def notify_spaces_changed() -> None:
+    """Drop the spaces cache of this worker now and of the other workers through pub/sub"""
+    spaces_cache.clear()
+    try:
+        async with RedisServices() as redis_services:
+            await redis_services.publish(SPACES_CHANGED_CHANNEL, "*")
+    except Exception as e:
+        logger.warning(f"Error at notify_spaces_changed: {e}")
@@ -3,6 +3,7 @@ from utils.async_request import AsyncRequest
 from utils.notification import Notifier
 from utils.helpers import lang_code
 from utils.settings import settings
+from utils.websocket_fanout import publish_to_user
 
 
 
@@ -13,16 +14,21 @@ class WebNotifier(Notifier):
         self, 
         data: NotificationData
     ) -> bool:
+        user_lang = lang_code(data.receiver.get("language", "ar"))
+        message = {
+            "title": data.title.__getattribute__(user_lang),
+            "description": data.body.__getattribute__(user_lang),
+        }
+        if settings.websocket_mode == "redis":
+            await publish_to_user(str(data.receiver.get("shortname")), message)
+            return True
+
         if not settings.websocket_url:
             return False
-        user_lang = lang_code(data.receiver.get("language", "ar"))
         async with AsyncRequest() as client:
             await client.post(
                 f"{settings.websocket_url}/send-message/{data.receiver.get('shortname')}",
-                json={
-                    "title": data.title.__getattribute__(user_lang),
-                    "description": data.body.__getattribute__(user_lang),
-                }
+                json=message
             )
         
         return True
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import aiohttp
+from fastapi.logger import logger
+
+from utils.async_request import AsyncRequest
+from utils.redis_services import RedisServices
+from utils.settings import settings
+
+# Redis channels the websocket messages are published to when settings.websocket_mode is redis
+CHANNEL_PREFIX = "dmart:websocket:channel:"
+USER_PREFIX = "dmart:websocket:user:"
+# Hash of websocket node id => json of the node's subscription counts
+NODES_KEY = "dmart:websocket:nodes"
+
+
+def channel_message(message: dict) -> str:
+    return json.dumps({
+        "type": "notification_subscription",
+        "message": message
+    })
+
+
+def user_message(message: dict) -> str:
+    return json.dumps({
+        "type": "message",
+        "message": message
+    })
+
+
+async def publish_batch(events: list[dict]) -> int:
+    """
+    Publish each event's message to its websocket channels in a single round trip,
+    events are {"channels": [...], "message": {...}}, returns the count of the nodes reached
+    """
+    async with RedisServices() as redis_services:
+        pipe = redis_services.pipeline(transaction=False)
+        for event in events:
+            formatted_message = channel_message(event["message"])
+            for channel_name in event["channels"]:
+                pipe.publish(f"{CHANNEL_PREFIX}{channel_name}", formatted_message)
+        return sum(await pipe.execute())
+
+
+async def publish_to_channels(channels: list[str], message: dict) -> int:
+    """Publish the message to the websocket channels, returns the count of the nodes it reached"""
+    return await publish_batch([{"channels": channels, "message": message}])
+
+
+async def publish_to_user(user_shortname: str, message: dict) -> int:
+    async with RedisServices() as redis_services:
+        reached: int = await redis_services.publish(
+            f"{USER_PREFIX}{user_shortname}", user_message(message)
+        )
+        return reached
+
+
+class ChannelEventsBatcher:
+    """
+    Coalesces the channel events of the current worker into batches of up to `batch_size` events,
+    sent at the latest `interval` seconds after the first one was added.
+    A batch is a single pipelined publish in redis mode, otherwise a single POST to the
+    websocket server's /broadcast-batch over a long-lived pooled session.
+    Events are dropped and counted when `max_pending` are already waiting.
+    """
+
+    def __init__(self, batch_size: int = 100, interval: float = 0.05, max_pending: int = 10000):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.events: list[dict] = []
+        self.full = asyncio.Event()
+        self.flusher: asyncio.Task | None = None
+        self.closing = False
+        self.session: aiohttp.ClientSession | None = None
+        self.session_loop: asyncio.AbstractEventLoop | None = None
+        self.batches = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def add(self, channels: list[str], message: dict) -> None:
+        if len(self.events) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.events.append({"channels": channels, "message": message})
+        if len(self.events) >= self.batch_size:
+            self.full.set()
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self.flush_pending())
+
+    async def flush_pending(self) -> None:
+        try:
+            while self.events:
+                if not self.full.is_set() and not self.closing:
+                    try:
+                        await asyncio.wait_for(self.full.wait(), self.interval)
+                    except TimeoutError:
+                        pass
+                batch = self.events[:self.batch_size]
+                self.events = self.events[self.batch_size:]
+                if len(self.events) < self.batch_size:
+                    self.full.clear()
+                await self.deliver(batch)
+        finally:
+            self.flusher = None
+
+    def client(self) -> aiohttp.ClientSession:
+        # The session is bound to the loop that created it
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.session_loop is not loop:
+            self.session = AsyncRequest()
+            self.session_loop = loop
+        return self.session
+
+    async def deliver(self, batch: list[dict]) -> None:
+        try:
+            if settings.websocket_mode == "redis":
+                await publish_batch(batch)
+            else:
+                async with self.client().post(
+                    f"{settings.websocket_url}/broadcast-batch", json={"events": batch}
+                ) as response:
+                    response.raise_for_status()
+            self.batches += 1
+            self.sent += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"Failed to deliver {len(batch)} websocket events: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.events),
+            "batches": self.batches,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    async def close(self) -> None:
+        self.closing = True
+        if self.flusher:
+            self.full.set()
+            await self.flusher
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.closing = False
+
+
+channel_events_batcher = ChannelEventsBatcher(
+    settings.websocket_batch_size,
+    settings.websocket_batch_interval,
+    settings.websocket_batch_max_pending,
+)
@@ -10,55 +10,144 @@ from hypercorn.asyncio import serve
 from models.enums import Status as ResponseStatus
 from fastapi.responses import JSONResponse
 from fastapi.logger import logger
+from os import getpid
+import socket
+from time import time
+from redis.asyncio.client import PubSub
+from utils.redis_services import RedisServices
+from utils.websocket_fanout import (
+    CHANNEL_PREFIX,
+    NODES_KEY,
+    USER_PREFIX,
+    channel_message,
+    publish_batch,
+    publish_to_channels,
+    publish_to_user,
+    user_message,
+)
 
 
 all_MKW = "__ALL__"
+# Seconds between the updates of the node subscription counts in redis
+NODE_REPORT_INTERVAL = 10
+
+class ClientConnection:
+    def __init__(self, websocket: WebSocket, user_shortname: str) -> None:
+        self.websocket = websocket
+        self.user_shortname = user_shortname
+        # Serialized messages waiting to be written to the client
+        self.queue: asyncio.Queue[str] = asyncio.Queue(settings.websocket_send_queue_size)
+        self.channels: set[str] = set()
+        self.writer: asyncio.Task | None = None
+
+
 class ConnectionManager:
     def __init__(self) -> None:
-        self.active_connections: dict[str, WebSocket] = {}
-        # item => channel_name: list_of_subscribed_clients
-        self.channels: dict[str, list[str]] = {}
+        self.active_connections: dict[str, ClientConnection] = {}
+        # item => channel_name: subscribed_clients
+        self.channels: dict[str, set[str]] = {}
+        # id(websocket) => user_shortname
+        self.websocket_users: dict[int, str] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
 
     async def connect(self, websocket: WebSocket, user_shortname: str):
         await websocket.accept()
-        self.active_connections[user_shortname] = websocket
+        if user_shortname in self.active_connections:
+            self.disconnect(user_shortname)
+        connection = ClientConnection(websocket, user_shortname)
+        connection.writer = asyncio.create_task(self.write_messages(connection))
+        self.active_connections[user_shortname] = connection
+        self.websocket_users[id(websocket)] = user_shortname
 
 
-    def disconnect(self, user_shortname: str):
+    def disconnect(self, user_shortname: str, websocket: WebSocket | None = None):
+        connection = self.active_connections.get(user_shortname)
+        if not connection or (websocket and connection.websocket is not websocket):
+            return
         del self.active_connections[user_shortname]
+        self.websocket_users.pop(id(connection.websocket), None)
+        self.remove_all_subscriptions(user_shortname)
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+
+    async def write_messages(self, connection: ClientConnection):
+        try:
+            while True:
+                message = await connection.queue.get()
+                await connection.websocket.send_text(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(
+                "WebSocket send failed", extra={"user_shortname": connection.user_shortname, "error": str(e)}
+            )
+            self.disconnect(connection.user_shortname, connection.websocket)
+
+
+    def enqueue(self, message: str, user_shortname: str) -> bool:
+        connection = self.active_connections.get(user_shortname)
+        if not connection:
+            return False
+        try:
+            connection.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if settings.websocket_slow_consumer_policy == "disconnect":
+            self.slow_disconnects += 1
+            self.disconnect(user_shortname)
+            asyncio.create_task(self.close_websocket(connection.websocket))
+        else:
+            self.dropped += 1
+        return False
 
 
-    async def send_message(self, message: str, user_shortname: str):
-        if user_shortname in self.active_connections:
-            await self.active_connections[user_shortname].send_text(message)
-            return True
+    @staticmethod
+    async def close_websocket(websocket: WebSocket):
+        try:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        except Exception:
+            pass
 
-        return False
+
+    async def send_message(self, message: str, user_shortname: str):
+        return self.enqueue(message, user_shortname)
 
     
     async def broadcast_message(self, message: str, channel_name: str):
+        """Queue the already serialized message to every subscriber of the channel"""
         if channel_name not in self.channels:
             return False
             
-        for user_shortname in self.channels[channel_name]:
-            await self.send_message(message, user_shortname)
+        for user_shortname in list(self.channels[channel_name]):
+            self.enqueue(message, user_shortname)
 
         return True
             
 
     def remove_all_subscriptions(self, username: str):
-        updated_channels: dict[str, list[str]] = {}
-        for channel_name, users in self.channels.items():
-            if username in users:
-                users.remove(username)
-            updated_channels[channel_name] = users
-        self.channels = updated_channels
+        connection = self.active_connections.get(username)
+        channels = connection.channels if connection else [
+            channel_name for channel_name, users in self.channels.items() if username in users
+        ]
+        for channel_name in list(channels):
+            users = self.channels.get(channel_name)
+            if users is None:
+                continue
+            users.discard(username)
+            if not users:
+                del self.channels[channel_name]
+        if connection:
+            connection.channels.clear()
 
 
     async def channel_unsubscribe(self, websocket: WebSocket):
-        connections_usernames = list(self.active_connections.keys())
-        connections = list(self.active_connections.values())
-        username = connections_usernames[connections.index(websocket)]
+        username = self.websocket_users[id(websocket)]
         self.remove_all_subscriptions(username)
         subscribed_message = json.dumps({
             "type": "notification_unsubscribe",
@@ -89,13 +178,10 @@ class ConnectionManager:
         if not channel_name:
             return False
 
-        self.channels.setdefault(channel_name, [])
-
-        connections_usernames = list(self.active_connections.keys())
-        connections = list(self.active_connections.values())
-        username = connections_usernames[connections.index(websocket)]
+        username = self.websocket_users[id(websocket)]
         self.remove_all_subscriptions(username)
-        self.channels[channel_name].append(username)
+        self.channels.setdefault(channel_name, set()).add(username)
+        self.active_connections[username].channels.add(channel_name)
 
         subscribed_message = json.dumps({
             "type": "notification_subscription",
@@ -105,9 +191,122 @@ class ConnectionManager:
         })
         await self.send_message(subscribed_message, username)
 
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "queued": sum(connection.queue.qsize() for connection in self.active_connections.values()),
+        }
+
+
+class RedisFanout:
+    """
+    Relays the messages published to redis by the dmart workers to the clients of this node,
+    the node only subscribes to the channels and the users it has clients for
+    """
+
+    def __init__(self, manager: ConnectionManager) -> None:
+        self.manager = manager
+        self.node_id = f"{socket.gethostname()}:{getpid()}"
+        self.pubsub: PubSub | None = None
+        self.subscribed: set[str] = set()
+        # The diffs are computed and applied one call at a time,
+        # or an older unsubscribe could land after a newer subscribe to the same channel
+        self.subscriptions_lock = asyncio.Lock()
+
+    def wanted_subscriptions(self) -> set[str]:
+        wanted = {f"{USER_PREFIX}{user_shortname}" for user_shortname in self.manager.active_connections}
+        wanted.update(
+            f"{CHANNEL_PREFIX}{channel_name}"
+            for channel_name, users in self.manager.channels.items()
+            if users
+        )
+        return wanted
+
+    async def sync_subscriptions(self) -> None:
+        async with self.subscriptions_lock:
+            if not self.pubsub:
+                return
+            wanted = self.wanted_subscriptions()
+            to_subscribe = wanted - self.subscribed
+            to_unsubscribe = self.subscribed - wanted
+            if to_subscribe:
+                await self.pubsub.subscribe(*to_subscribe)
+                self.subscribed |= to_subscribe
+            if to_unsubscribe:
+                await self.pubsub.unsubscribe(*to_unsubscribe)
+                self.subscribed -= to_unsubscribe
+
+    async def relay(self, message: dict) -> None:
+        redis_channel: str = message["channel"]
+        if redis_channel.startswith(CHANNEL_PREFIX):
+            await self.manager.broadcast_message(message["data"], redis_channel[len(CHANNEL_PREFIX):])
+        elif redis_channel.startswith(USER_PREFIX):
+            await self.manager.send_message(message["data"], redis_channel[len(USER_PREFIX):])
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                async with RedisServices() as redis_services:
+                    async with redis_services.pubsub() as pubsub:
+                        # The node channel keeps the connection subscribed while there are no clients
+                        await pubsub.subscribe(f"dmart:websocket:node:{self.node_id}")
+                        async with self.subscriptions_lock:
+                            self.pubsub = pubsub
+                            self.subscribed = set()
+                        await self.sync_subscriptions()
+                        async for message in pubsub.listen():
+                            if message["type"] == "message":
+                                await self.relay(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error at websocket RedisFanout.listen: {e}")
+                await asyncio.sleep(5)
+            finally:
+                async with self.subscriptions_lock:
+                    self.pubsub = None
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.manager.active_connections),
+            "channels": sum(1 for users in self.manager.channels.values() if users),
+            "subscriptions": len(self.subscribed),
+        }
+
+    async def report(self) -> None:
+        """Keep this node's subscription counts in redis for the /info of every node"""
+        while True:
+            try:
+                async with RedisServices() as redis_services:
+                    await redis_services.set_hash_field(
+                        NODES_KEY, self.node_id, json.dumps({**self.stats(), "updated_at": time()})
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error at websocket RedisFanout.report: {e}")
+            await asyncio.sleep(NODE_REPORT_INTERVAL)
+
+    async def nodes(self) -> dict:
+        async with RedisServices() as redis_services:
+            nodes = await redis_services.get_hash(NODES_KEY)
+        live_nodes = {}
+        for node_id, node_stats in nodes.items():
+            node_stats = json.loads(node_stats)
+            if node_stats["updated_at"] > time() - 3 * NODE_REPORT_INTERVAL:
+                live_nodes[node_id] = node_stats
+        return live_nodes
+
+    async def remove_node(self) -> None:
+        async with RedisServices() as redis_services:
+            await redis_services.del_hash_fields(NODES_KEY, [self.node_id])
 
 
 websocket_manager = ConnectionManager()
+redis_fanout = RedisFanout(websocket_manager)
+fanout_tasks: list[asyncio.Task] = []
 
 
 app = FastAPI()
@@ -122,6 +321,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
     user_shortname = decoded_token["shortname"]
     await websocket_manager.connect(websocket, user_shortname)
+    await redis_fanout.sync_subscriptions()
 
     success_connection_message = json.dumps({
         "type": "connection_response",
@@ -132,26 +332,29 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     await websocket_manager.send_message(success_connection_message, user_shortname)
 
     try:
-        while True:
+        while id(websocket) in websocket_manager.websocket_users:
             msg = await websocket.receive_text()
             msg_json = json.loads(msg)
             if "type" in msg_json and msg_json["type"] == "notification_subscription":
                 await websocket_manager.channel_subscribe(websocket, msg_json)
+                await redis_fanout.sync_subscriptions()
             if "type" in msg_json and msg_json["type"] == "notification_unsubscribe":
                 await websocket_manager.channel_unsubscribe(websocket)
+                await redis_fanout.sync_subscriptions()
 
     except WebSocketDisconnect:
         logger.info("WebSocket connection closed", extra={"user_shortname": user_shortname})
-        websocket_manager.disconnect(user_shortname)
+    finally:
+        websocket_manager.disconnect(user_shortname, websocket)
+        await redis_fanout.sync_subscriptions()
 
 
 @app.api_route(path="/send-message/{user_shortname}", methods=["post"])
 async def send_message(user_shortname: str, message: dict = Body(...)):
-    formatted_message = json.dumps({
-        "type": "message",
-        "message": message
-    })
-    is_sent = await websocket_manager.send_message(formatted_message, user_shortname)
+    if settings.websocket_mode == "redis":
+        is_sent = bool(await publish_to_user(user_shortname, message))
+    else:
+        is_sent = await websocket_manager.send_message(user_message(message), user_shortname)
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={"status": ResponseStatus.success, "message_sent": is_sent}
@@ -160,14 +363,32 @@ async def send_message(user_shortname: str, message: dict = Body(...)):
 
 @app.api_route(path="/broadcast-to-channels", methods=["post"])
 async def broadcast(data: dict = Body(...)):
-    formatted_message = json.dumps({
-        "type": "notification_subscription",
-        "message": data["message"]
-    })
+    if settings.websocket_mode == "redis":
+        is_sent = bool(await publish_to_channels(data["channels"], data["message"]))
+    else:
+        formatted_message = channel_message(data["message"])
+        is_sent = False
+        for channel_name in data["channels"]:
+            is_sent = await websocket_manager.broadcast_message(formatted_message, channel_name) or is_sent
+
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"status": ResponseStatus.success, "message_sent": is_sent}
+    )
+
 
-    is_sent = False
-    for channel_name in data["channels"]:
-        is_sent = await websocket_manager.broadcast_message(formatted_message, channel_name) or is_sent
+@app.api_route(path="/broadcast-batch", methods=["post"])
+async def broadcast_batch(data: dict = Body(...)):
+    """Broadcast a batch of {"channels": [...], "message": {...}} events at once"""
+    events = data.get("events", [])
+    if settings.websocket_mode == "redis":
+        is_sent = bool(events) and bool(await publish_batch(events))
+    else:
+        is_sent = False
+        for event in events:
+            formatted_message = channel_message(event["message"])
+            for channel_name in event["channels"]:
+                is_sent = await websocket_manager.broadcast_message(formatted_message, channel_name) or is_sent
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -182,8 +403,11 @@ async def service_info():
         content={
             "status": ResponseStatus.success, 
             "data": {
-                "connected_clients": str(websocket_manager.active_connections),
-                "channels": str(websocket_manager.channels)
+                "connected_clients": str(list(websocket_manager.active_connections)),
+                "channels": str(websocket_manager.channels),
+                "node": {"id": redis_fanout.node_id, **redis_fanout.stats()},
+                "delivery": websocket_manager.stats(),
+                "nodes": await redis_fanout.nodes() if settings.websocket_mode == "redis" else {},
             } 
         }
     )
@@ -192,10 +416,18 @@ async def service_info():
 async def app_startup() -> None:
     logger.info("Starting up")
     print('{"stage":"starting up"}')
+    if settings.websocket_mode == "redis":
+        fanout_tasks.append(asyncio.create_task(redis_fanout.listen()))
+        fanout_tasks.append(asyncio.create_task(redis_fanout.report()))
 
 
 @app.on_event("shutdown")
 async def app_shutdown() -> None:
+    for task in fanout_tasks:
+        task.cancel()
+    if settings.websocket_mode == "redis":
+        await redis_fanout.remove_node()
+        await RedisServices().close_pool()
     logger.info("Application shutting down")
     print('{"stage":"shutting down"}')
 